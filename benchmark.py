@@ -0,0 +1,395 @@
+"""
+Benchmarks hors ligne du crawl, du scraping et du nettoyage.
+
+Un site synthétique est servi par un serveur HTTP local : nombre de pages,
+liens par page, taille des pages, latence, sitemap et robots.txt sont
+configurables, et le contenu des pages peut être généré à partir des pages
+Jumia enregistrées dans scraped_data.json. Chaque benchmark tourne dans un
+processus séparé et mesure pages/s, latences p50/p99, pic de mémoire (RSS)
+et temps CPU par page. Les résultats sont enregistrés en JSON pour comparer
+deux versions :
+
+    python benchmark.py --pages 500 --output avant.json
+    python benchmark.py --pages 500 --output apres.json --compare avant.json
+"""
+import argparse
+import asyncio
+import contextlib
+import html
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metrics import metrics
+
+DEFAULT_TEMPLATE = {
+    "metadata": {"title": "Produit", "description": "Description du produit"},
+    "content": {
+        "headings": {"h1": ["Titre de la page"], "h2": ["Section A", "Section B"]},
+        "paragraphs": ["Texte de démonstration pour le benchmark, avec quelques accents : é, è, à, ç."],
+    },
+    "navigation": {"footer_links": ["Aide", "Contact", "Livraison"]},
+    "media": {"image_alt_texts": ["Photo du produit"]},
+}
+
+BENCHMARKS = ("crawl", "scrape", "scrape_pipeline", "clean")
+
+
+def load_templates(path="scraped_data.json", limit=1000):
+    """
+    Pages enregistrées servant de modèles au site synthétique.
+    """
+    from clean_json import iter_records
+    templates = []
+    try:
+        for record in iter_records(path):
+            templates.append(record)
+            if len(templates) >= limit:
+                break
+    except FileNotFoundError:
+        print(f"Fichier {path} non trouvé : utilisation du modèle par défaut")
+    return templates or [DEFAULT_TEMPLATE]
+
+
+class SyntheticSite:
+    """
+    Site de `pages` pages (/p0, /p1...) avec `fanout` liens internes par page,
+    chaque page faisant au moins `page_size` octets.
+    """
+    def __init__(self, pages=200, fanout=10, page_size=20000, latency=0.0, sitemap=True, robots=True,
+                 templates=None):
+        self.pages = pages
+        self.fanout = fanout
+        self.page_size = page_size
+        self.latency = latency
+        self.sitemap = sitemap
+        self.robots = robots
+        self.templates = templates or [DEFAULT_TEMPLATE]
+        self.base_url = None
+        self._cache = {}
+
+    def links(self, index):
+        # Liens déterministes qui couvrent tout le site depuis /p0
+        return [(index * self.fanout + k) % self.pages for k in range(1, self.fanout + 1)]
+
+    def page(self, index):
+        body = self._cache.get(index)
+        if body is None:
+            body = self._cache[index] = self._render(index).encode("utf-8")
+        return body
+
+    def _render(self, index):
+        template = self.templates[index % len(self.templates)]
+        metadata = template.get("metadata") or {}
+        content = template.get("content") or {}
+        escape = html.escape
+        parts = [
+            "<!DOCTYPE html><html><head>",
+            f"<title>{escape(metadata.get('title') or '')} {index}</title>",
+            f'<meta name="description" content="{escape(metadata.get("description") or "")}">',
+            "</head><body><nav>",
+        ]
+        parts += [f'<a href="/p{target}">Page {target}</a>' for target in self.links(index)]
+        parts.append("</nav><main>")
+        for level, texts in (content.get("headings") or {}).items():
+            parts += [f"<{level}>{escape(text)}</{level}>" for text in texts]
+        for alt in (template.get("media") or {}).get("image_alt_texts") or []:
+            parts.append(f'<img src="/img.jpg" alt="{escape(alt)}">')
+        paragraphs = [escape(text) for text in content.get("paragraphs") or []] or ["Lorem ipsum"]
+        size = sum(len(part) for part in parts)
+        i = 0
+        # Compléter avec les paragraphes du modèle jusqu'à la taille demandée
+        while size < self.page_size or i < len(paragraphs):
+            paragraph = f"<p>{paragraphs[i % len(paragraphs)]}</p>"
+            parts.append(paragraph)
+            size += len(paragraph)
+            i += 1
+        parts.append('</main><form><input type="email" placeholder="Votre email"></form><footer>')
+        footer = (template.get("navigation") or {}).get("footer_links") or []
+        parts += [f'<a href="/p0">{escape(text)}</a>' for text in footer]
+        parts.append("</footer></body></html>")
+        return "".join(parts)
+
+    def robots_txt(self):
+        lines = ["User-agent: *", "Disallow: /private"]
+        if self.sitemap:
+            lines.append(f"Sitemap: {self.base_url}/sitemap.xml")
+        return "\n".join(lines) + "\n"
+
+    def sitemap_xml(self):
+        urls = "".join(f"<url><loc>{self.base_url}/p{index}</loc></url>" for index in range(self.pages))
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>')
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/robots.txt" and site.robots:
+                    self.reply(site.robots_txt().encode("utf-8"), "text/plain")
+                elif path == "/sitemap.xml" and site.sitemap:
+                    self.reply(site.sitemap_xml().encode("utf-8"), "application/xml")
+                elif path == "/" or (path.startswith("/p") and path[2:].isdigit()
+                                     and int(path[2:]) < site.pages):
+                    if site.latency:
+                        time.sleep(site.latency)
+                    self.reply(site.page(int(path[2:] or 0)), "text/html; charset=utf-8")
+                else:
+                    self.reply(b"Not found", "text/plain", 404)
+
+            def reply(self, body, content_type, status=200):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    @contextlib.contextmanager
+    def serve(self, host="127.0.0.1", port=0):
+        """
+        Démarre le serveur local dans un thread ; self.base_url est renseigné.
+        """
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        self.base_url = f"http://{host}:{server.server_port}"
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def urls(self):
+        return [f"{self.base_url}/p{index}" for index in range(self.pages)]
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _peak_rss_mb():
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    peaks = [resource.getrusage(who).ru_maxrss * unit
+             for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return max(peaks) / (1024 * 1024)
+
+
+def run_crawl(site, options, prepared):
+    from crawler import WebCrawler
+    crawler = WebCrawler(site.base_url + "/", max_depth=options["pages"])
+    concurrency = options["concurrency"]
+    try:
+        asyncio.run(crawler.crawl_async(max_pages=options["pages"], concurrency=concurrency,
+                                        per_host_delay=0, per_host_concurrency=concurrency))
+    finally:
+        crawler.close()
+    return len(crawler.visited_urls), ("stage_seconds", {"stage": "fetch"})
+
+
+def run_scrape(site, options, prepared):
+    from http_client import create_session
+    from scrapper_2 import fetch_page, parse_page_content
+    session = create_session()
+    pages = 0
+    for url in site.urls():
+        # Récupération + extraction d'une page, comme extract_page_content
+        with metrics.timer("page_seconds"):
+            content = parse_page_content(url, fetch_page(url, session), options["parser"])
+        pages += content is not None
+    return pages, ("page_seconds", {})
+
+
+def run_scrape_pipeline(site, options, prepared):
+    from scrapper_2 import iter_scrape_pipeline
+    pages = 0
+    for _ in iter_scrape_pipeline(site.urls(), fetch_workers=options["concurrency"],
+                                  parse_workers=options["workers"], parser=options["parser"]):
+        pages += 1
+    return pages, ("http_request_seconds", {})
+
+
+def prepare_clean(site, options, directory):
+    # Fichier JSONL d'entrée, écrit avant le démarrage des mesures
+    from output import JsonlWriter
+    source = os.path.join(directory, "pages.jsonl")
+    with JsonlWriter(source, flush_every=10000) as writer:
+        for index in range(options["rows"]):
+            record = dict(site.templates[index % len(site.templates)])
+            record["url"] = f"{site.base_url}/p{index}"
+            writer.write(record)
+    return source
+
+
+def run_clean(site, options, prepared):
+    from clean_json import clean
+    output = os.path.join(os.path.dirname(prepared), "out.csv")
+    rows = clean(prepared, output, batch_size=options["batch_size"])
+    return rows, ("stage_seconds", {"stage": "clean"})
+
+
+RUNNERS = {
+    "crawl": run_crawl,
+    "scrape": run_scrape,
+    "scrape_pipeline": run_scrape_pipeline,
+    "clean": run_clean,
+}
+
+PREPARERS = {
+    "clean": prepare_clean,
+}
+
+
+def _measure(name, site, options, results):
+    # Exécuté dans un processus neuf : le pic RSS et le CPU ne concernent que ce benchmark
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(sys.stdout if options["verbose"] else devnull):
+        prepare = PREPARERS.get(name)
+        prepared = prepare(site, options, directory) if prepare else None
+        metrics.reset()
+        metrics.max_samples = 100000
+        cpu_start = _cpu_seconds()
+        start = time.perf_counter()
+        pages, (latency_name, latency_labels) = RUNNERS[name](site, options, prepared)
+        elapsed = time.perf_counter() - start
+        cpu = _cpu_seconds() - cpu_start
+    p50 = metrics.percentile(latency_name, 50, **latency_labels)
+    p99 = metrics.percentile(latency_name, 99, **latency_labels)
+    results.put({
+        "pages": pages,
+        "seconds": elapsed,
+        "pages_per_sec": pages / elapsed if elapsed else None,
+        "latency": latency_name,
+        "p50_ms": p50 * 1000 if p50 is not None else None,
+        "p99_ms": p99 * 1000 if p99 is not None else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "cpu_ms_per_page": cpu / pages * 1000 if pages else None,
+    })
+
+
+def run_benchmark(name, site, options):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(name, site, options, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(benchmarks=BENCHMARKS, pages=200, fanout=10, page_size=20000, latency=0.0, sitemap=True,
+              robots=True, templates_path="scraped_data.json", concurrency=10, workers=None,
+              parser="html.parser", rows=20000, batch_size=5000, verbose=False):
+    """
+    Lance les benchmarks demandés contre un site synthétique local et retourne
+    les résultats (dictionnaire sérialisable en JSON).
+    """
+    site = SyntheticSite(pages, fanout, page_size, latency, sitemap, robots, load_templates(templates_path))
+    options = {"pages": pages, "concurrency": concurrency, "workers": workers, "parser": parser,
+               "rows": rows, "batch_size": batch_size, "verbose": verbose}
+    report = {
+        "timestamp": time.time(),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"pages": pages, "fanout": fanout, "page_size": page_size, "latency": latency,
+                   "sitemap": sitemap, "robots": robots, "concurrency": concurrency, "workers": workers,
+                   "parser": parser, "rows": rows, "batch_size": batch_size},
+        "results": {},
+    }
+    with site.serve():
+        for name in benchmarks:
+            print(f"Benchmark {name}...")
+            report["results"][name] = result = run_benchmark(name, site, options)
+            print(f"  -> {result['pages']} pages, {result['pages_per_sec']:.1f} pages/s, "
+                  f"p50 {_format(result['p50_ms'])} ms, p99 {_format(result['p99_ms'])} ms, "
+                  f"RSS max {result['peak_rss_mb']:.0f} Mo, CPU {_format(result['cpu_ms_per_page'])} ms/page")
+    return report
+
+
+def _format(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def compare(old, new):
+    """
+    Affiche l'évolution de chaque mesure entre deux rapports (ancien -> nouveau).
+    """
+    for name, result in new["results"].items():
+        previous = old["results"].get(name)
+        if previous is None:
+            continue
+        print(f"{name} :")
+        for key in ("pages_per_sec", "p50_ms", "p99_ms", "peak_rss_mb", "cpu_ms_per_page"):
+            before, after = previous.get(key), result.get(key)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"  {key:16} {before:10.2f} -> {after:10.2f} ({change:+.1f} %)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks hors ligne du crawler, du scraper et du nettoyage")
+    parser.add_argument("benchmarks", nargs="*", help=f"parmi {', '.join(BENCHMARKS)} (tous par défaut)")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=20000)
+    parser.add_argument("--latency", type=float, default=0.0, help="latence du serveur par page (s)")
+    parser.add_argument("--no-sitemap", action="store_true")
+    parser.add_argument("--no-robots", action="store_true")
+    parser.add_argument("--templates", default="scraped_data.json", help="pages modèles (JSON ou JSONL)")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None, help="processus d'extraction du pipeline")
+    parser.add_argument("--parser", default="html.parser")
+    parser.add_argument("--rows", type=int, default=20000, help="lignes pour le benchmark clean")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--output", default=None, help="fichier JSON des résultats")
+    parser.add_argument("--compare", default=None, help="résultats précédents à comparer")
+    parser.add_argument("--verbose", action="store_true", help="afficher la sortie des scripts")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"benchmarks inconnus : {', '.join(sorted(unknown))}")
+
+    report = run_suite(args.benchmarks or BENCHMARKS, args.pages, args.fanout, args.page_size, args.latency,
+                       not args.no_sitemap, not args.no_robots, args.templates, args.concurrency,
+                       args.workers, args.parser, args.rows, args.batch_size, args.verbose)
+    output = args.output or f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Résultats enregistrés dans {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
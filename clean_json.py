@@ -1,32 +1,30 @@
-"""import json
-import csv
-import os
-
-def fix_encoding(text):
-    if not isinstance(text, str):
-        return text
-    try:
-        # Try to fix common encoding issues
-        return text.encode('latin1').decode('utf-8')
-    except Exception:
-        return text
+"""
+Nettoyage des données scrapées et export CSV / Parquet.
 
-def flatten_dict(d, parent_key='', sep='.'):  # Flattens nested dicts for CSV
-    items = []
-    for k, v in d.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_dict(v, new_key, sep=sep).items())
-        elif isinstance(v, list):
-            # Join lists as semicolon-separated strings, fixing encoding
-            items.append((new_key, '; '.join(fix_encoding(str(i)) for i in v)))
-        else:
-            items.append((new_key, fix_encoding(v)))
-    return dict(items)
+Les pages sont lues en flux (tableau JSON ou JSONL, compressé ou non),
+regroupées par lots en DataFrames pandas, puis la réparation des encodages
+et les jointures sont faites par colonne sur chaque lot. Chaque lot est
+ajouté aux fichiers de sortie : la mémoire dépend de la taille d'un lot, pas
+de celle du crawl.
 """
-import json
-import csv
-from html import unescape
+import numpy as np
+import pandas as pd
+
+from output import iter_json_array
+from records import iter_pages, is_msgpack
+from metrics import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Paire « octet de tête UTF-8 + octet de continuation » lue en latin-1 : signe de mojibake
+MOJIBAKE_PATTERN = "[\u00c2-\u00f4][\u0080-\u00bf]"
+
+HEADINGS = ["h1", "h2", "h3", "h4", "h5", "h6"]
 
 # Fonction pour corriger les encodages
 def fix_encoding(text):
@@ -37,6 +35,21 @@ def fix_encoding(text):
     except Exception:
         return text
 
+def fix_encoding_series(series):
+    """
+    fix_encoding appliqué à toute une colonne. Une chaîne sans paire mojibake
+    ne peut pas être décodée autrement : seules les chaînes suspectes (et une
+    seule fois chaque valeur distincte) passent par l'aller-retour latin-1/UTF-8.
+    """
+    suspect = series.str.contains(MOJIBAKE_PATTERN, regex=True, na=False)
+    if not suspect.any():
+        return series
+    repaired = series.copy()
+    values = series[suspect]
+    fixes = {value: fix_encoding(value) for value in values.unique()}
+    repaired[suspect] = values.map(fixes)
+    return repaired
+
 # Fonction pour aplatir les dictionnaires (utile si tu veux l'étendre)
 def flatten_dict(d, parent_key='', sep='.'):
     items = []
@@ -50,76 +63,116 @@ def flatten_dict(d, parent_key='', sep='.'):
             items.append((new_key, fix_encoding(v)))
     return dict(items)
 
-# Charger le JSON
-with open("scraped_data.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-# Extraction et nettoyage des données
-rows = []
-
-for item in data:
-    url = item.get("url", "")
-    metadata = item.get("metadata", {})
-    content = item.get("content", {})
-    headings = content.get("headings", {})
-    paragraphs = content.get("paragraphs", [])
-    business_info = item.get("business_info", {})
-
-    title = fix_encoding(metadata.get("title", ""))
-    description = fix_encoding(metadata.get("description", ""))
-
-    h1 = " | ".join([fix_encoding(h) for h in headings.get("h1", [])])
-    h2 = " | ".join([fix_encoding(h) for h in headings.get("h2", [])])
-    h3 = " | ".join([fix_encoding(h) for h in headings.get("h3", [])])
-    h4 = " | ".join([fix_encoding(h) for h in headings.get("h4", [])])
-    h5 = " | ".join([fix_encoding(h) for h in headings.get("h5", [])])
-    h6 = " | ".join([fix_encoding(h) for h in headings.get("h6", [])])
-
-    paragraphs = content.get("paragraphs", [])
-    navigation = item.get("navigation", {})
-    footer_links = navigation.get("footer_links", [])
-    media = item.get("media", {})
-    image_alt_texts = media.get("image_alt_texts", [])
-    document_links = media.get("document_links", {})
-    pdf_links = document_links.get("pdf", [])
-    doc_links = document_links.get("doc", [])
-    docx_links = document_links.get("docx", [])
-    business_info = business_info.get("business_info", {})
-    business_name = business_info.get("business_name", "")
-    business_address = business_info.get("business_address", "")
-    business_phone = business_info.get("business_phone", "")
-    business_email = business_info.get("business_email", "")
-
-    paragraph_text = " ".join([fix_encoding(p.strip()) for p in paragraphs])
-
-    footer_links = " | ".join([
-        fix_encoding(link) for link in item.get("navigation", {}).get("footer_links", []) if link
-    ])
-
-    email_form = item.get("forms", {}).get("details", [[]])[0]
-    email_placeholder = ""
-    for field in email_form:
+def iter_records(path):
+    """
+    Lit les pages scrapées une par une : JSONL (.jsonl, .jsonl.gz, .jsonl.zst),
+    format compact de records.py (JSONL ou .msgpack) ou tableau JSON.
+    """
+    if ".jsonl" in path or is_msgpack(path):
+        return iter_pages(path)
+    return iter_json_array(path)
+
+def iter_batches(records, batch_size=50000):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def join_lists(lists, separator, strip=False, skip_empty=False):
+    """
+    Répare puis joint chaque liste de textes d'une colonne, en un seul passage vectorisé.
+    """
+    exploded = lists.explode()
+    exploded = exploded[exploded.map(lambda value: isinstance(value, str))]
+    if strip:
+        exploded = exploded.str.strip()
+    exploded = fix_encoding_series(exploded)
+    if skip_empty:
+        exploded = exploded[exploded != ""]
+    if exploded.empty:
+        return pd.Series("", index=lists.index)
+    # explode garde les éléments d'une même ligne contigus : découper aux changements d'index
+    # (bien plus rapide qu'un groupby().agg() qui appelle join groupe par groupe)
+    index = exploded.index.to_numpy()
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    groups = np.split(exploded.to_numpy(dtype=object), starts[1:])
+    joined = pd.Series([separator.join(group) for group in groups], index=index[starts])
+    return joined.reindex(lists.index, fill_value="")
+
+def email_placeholder(forms):
+    # Placeholder du champ email du premier formulaire
+    placeholder = ""
+    for field in (forms.get("details") or [[]])[0]:
         if field.get("type") == "email":
-            email_placeholder = fix_encoding(field.get("placeholder", ""))
-
-    row = {
-        "url": url,
-        "title": title,
-        "description": description,
-        "content":paragraph_text,
-        "medoia":media,
-        "business_info":business_info,
-    }
-
-    rows.append(row)
-
-# En-têtes
-fieldnames = list(rows[0].keys())
-
-# Sauvegarde CSV
-with open("structured_output.csv", "w", encoding="utf-8", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=fieldnames)
-    writer.writeheader()
-    writer.writerows(rows)
-
-print(" Fichier CSV créé : structured_output.csv")
\ No newline at end of file
+            placeholder = field.get("placeholder") or ""
+    return placeholder
+
+def records_to_frame(records):
+    """
+    Transforme un lot de pages en DataFrame nettoyé (une ligne par page).
+    """
+    pages = pd.DataFrame({
+        "url": [item.get("url", "") for item in records],
+        "metadata": [item.get("metadata") or {} for item in records],
+        "content": [item.get("content") or {} for item in records],
+        "navigation": [item.get("navigation") or {} for item in records],
+        "forms": [item.get("forms") or {} for item in records],
+        "media": [item.get("media") or {} for item in records],
+        "business_info": [item.get("business_info") or {} for item in records],
+    })
+    headings = pages["content"].map(lambda content: content.get("headings") or {})
+
+    frame = pd.DataFrame({
+        "url": pages["url"],
+        "title": fix_encoding_series(pages["metadata"].map(lambda m: m.get("title", ""))),
+        "description": fix_encoding_series(pages["metadata"].map(lambda m: m.get("description", ""))),
+        "content": join_lists(pages["content"].map(lambda c: c.get("paragraphs") or []), " ", strip=True),
+        "medoia": pages["media"].map(str),
+        "business_info": pages["business_info"].map(str),
+    })
+    for level in HEADINGS:
+        frame[level] = join_lists(headings.map(lambda h, level=level: h.get(level) or []), " | ")
+    frame["footer_links"] = join_lists(
+        pages["navigation"].map(lambda n: n.get("footer_links") or []), " | ", skip_empty=True
+    )
+    frame["email_placeholder"] = fix_encoding_series(pages["forms"].map(email_placeholder))
+    return frame
+
+def clean(input_path="scraped_data.json", csv_path="structured_output.csv", parquet_path=None,
+          batch_size=50000):
+    """
+    Nettoie `input_path` lot par lot et écrit le CSV (et le Parquet si demandé).
+    Retourne le nombre de lignes écrites.
+    """
+    if parquet_path and not HAS_PYARROW:
+        print("pyarrow n'est pas installé : export Parquet ignoré")
+        parquet_path = None
+
+    rows = 0
+    parquet_writer = None
+    try:
+        with open(csv_path, "w", encoding="utf-8", newline="") as csv_file:
+            for batch in iter_batches(iter_records(input_path), batch_size):
+                with metrics.timer("stage_seconds", stage="clean"):
+                    frame = records_to_frame(batch)
+                with metrics.timer("stage_seconds", stage="export"):
+                    frame.to_csv(csv_file, header=rows == 0, index=False, lineterminator="\r\n")
+                    if parquet_path:
+                        table = pa.Table.from_pandas(frame, preserve_index=False)
+                        if parquet_writer is None:
+                            parquet_writer = pq.ParquetWriter(parquet_path, table.schema)
+                        parquet_writer.write_table(table)
+                rows += len(frame)
+                metrics.inc("rows_total", len(frame), stage="clean")
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+    return rows
+
+if __name__ == "__main__":
+    rows = clean("scraped_data.json", "structured_output.csv", "structured_output.parquet")
+    print(f" Fichier CSV créé : structured_output.csv ({rows} lignes)")
@@ -0,0 +1,147 @@
+"""
+État persistant du crawl incrémental (SQLite).
+
+Pour chaque URL on conserve la date du dernier téléchargement, l'empreinte du
+contenu, le lastmod/changefreq du sitemap et la profondeur. Les valeurs lues
+dans le sitemap pendant le crawl sont écrites au fil de la lecture
+(note_sitemap) plutôt que gardées en mémoire. Au crawl suivant,
+seules les URLs nouvelles, dont le lastmod a changé ou dont le changefreq est
+échu sont retéléchargées ; le scraper ne ré-extrait que les pages dont
+l'empreinte a changé depuis la dernière extraction.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+
+CHANGEFREQ_SECONDS = {
+    "always": 0,
+    "hourly": 3600,
+    "daily": 24 * 3600,
+    "weekly": 7 * 24 * 3600,
+    "monthly": 30 * 24 * 3600,
+    "yearly": 365 * 24 * 3600,
+    "never": float("inf"),
+}
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest()
+
+
+class CrawlState:
+    def __init__(self, path="crawl_state.sqlite", default_interval=24 * 3600):
+        """
+        `default_interval` : délai de retéléchargement des URLs sans lastmod ni changefreq.
+        """
+        self.path = path
+        self.default_interval = default_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                last_fetch REAL,
+                content_hash TEXT,
+                lastmod TEXT,
+                changefreq TEXT,
+                depth INTEGER,
+                extracted_hash TEXT,
+                sitemap_lastmod TEXT,
+                sitemap_changefreq TEXT
+            )
+        """)
+        # Bases créées avant l'ajout des colonnes du sitemap courant
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(urls)")}
+        for column in ("sitemap_lastmod", "sitemap_changefreq"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE urls ADD COLUMN {column} TEXT")
+        self._conn.commit()
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_fetch, content_hash, lastmod, changefreq, depth, extracted_hash, "
+                "sitemap_lastmod, sitemap_changefreq FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "last_fetch": row[0],
+            "content_hash": row[1],
+            "lastmod": row[2],
+            "changefreq": row[3],
+            "depth": row[4],
+            "extracted_hash": row[5],
+            "sitemap_lastmod": row[6],
+            "sitemap_changefreq": row[7],
+        }
+
+    def note_sitemap(self, entries):
+        """
+        Enregistre le lastmod/changefreq annoncés par le sitemap pour des
+        entrées (url, lastmod, changefreq). is_due() et record_fetch() les
+        utilisent quand ils ne reçoivent pas ces valeurs.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO urls (url, sitemap_lastmod, sitemap_changefreq) VALUES (?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET sitemap_lastmod = excluded.sitemap_lastmod, "
+                "sitemap_changefreq = excluded.sitemap_changefreq",
+                entries
+            )
+            self._conn.commit()
+
+    def is_due(self, url, lastmod=None, changefreq=None, now=None):
+        """
+        Indique si l'URL doit être (re)téléchargée. Sans `lastmod` ni
+        `changefreq`, les valeurs notées depuis le sitemap sont utilisées.
+        """
+        entry = self.get(url)
+        if entry is None or entry["last_fetch"] is None:
+            return True
+        lastmod = lastmod or entry["sitemap_lastmod"]
+        changefreq = changefreq or entry["sitemap_changefreq"]
+        # Le sitemap annonce une nouvelle version
+        if lastmod and lastmod != entry["lastmod"]:
+            return True
+        # Sinon, attendre l'échéance du changefreq (ou de l'intervalle par défaut)
+        interval = CHANGEFREQ_SECONDS.get((changefreq or entry["changefreq"] or "").lower())
+        if interval is None:
+            if lastmod or entry["lastmod"]:
+                # lastmod connu et inchangé : la page n'a pas bougé
+                return False
+            interval = self.default_interval
+        return (now or time.time()) - entry["last_fetch"] >= interval
+
+    def record_fetch(self, url, depth, text, lastmod=None, changefreq=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO urls (url, last_fetch, content_hash, lastmod, changefreq, depth) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET last_fetch = excluded.last_fetch, "
+                "content_hash = excluded.content_hash, "
+                "lastmod = COALESCE(excluded.lastmod, urls.sitemap_lastmod, urls.lastmod), "
+                "changefreq = COALESCE(excluded.changefreq, urls.sitemap_changefreq, urls.changefreq), "
+                "depth = MIN(excluded.depth, COALESCE(urls.depth, excluded.depth))",
+                (url, time.time(), content_hash(text), lastmod, changefreq, depth)
+            )
+            self._conn.commit()
+
+    def needs_extraction(self, url, text):
+        entry = self.get(url)
+        return entry is None or entry["extracted_hash"] != content_hash(text)
+
+    def mark_extracted(self, url, text):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO urls (url, extracted_hash) VALUES (?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET extracted_hash = excluded.extracted_hash",
+                (url, content_hash(text))
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,63 +1,147 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.robotparser import RobotFileParser
 from urllib.parse import urljoin, urlparse
 import time
-import queue
-import xml.etree.ElementTree as ET
-
-def get_sitemap_urls(sitemap_url):
-    try:
-        print(f"Tentative de récupération du sitemap : {sitemap_url}")
-        response = requests.get(sitemap_url, timeout=10)
-        if response.status_code == 200:
-            tree = ET.fromstring(response.content)
-            urls = [url.text for url in tree.iter('{http://www.sitemaps.org/schemas/sitemap/0.9}loc')]
-            print(f"Sitemap trouvé avec {len(urls)} URLs")
-            return urls
-        else:
-            print(f"Sitemap non trouvé (code {response.status_code})")
-            return []
-    except Exception as e:
-        print(f"Erreur lors de la lecture du sitemap : {e}")
-        return []
-
-def respect_robots_txt(base_url):
-    rp = RobotFileParser()
-    robots_url = urljoin(base_url, "robots.txt")
-    print(f"Vérification du robots.txt : {robots_url}")
-    
-    try:
-        rp.set_url(robots_url)
-        rp.read()
-        print("robots.txt trouvé et lu")
-    except Exception as e:
-        print(f"Erreur lors de la lecture du robots.txt : {e}")
-        # Si on ne peut pas lire robots.txt, on assume que tout est autorisé
-        def can_fetch(user_agent, url):
-            return True
-        return can_fetch
-    
-    def can_fetch(user_agent, url):
-        return rp.can_fetch(user_agent, url)
-    
-    return can_fetch
+import asyncio
+from itertools import islice
+from parsers import extract_hrefs
+from http_cache import cached_get, cached_get_async
+from sitemaps import iter_sitemap_entries
+from frontier import UrlFrontier, normalize_url
+from robots import RobotsCache
+from http_client import create_session, create_aiohttp_session, install_dns_cache
+from fetch_gate import FetchGate, SkippedContent
+from metrics import metrics
+
+def get_sitemap_entries(sitemap_url, cache=None):
+    """
+    Lit un sitemap (et ses enfants s'il s'agit d'un index) et retourne ses entrées :
+    {"loc", "lastmod", "changefreq"}. Pour les gros sitemaps, préférer
+    sitemaps.iter_sitemap_entries qui produit les entrées au fil de l'eau.
+    """
+    entries = list(iter_sitemap_entries(sitemap_url, cache=cache))
+    if entries:
+        print(f"Sitemap trouvé avec {len(entries)} URLs")
+    return entries
+
+def get_sitemap_urls(sitemap_url, cache=None):
+    return [entry["loc"] for entry in get_sitemap_entries(sitemap_url, cache)]
+
+class HostLimiter:
+    """
+    Politesse par hôte pour le crawl asynchrone : délai minimal entre deux
+    requêtes vers un même hôte et nombre maximal de requêtes simultanées.
+    Au-delà de `max_hosts` hôtes suivis, ceux qui sont inactifs (aucune
+    requête en cours ou en attente, délai écoulé) sont oubliés.
+    """
+    def __init__(self, delay=1.0, max_in_flight=2, max_hosts=1000):
+        self.delay = delay
+        self.max_in_flight = max_in_flight
+        self.max_hosts = max_hosts
+        self._hosts = {}
+        self._purge_at = max_hosts
+
+    def _host_state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            if len(self._hosts) >= self._purge_at:
+                self._purge()
+            state = self._hosts[host] = {
+                "semaphore": asyncio.Semaphore(self.max_in_flight),
+                "lock": asyncio.Lock(),
+                "next_request": 0.0,
+                "delay": self.delay,
+                "users": 0
+            }
+        return state
+
+    def _purge(self):
+        now = time.monotonic()
+        idle = [host for host, state in self._hosts.items() if not state["users"] and state["next_request"] <= now]
+        for host in idle:
+            del self._hosts[host]
+        # Prochaine purge quand le nombre d'hôtes aura doublé : coût amorti si tous sont actifs
+        self._purge_at = max(self.max_hosts, 2 * len(self._hosts))
+
+    def set_delay(self, host, delay):
+        # Délai propre à l'hôte (Crawl-delay / Request-rate du robots.txt), jamais sous le délai global
+        self._host_state(host)["delay"] = max(self.delay, delay)
+
+    async def acquire(self, host):
+        state = self._host_state(host)
+        # Compté dès l'attente : un hôte utilisé n'est jamais oublié par _purge
+        state["users"] += 1
+        try:
+            await state["semaphore"].acquire()
+        except BaseException:
+            state["users"] -= 1
+            raise
+        try:
+            # Réserver le prochain créneau de l'hôte puis attendre son ouverture
+            async with state["lock"]:
+                now = time.monotonic()
+                slot = max(now, state["next_request"])
+                state["next_request"] = slot + state["delay"]
+            if slot > now:
+                await asyncio.sleep(slot - now)
+        except BaseException:
+            self.release(host)
+            raise
+
+    def release(self, host):
+        state = self._hosts[host]
+        state["users"] -= 1
+        state["semaphore"].release()
 
 class WebCrawler:
-    def __init__(self, base_url, max_depth=3):
+    def __init__(self, base_url, max_depth=3, link_parser="fast", cache=None, state=None, frontier=None,
+                 same_domain=False, dedup=None, follow_duplicates=False, gate=None):
         self.base_url = base_url
+        # Cache HTTP partagé (http_cache.HttpCache), optionnel
+        self.cache = cache
+        # État persistant pour le crawl incrémental (crawl_state.CrawlState), optionnel
+        self.state = state
+        self.sitemap_entries = None
+        # Sitemaps déjà lus ou en attente (ceux des robots.txt des autres hôtes sont lus à la suite)
+        self.sitemap_urls = set()
+        self._pending_sitemaps = []
+        self.skipped_urls = 0
+        # Backend d'extraction des liens : "html.parser", "lxml" ou "fast"
+        self.link_parser = link_parser
         self.visited_urls = set()
-        self.queue = queue.Queue()
+        # Frontière : URLs normalisées, ensemble « déjà vu » compact, débordement sur disque
+        self.frontier = frontier if frontier is not None else UrlFrontier()
         self.max_depth = max_depth
+        # Profondeur des pages effectivement crawlées
         self.depth_map = {}
-        self.can_fetch = respect_robots_txt(base_url)
-        self.session = requests.Session()
+        self.same_domain = same_domain
+        # Détection des quasi-doublons (dedup.NearDuplicateDetector), optionnelle :
+        # les liens d'un quasi-doublon ne sont suivis qu'avec follow_duplicates=True
+        self.dedup = dedup
+        self.follow_duplicates = follow_duplicates
+        # Filtrage des réponses avant parsing (type, taille) ; pour récupérer les documents
+        # rencontrés, passer un FetchGate avec on_document ou collect_documents=True
+        self.gate = gate if gate is not None else FetchGate()
+        # Session partagée (pool keep-alive, délais, relances, compression)
+        self.session = create_session()
         # Ajouter des headers pour éviter d'être bloqué
         self.session.headers.update({
             'User-Agent': 'YOUR_USER_AGENT'
         })
+        # robots.txt de chaque hôte rencontré, téléchargé une seule fois
+        self.robots = RobotsCache(session=self.session)
+
+    def close(self):
+        """
+        Libère les ressources du crawl : lecture des sitemaps, frontière (et son
+        fichier de débordement temporaire) et session HTTP.
+        """
+        self.close_sitemaps()
+        self.frontier.close()
+        self.session.close()
 
-    def is_valid_url(self, url):
+    def can_fetch(self, user_agent, url):
+        return self.robots.can_fetch(url, user_agent)
+
+    def is_valid_url(self, url, check_robots=True):
         # Vérifier que l'URL est bien formée et appartient au même domaine
         parsed = urlparse(url)
         base_parsed = urlparse(self.base_url)
@@ -66,72 +150,292 @@ class WebCrawler:
         if not parsed.scheme or not parsed.netloc:
             return False
             
-        # Vérifier que l'URL appartient au même domaine (optionnel, décommentez si nécessaire)
-        # if parsed.netloc != base_parsed.netloc:
-        #     return False
+        # Vérifier que l'URL appartient au même domaine (optionnel)
+        if self.same_domain and parsed.netloc != base_parsed.netloc:
+            return False
             
-        # Vérifier robots.txt
-        return self.can_fetch("*", url)
+        # Vérifier robots.txt (en mode asynchrone, la vérification a lieu avant le téléchargement)
+        return not check_robots or self.can_fetch("*", url)
+
+    def enqueue_url(self, url, depth, force=False):
+        # Ajouter l'URL à la frontière si elle n'a jamais été vue
+        if depth > self.max_depth:
+            return
+        url = normalize_url(url)
+        if self.frontier.is_seen(url):
+            return
+        # Mode incrémental : ignorer les URLs qui n'ont pas à être retéléchargées
+        # (lastmod/changefreq du sitemap lus dans l'état, voir refill_from_sitemap)
+        if self.state and not force:
+            if not self.state.is_due(url):
+                self.frontier.mark_seen(url)
+                self.skipped_urls += 1
+                return
+        self.frontier.push(url, depth)
+
+    def record_page(self, url, depth, html):
+        if self.state:
+            self.state.record_fetch(url, depth, html)
+
+    def follow_links(self, url, html):
+        # Quasi-doublon d'une page déjà crawlée : ses liens le sont probablement aussi
+        if self.dedup is None:
+            return True
+        original = self.dedup.check(url, html)
+        if original is None:
+            return True
+        print(f"  -> Quasi-doublon de {original}")
+        return self.follow_duplicates
 
-    def enqueue_url(self, url, depth):
-        # Ajouter l'URL à la queue si elle n'a jamais été visitée
-        if url not in self.visited_urls and depth <= self.max_depth:
-            self.queue.put((url, depth))
-            self.depth_map[url] = depth
+    def extract_links(self, html, current_url, check_robots=True):
+        # Extraire tous les liens valides de la page
+        links = []
+        with metrics.timer("stage_seconds", stage="links"):
+            for href in extract_hrefs(html, self.link_parser):
+                absolute_link = urljoin(current_url, href)
+                if self.is_valid_url(absolute_link, check_robots):
+                    links.append(absolute_link)
+        metrics.inc("links_total", len(links))
+        return links
+
+    def open_sitemaps(self, sitemap_urls=None):
+        # Sitemaps déclarés dans robots.txt (sinon /sitemap.xml), lus en flux
+        if sitemap_urls is None:
+            sitemap_urls = self.robots.sitemaps(self.base_url) or [urljoin(self.base_url, "sitemap.xml")]
+        self.sitemap_urls.update(sitemap_urls)
+        return iter_sitemap_entries(sitemap_urls, session=self.session, cache=self.cache)
+
+    def has_sitemap_entries(self):
+        """
+        True s'il reste des entrées de sitemap à lire, y compris celles des
+        sitemaps déclarés par les robots.txt des hôtes rencontrés depuis.
+        """
+        for url in self.robots.new_sitemaps():
+            if url not in self.sitemap_urls and self.is_valid_url(url, check_robots=False):
+                self.sitemap_urls.add(url)
+                self._pending_sitemaps.append(url)
+        return self.sitemap_entries is not None or bool(self._pending_sitemaps)
+
+    def seed_queue(self, sitemap_entries):
+        # Les entrées du sitemap sont consommées par lots, au rythme du crawl
+        self.sitemap_entries = iter(sitemap_entries)
+        if self.refill_from_sitemap() == 0:
+            # Si pas de sitemap, commencer par l'URL de base (toujours retéléchargée)
+            print("Aucun sitemap trouvé, démarrage depuis l'URL de base")
+            self.enqueue_url(self.base_url, 0, force=True)
+
+    def close_sitemaps(self):
+        # Crawl terminé avant la fin du sitemap : arrêter sa lecture
+        entries, self.sitemap_entries = self.sitemap_entries, None
+        if entries is not None and hasattr(entries, "close"):
+            entries.close()
+
+    def refill_from_sitemap(self, batch_size=1000):
+        """
+        Ajoute jusqu'à `batch_size` URLs du sitemap à la frontière.
+        Retourne le nombre d'entrées lues (0 quand le sitemap est épuisé).
+        """
+        if self.sitemap_entries is None:
+            if not self.has_sitemap_entries():
+                return 0
+            # Sitemap courant épuisé : lire ceux des autres hôtes (pop() plutôt qu'un
+            # échange de liste, has_sitemap_entries pouvant y ajouter depuis la boucle asyncio)
+            sitemap_urls = []
+            while self._pending_sitemaps:
+                sitemap_urls.append(self._pending_sitemaps.pop())
+            self.sitemap_entries = iter(self.open_sitemaps(sitemap_urls))
+        skipped_before = self.skipped_urls
+        batch = list(islice(self.sitemap_entries, batch_size))
+        if len(batch) < batch_size:
+            self.sitemap_entries = None
+        if self.state and batch:
+            # Écrits dans l'état plutôt que gardés en mémoire : la taille du sitemap est sans limite
+            self.state.note_sitemap([
+                (normalize_url(entry["loc"]), entry["lastmod"], entry["changefreq"]) for entry in batch
+            ])
+        for entry in batch:
+            self.enqueue_url(entry["loc"], 0)
+        added = len(batch)
+        if added:
+            print(f"Ajout de {added} URLs du sitemap à la frontière")
+        if self.skipped_urls > skipped_before:
+            print(f"Mode incrémental : {self.skipped_urls - skipped_before} URLs inchangées ignorées")
+        return added
 
     def crawl(self, max_pages=10):
+        try:
+            self._crawl(max_pages)
+        finally:
+            self.close_sitemaps()
+
+    def _crawl(self, max_pages):
         # Essayer de récupérer les URLs du sitemap
-        sitemap_urls = get_sitemap_urls(urljoin(self.base_url, "sitemap.xml"))
-        
-        if sitemap_urls:
-            print(f"Ajout de {len(sitemap_urls)} URLs du sitemap à la queue")
-            for url in sitemap_urls:
-                self.enqueue_url(url, 0)
-        else:
-            # Si pas de sitemap, commencer par l'URL de base
-            print("Aucun sitemap trouvé, démarrage depuis l'URL de base")
-            self.enqueue_url(self.base_url, 0)
+        self.seed_queue(self.open_sitemaps())
 
         pages_crawled = 0
-        while not self.queue.empty() and pages_crawled < max_pages:
-            current_url, depth = self.queue.get()
-            if current_url in self.visited_urls:
-                continue
+        while pages_crawled < max_pages:
+            if len(self.frontier) < 100:
+                self.refill_from_sitemap()
+            item = self.frontier.pop()
+            if item is None:
+                break
+            current_url, depth = item
             
             print(f"Crawling : {current_url} (Profondeur : {depth})")
             self.visited_urls.add(current_url)
+            self.depth_map[current_url] = depth
             pages_crawled += 1
+            metrics.inc("pages_total", stage="crawl")
+            metrics.set_gauge("frontier_size", len(self.frontier))
             
             try:
-                response = self.session.get(current_url, timeout=10)
+                with metrics.timer("stage_seconds", stage="fetch"):
+                    response = cached_get(self.session, current_url, self.cache, gate=self.gate)
                 if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Extraire tous les liens de la page
-                    links_found = 0
-                    for link in soup.find_all('a', href=True):
-                        absolute_link = urljoin(current_url, link['href'])
-                        if self.is_valid_url(absolute_link):
-                            new_depth = depth + 1
-                            self.enqueue_url(absolute_link, new_depth)
-                            links_found += 1
-                    
-                    print(f"  -> {links_found} liens valides trouvés")
+                    self.record_page(current_url, depth, response.text)
+                    if self.follow_links(current_url, response.text):
+                        links = self.extract_links(response.text, current_url)
+                        for absolute_link in links:
+                            self.enqueue_url(absolute_link, depth + 1)
+                        
+                        print(f"  -> {len(links)} liens valides trouvés")
                 else:
                     print(f"  -> Erreur HTTP {response.status_code}")
                 
-                # Pause pour éviter de surcharger le serveur
-                time.sleep(1)
+                # Pause pour éviter de surcharger le serveur (Crawl-delay de l'hôte s'il est plus long)
+                time.sleep(max(1, self.robots.crawl_delay(current_url) or 0))
             
+            except SkippedContent as e:
+                print(f"  -> {e}")
             except Exception as e:
                 print(f"  -> Erreur lors du crawling de {current_url}: {e}")
+            self.page_done(current_url)
+
+    def page_done(self, url):
+        """
+        Appelé une fois par URL sortie de la frontière, après l'ajout de ses liens
+        (ou si elle a été écartée). Point d'extension pour le crawl distribué.
+        """
+
+    def wait_for_urls(self):
+        """
+        Appelé quand la frontière est vide et qu'aucune page n'est en cours :
+        True pour attendre de nouvelles URLs (ajoutées par d'autres workers)
+        au lieu de terminer le crawl.
+        """
+        return False
+
+    async def crawl_async(self, max_pages=10, concurrency=10, per_host_delay=1.0, per_host_concurrency=2,
+                          seed=True):
+        """
+        Variante asynchrone de crawl() basée sur aiohttp : jusqu'à `concurrency`
+        requêtes simultanées au total, la pause globale étant remplacée par
+        une politesse par hôte (HostLimiter). Remplit visited_urls et depth_map
+        comme crawl(). Avec seed=False, la frontière n'est pas initialisée
+        depuis les sitemaps (elle l'a déjà été, par exemple par un coordinateur).
+        """
+        try:
+            await self._crawl_async(max_pages, concurrency, per_host_delay, per_host_concurrency, seed)
+        finally:
+            self.close_sitemaps()
+
+    async def _crawl_async(self, max_pages, concurrency, per_host_delay, per_host_concurrency, seed):
+        loop = asyncio.get_running_loop()
+        if seed:
+            await loop.run_in_executor(None, lambda: self.seed_queue(self.open_sitemaps()))
+        refill_lock = asyncio.Lock()
+
+        limiter = HostLimiter(per_host_delay, per_host_concurrency)
+        progress = {"pages_crawled": 0, "in_flight": 0}
+
+        async with create_aiohttp_session(concurrency, per_host_concurrency,
+                                          headers=dict(self.session.headers)) as session:
+
+            async def worker():
+                while progress["pages_crawled"] < max_pages:
+                    item = self.frontier.pop()
+                    if item is None:
+                        # La frontière est vide : la réalimenter depuis le sitemap s'il en reste
+                        if self.has_sitemap_entries():
+                            async with refill_lock:
+                                if not len(self.frontier):
+                                    await loop.run_in_executor(None, self.refill_from_sitemap)
+                            continue
+                        # Sinon attendre les pages en cours qui peuvent l'alimenter
+                        if progress["in_flight"] == 0 and not self.wait_for_urls():
+                            return
+                        await asyncio.sleep(0.05)
+                        continue
+                    current_url, depth = item
+                    # Compter l'URL en cours dès sa sortie de la frontière : pendant
+                    # l'attente du robots.txt, les autres workers ne doivent pas
+                    # conclure que le crawl est terminé
+                    progress["in_flight"] += 1
+                    metrics.set_gauge("requests_in_flight", progress["in_flight"])
+                    try:
+                        # robots.txt de l'hôte, téléchargé en parallèle des autres pages si besoin
+                        if not await self.robots.can_fetch_async(session, current_url, "*"):
+                            continue
+                        if progress["pages_crawled"] >= max_pages:
+                            return
+
+                        print(f"Crawling : {current_url} (Profondeur : {depth})")
+                        self.visited_urls.add(current_url)
+                        self.depth_map[current_url] = depth
+                        progress["pages_crawled"] += 1
+                        metrics.inc("pages_total", stage="crawl")
+                        metrics.set_gauge("frontier_size", len(self.frontier))
+                        await self._crawl_page_async(session, limiter, current_url, depth)
+                    finally:
+                        progress["in_flight"] -= 1
+                        metrics.set_gauge("requests_in_flight", progress["in_flight"])
+                        self.page_done(current_url)
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def _crawl_page_async(self, session, limiter, current_url, depth):
+        host = urlparse(current_url).netloc
+        delay = self.robots.crawl_delay(current_url)
+        if delay:
+            limiter.set_delay(host, delay)
+        with metrics.timer("stage_seconds", stage="host_wait"):
+            await limiter.acquire(host)
+        try:
+            with metrics.timer("stage_seconds", stage="fetch"):
+                response = await cached_get_async(session, current_url, self.cache, self.gate)
+            if response.status_code != 200:
+                print(f"  -> Erreur HTTP {response.status_code}")
+                return
+            html = response.text
+        except SkippedContent as e:
+            print(f"  -> {e}")
+            return
+        except Exception as e:
+            print(f"  -> Erreur lors du crawling de {current_url}: {e}")
+            return
+        finally:
+            limiter.release(host)
+
+        self.record_page(current_url, depth, html)
+        if not self.follow_links(current_url, html):
+            return
+        links = self.extract_links(html, current_url, check_robots=False)
+        for absolute_link in links:
+            self.enqueue_url(absolute_link, depth + 1)
+        print(f"  -> {len(links)} liens valides trouvés")
 
 # Exemple d'utilisation
 if __name__ == "__main__":
+    install_dns_cache()
     base_url = input("Entrez l'URL de base à crawler : ")
     crawler = WebCrawler(base_url, max_depth=2)
-    crawler.crawl(max_pages=10)
+    mode = input("Crawl asynchrone (multi-hôtes) ? [o/N] : ")
+    if mode.strip().lower() == "o":
+        asyncio.run(crawler.crawl_async(max_pages=10))
+    else:
+        crawler.crawl(max_pages=10)
     crawled_urls = list(crawler.visited_urls)
+    crawler.close()
     
     with open("crawled_urls.txt", "w", encoding='utf-8') as f:
         for url in crawled_urls:
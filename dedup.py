@@ -0,0 +1,156 @@
+"""
+Détection des pages quasi identiques (filtres à facettes, tris, paramètres de
+session...) avant l'extraction.
+
+Le texte principal de la page (sans scripts, styles, menus, en-tête ni pied
+de page) est réduit à une empreinte SimHash 64 bits calculée sur des
+shingles de mots. Deux pages dont les empreintes diffèrent d'au plus
+`distance` bits sont considérées comme des quasi-doublons. L'index LSH
+découpe les empreintes en `distance + 1` bandes : deux empreintes assez
+proches ont forcément une bande identique, seules les pages partageant une
+bande sont comparées.
+"""
+import hashlib
+import re
+import threading
+from html import unescape
+
+import numpy as np
+
+from metrics import metrics
+
+_COMMENTS = re.compile(r"<!--.*?-->", re.S)
+_BOILERPLATE = re.compile(
+    r"<(script|style|noscript|template|svg|nav|header|footer)\b[^>]*>.*?</\1\s*>", re.S | re.I
+)
+_TAGS = re.compile(r"<[^>]+>")
+_WORDS = re.compile(r"\w+")
+
+
+def main_text(html):
+    """
+    Texte principal d'une page, un bloc de texte par ligne, sans parsing
+    complet (expressions régulières).
+    """
+    html = _COMMENTS.sub(" ", html)
+    html = _BOILERPLATE.sub(" ", html)
+    return unescape(_TAGS.sub("\n", html))
+
+
+def shingles(text, shingle=3):
+    """
+    Shingles de `shingle` mots consécutifs, pris à l'intérieur de chaque bloc
+    de texte : réordonner les blocs (tri d'une grille de produits) ne change
+    pas l'ensemble obtenu. Retourne (shingles, nombre de mots).
+    """
+    features = []
+    words = 0
+    for line in text.split("\n"):
+        tokens = _WORDS.findall(line.lower())
+        if not tokens:
+            continue
+        words += len(tokens)
+        if len(tokens) <= shingle:
+            features.append(" ".join(tokens))
+        else:
+            features.extend(" ".join(tokens[i:i + shingle]) for i in range(len(tokens) - shingle + 1))
+    return features, words
+
+
+def simhash(features):
+    """
+    Empreinte SimHash 64 bits d'une liste de caractéristiques (shingles).
+    """
+    hashes = np.frombuffer(
+        b"".join(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest() for feature in features),
+        dtype=">u8",
+    )
+    # Pour chaque bit : +1 si le shingle l'a, -1 sinon ; le bit de l'empreinte est le signe de la somme
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(features)
+    return int.from_bytes(np.packbits(votes > 0).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """
+    Index LSH d'empreintes SimHash : retrouve une empreinte à au plus `distance` bits.
+    """
+    def __init__(self, distance=3, bits=64):
+        self.distance = distance
+        self.bits = bits
+        bands = distance + 1
+        width = bits // bands
+        # (décalage, masque) de chaque bande ; la dernière prend les bits restants
+        self.bands = [
+            (i * width, (1 << (width if i < bands - 1 else bits - i * width)) - 1) for i in range(bands)
+        ]
+        self.tables = [{} for _ in self.bands]
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def _keys(self, value):
+        return [(value >> shift) & mask for shift, mask in self.bands]
+
+    def query(self, value):
+        """
+        Clé d'une empreinte indexée proche de `value`, ou None.
+        """
+        with self._lock:
+            for table, band in zip(self.tables, self._keys(value)):
+                for other, key in table.get(band, ()):
+                    if hamming(value, other) <= self.distance:
+                        return key
+        return None
+
+    def add(self, value, key):
+        with self._lock:
+            for table, band in zip(self.tables, self._keys(value)):
+                table.setdefault(band, []).append((value, key))
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+
+class NearDuplicateDetector:
+    """
+    Signale les pages dont le texte principal est quasi identique à celui
+    d'une page déjà vue. Les pages de moins de `min_tokens` mots ne sont
+    jamais considérées comme des doublons (pages vides, erreurs, redirections).
+    """
+    def __init__(self, distance=3, shingle=3, min_tokens=50):
+        self.index = SimHashIndex(distance)
+        self.shingle = shingle
+        self.min_tokens = min_tokens
+        # URL du quasi-doublon -> URL de la première page vue
+        self.duplicates = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, html):
+        features, words = shingles(main_text(html), self.shingle)
+        if words < self.min_tokens:
+            return None
+        return simhash(features)
+
+    def check(self, url, html):
+        """
+        Retourne l'URL de la page dont `url` est un quasi-doublon, ou None
+        (la page est alors indexée comme originale).
+        """
+        with metrics.timer("stage_seconds", stage="dedup"):
+            value = self.fingerprint(html)
+        if value is None:
+            return None
+        with self._lock:
+            original = self.index.query(value)
+            if original is None:
+                self.index.add(value, url)
+        if original is not None and original != url:
+            self.duplicates[url] = original
+            metrics.inc("near_duplicates_total")
+            return original
+        return None
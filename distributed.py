@@ -0,0 +1,545 @@
+"""
+Crawl distribué : un coordinateur et N workers (processus, éventuellement sur
+plusieurs machines avec Redis).
+
+Les URLs sont réparties par hôte (hachage du nom d'hôte modulo N) : chaque
+worker possède ses hôtes et applique seul leur politesse (robots.txt,
+Crawl-delay, HostLimiter). Les liens découverts sont routés vers la file du
+worker propriétaire. L'ensemble « déjà vu », les files par shard et la liste
+des pages crawlées sont dans un backend partagé :
+  - LocalBackend : en mémoire, workers en threads (tests, une seule machine) ;
+  - SQLiteBackend : fichier SQLite partagé par des processus d'une même machine ;
+  - RedisBackend : serveur Redis, pour des workers sur plusieurs machines.
+Le crawl s'arrête quand toutes les files sont vides et qu'aucune URL n'est en
+cours de traitement, ou quand `max_pages` URLs ont été distribuées.
+"""
+import asyncio
+import heapq
+import multiprocessing
+import sqlite3
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from crawler import WebCrawler
+from frontier import BloomFilter, fingerprint
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+
+def shard_for(url, shards):
+    """
+    Shard propriétaire d'une URL : dépend uniquement de son hôte.
+    """
+    return fingerprint(urlsplit(url).netloc.lower()) % shards
+
+
+class LocalBackend:
+    """
+    Backend en mémoire, partagé par des workers en threads d'un même processus.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def spec(self):
+        return ("local", None)
+
+    def reset(self):
+        with self._lock:
+            self._seen = set()
+            self._queues = {}
+            self._sequence = 0
+            self._claimed = 0
+            self._in_progress = 0
+            self._crawled = {}
+
+    def push_many(self, items):
+        added = 0
+        with self._lock:
+            for shard, url, depth in items:
+                if url in self._seen:
+                    continue
+                self._seen.add(url)
+                self._sequence += 1
+                heapq.heappush(self._queues.setdefault(shard, []), (depth, self._sequence, url))
+                added += 1
+        return added
+
+    def pop(self, shard, count, limit=None):
+        with self._lock:
+            if limit is not None:
+                count = min(count, limit - self._claimed)
+            queue = self._queues.get(shard) or []
+            items = []
+            while queue and len(items) < count:
+                depth, _, url = heapq.heappop(queue)
+                items.append((url, depth))
+            self._claimed += len(items)
+            self._in_progress += len(items)
+        return items
+
+    def complete(self, url, depth=None):
+        with self._lock:
+            self._in_progress -= 1
+            if depth is not None:
+                self._crawled[url] = depth
+
+    def pending(self, shard=None):
+        with self._lock:
+            if shard is not None:
+                return len(self._queues.get(shard) or [])
+            return sum(len(queue) for queue in self._queues.values())
+
+    def is_finished(self, limit=None):
+        with self._lock:
+            if self._in_progress:
+                return False
+            return (limit is not None and self._claimed >= limit) or not any(self._queues.values())
+
+    def crawled(self):
+        with self._lock:
+            return dict(self._crawled)
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """
+    Backend SQLite : chaque processus ouvre sa propre connexion sur le même fichier.
+    """
+    def __init__(self, path="distributed_crawl.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        # Transactions gérées explicitement (BEGIN IMMEDIATE) pour que pop() soit atomique
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                shard INTEGER,
+                depth INTEGER,
+                url TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS queue_priority ON queue (shard, depth, id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS crawled (url TEXT PRIMARY KEY, depth INTEGER)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO counters (name, value) VALUES ('claimed', 0), ('in_progress', 0)"
+        )
+
+    def spec(self):
+        return ("sqlite", self.path)
+
+    def _transaction(self, statements):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def reset(self):
+        def statements(conn):
+            for table in ("seen", "queue", "crawled"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("UPDATE counters SET value = 0")
+        self._transaction(statements)
+
+    def push_many(self, items):
+        def statements(conn):
+            added = 0
+            for shard, url, depth in items:
+                if conn.execute("INSERT OR IGNORE INTO seen (url) VALUES (?)", (url,)).rowcount:
+                    conn.execute("INSERT INTO queue (shard, depth, url) VALUES (?, ?, ?)", (shard, depth, url))
+                    added += 1
+            return added
+        return self._transaction(statements) if items else 0
+
+    def pop(self, shard, count, limit=None):
+        def statements(conn):
+            n = count
+            if limit is not None:
+                claimed = conn.execute("SELECT value FROM counters WHERE name = 'claimed'").fetchone()[0]
+                n = min(n, limit - claimed)
+            if n <= 0:
+                return []
+            rows = conn.execute(
+                "SELECT id, url, depth FROM queue WHERE shard = ? ORDER BY depth, id LIMIT ?", (shard, n)
+            ).fetchall()
+            if rows:
+                conn.executemany("DELETE FROM queue WHERE id = ?", [(row[0],) for row in rows])
+                conn.execute("UPDATE counters SET value = value + ? WHERE name IN ('claimed', 'in_progress')",
+                             (len(rows),))
+            return [(url, depth) for _, url, depth in rows]
+        return self._transaction(statements)
+
+    def complete(self, url, depth=None):
+        def statements(conn):
+            conn.execute("UPDATE counters SET value = value - 1 WHERE name = 'in_progress'")
+            if depth is not None:
+                conn.execute("INSERT OR REPLACE INTO crawled (url, depth) VALUES (?, ?)", (url, depth))
+        self._transaction(statements)
+
+    def pending(self, shard=None):
+        with self._lock:
+            if shard is None:
+                return self._conn.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM queue WHERE shard = ?", (shard,)).fetchone()[0]
+
+    def is_finished(self, limit=None):
+        # Une seule requête : lecture cohérente des files et des compteurs
+        with self._lock:
+            in_progress, claimed, queued = self._conn.execute(
+                "SELECT (SELECT value FROM counters WHERE name = 'in_progress'), "
+                "(SELECT value FROM counters WHERE name = 'claimed'), "
+                "EXISTS (SELECT 1 FROM queue)"
+            ).fetchone()
+        if in_progress:
+            return False
+        return (limit is not None and claimed >= limit) or not queued
+
+    def crawled(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT url, depth FROM crawled").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_REDIS_PUSH = """
+local added = 0
+for i = 2, #ARGV, 3 do
+    local url = ARGV[i + 1]
+    if redis.call('SADD', KEYS[1], url) == 1 then
+        local sequence = redis.call('INCR', KEYS[2])
+        redis.call('ZADD', ARGV[1] .. ARGV[i], tonumber(ARGV[i + 2]) * 1e12 + sequence, url)
+        added = added + 1
+    end
+end
+return added
+"""
+
+_REDIS_POP = """
+local n = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+if limit >= 0 then
+    n = math.min(n, limit - tonumber(redis.call('GET', KEYS[2]) or '0'))
+end
+if n <= 0 then
+    return {}
+end
+local items = redis.call('ZPOPMIN', KEYS[1], n)
+local popped = #items / 2
+if popped > 0 then
+    redis.call('INCRBY', KEYS[2], popped)
+    redis.call('INCRBY', KEYS[3], popped)
+end
+return items
+"""
+
+_REDIS_FINISHED = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') > 0 then
+    return 0
+end
+local limit = tonumber(ARGV[1])
+if limit >= 0 and tonumber(redis.call('GET', KEYS[2]) or '0') >= limit then
+    return 1
+end
+for i = 3, #KEYS do
+    if redis.call('ZCARD', KEYS[i]) > 0 then
+        return 0
+    end
+end
+return 1
+"""
+
+
+class RedisBackend:
+    """
+    Backend Redis : workers répartis sur plusieurs machines. Les opérations
+    composées (ajout avec déduplication, retrait sous budget, fin du crawl)
+    sont des scripts Lua, donc atomiques.
+    """
+    def __init__(self, url="redis://localhost:6379/0", prefix="crawl", shards=None, client=None):
+        if client is None and not HAS_REDIS:
+            raise ImportError("Le backend Redis nécessite le paquet 'redis' (pip install redis)")
+        self.url = url
+        self.prefix = prefix
+        self.shards = shards
+        self.client = client or redis.Redis.from_url(url)
+        self._push = self.client.register_script(_REDIS_PUSH)
+        self._pop = self.client.register_script(_REDIS_POP)
+        self._finished = self.client.register_script(_REDIS_FINISHED)
+
+    def spec(self):
+        return ("redis", self.url, self.prefix, self.shards)
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def _queue_keys(self):
+        shards = self.shards
+        if shards is None:
+            shards = int(self.client.get(self._key("shards")) or 0)
+        return [self._key(f"queue:{shard}") for shard in range(shards)]
+
+    def reset(self):
+        keys = list(self.client.scan_iter(match=self._key("*")))
+        if keys:
+            self.client.delete(*keys)
+        if self.shards is not None:
+            self.client.set(self._key("shards"), self.shards)
+
+    def push_many(self, items):
+        if not items:
+            return 0
+        args = [self._key("queue:")]
+        for shard, url, depth in items:
+            args += [shard, url, depth]
+        return self._push(keys=[self._key("seen"), self._key("sequence")], args=args)
+
+    def pop(self, shard, count, limit=None):
+        items = self._pop(
+            keys=[self._key(f"queue:{shard}"), self._key("claimed"), self._key("in_progress")],
+            args=[count, -1 if limit is None else limit],
+        )
+        return [(items[i].decode("utf-8"), int(float(items[i + 1]) // 1e12)) for i in range(0, len(items), 2)]
+
+    def complete(self, url, depth=None):
+        pipeline = self.client.pipeline()
+        pipeline.decr(self._key("in_progress"))
+        if depth is not None:
+            pipeline.hset(self._key("crawled"), url, depth)
+        pipeline.execute()
+
+    def pending(self, shard=None):
+        keys = [self._key(f"queue:{shard}")] if shard is not None else self._queue_keys()
+        return sum(self.client.zcard(key) for key in keys)
+
+    def is_finished(self, limit=None):
+        keys = [self._key("in_progress"), self._key("claimed")] + self._queue_keys()
+        return bool(self._finished(keys=keys, args=[-1 if limit is None else limit]))
+
+    def crawled(self):
+        return {url.decode("utf-8"): int(depth) for url, depth in self.client.hgetall(self._key("crawled")).items()}
+
+    def close(self):
+        self.client.close()
+
+
+def open_backend(spec):
+    """
+    Ouvre un backend à partir de sa description (backend.spec()), dans un autre processus.
+    """
+    kind = spec[0]
+    if kind == "sqlite":
+        return SQLiteBackend(spec[1])
+    if kind == "redis":
+        return RedisBackend(*spec[1:])
+    raise ValueError(f"Le backend {kind} ne peut pas être partagé entre processus")
+
+
+class ShardedFrontier:
+    """
+    Frontière d'un worker, avec l'interface d'UrlFrontier : les URLs ajoutées
+    sont routées vers le shard de leur hôte (envoi groupé au backend), les URLs
+    retirées viennent de la file du shard du worker. `shard=None` : frontière
+    d'amorçage du coordinateur, qui ne fait qu'ajouter.
+    """
+    def __init__(self, backend, shard, shards, limit=None, batch_size=10, flush_size=500, poll_interval=0.05):
+        self.backend = backend
+        self.shard = shard
+        self.shards = shards
+        self.limit = limit
+        self.batch_size = batch_size
+        self.flush_size = flush_size
+        self.poll_interval = poll_interval
+        # « Déjà vu » local : évite d'envoyer plusieurs fois les mêmes liens, le backend déduplique le reste
+        self.seen = BloomFilter()
+        self._buffer = deque()
+        self._outbox = []
+        self._last_empty_poll = 0.0
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def is_seen(self, url):
+        return url in self.seen
+
+    def mark_seen(self, url):
+        self.seen.add(url)
+
+    def push(self, url, depth):
+        if not self.seen.add(url):
+            return False
+        self._outbox.append((shard_for(url, self.shards), url, depth))
+        if len(self._outbox) >= self.flush_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        if self._outbox:
+            outbox, self._outbox = self._outbox, []
+            self.backend.push_many(outbox)
+
+    def pop(self):
+        if not self._buffer and self.shard is not None:
+            self.flush()
+            # File vide : ne pas interroger le backend en boucle
+            now = time.monotonic()
+            if now - self._last_empty_poll >= self.poll_interval:
+                items = self.backend.pop(self.shard, self.batch_size, self.limit)
+                if items:
+                    self._buffer.extend(items)
+                else:
+                    self._last_empty_poll = now
+        return self._buffer.popleft() if self._buffer else None
+
+    def close(self):
+        self.flush()
+
+
+class ShardCrawler(WebCrawler):
+    """
+    WebCrawler d'un worker : crawle les hôtes de son shard et envoie les autres liens à leur propriétaire.
+    """
+    def __init__(self, base_url, backend, shard, shards, max_depth=3, max_pages=None, same_domain=False,
+                 batch_size=10, link_parser="fast", poll_interval=0.2):
+        frontier = ShardedFrontier(backend, shard, shards, max_pages, batch_size)
+        super().__init__(base_url, max_depth, link_parser, frontier=frontier, same_domain=same_domain)
+        self.backend = backend
+        self.shard = shard
+        self.poll_interval = poll_interval
+        self._finished = False
+        self._last_check = 0.0
+
+    def page_done(self, url):
+        # Les liens de la page sont envoyés avant de libérer l'URL : la fin du crawl ne peut pas être anticipée
+        self.frontier.flush()
+        self.backend.complete(url, self.depth_map.get(url))
+
+    def wait_for_urls(self):
+        # File du shard vide : continuer tant que d'autres workers peuvent encore l'alimenter
+        now = time.monotonic()
+        if now - self._last_check >= self.poll_interval:
+            self.frontier.flush()
+            self._finished = self.backend.is_finished(self.frontier.limit)
+            self._last_check = now
+        return not self._finished
+
+    async def run(self, concurrency=10, per_host_delay=1.0, per_host_concurrency=2):
+        """
+        Crawle jusqu'à la fin globale du crawl (pas seulement de la file de ce shard).
+        """
+        await self.crawl_async(float("inf"), concurrency, per_host_delay, per_host_concurrency, seed=False)
+        self.frontier.flush()
+
+
+def seed_backend(backend, base_url, shards, max_depth=3):
+    """
+    Amorce les files : entrées des sitemaps, ou l'URL de base à défaut.
+    """
+    crawler = WebCrawler(base_url, max_depth, frontier=ShardedFrontier(backend, None, shards))
+    crawler.seed_queue(crawler.open_sitemaps())
+    while crawler.has_sitemap_entries():
+        crawler.refill_from_sitemap(10000)
+    crawler.close()
+    return backend.pending()
+
+
+def run_worker(backend, shard, shards, base_url, options):
+    """
+    Point d'entrée d'un worker ; `backend` est un backend ou sa description (spec()).
+    Retourne le nombre de pages crawlées par ce worker.
+    """
+    own_backend = isinstance(backend, tuple)
+    if own_backend:
+        backend = open_backend(backend)
+    crawler = ShardCrawler(base_url, backend, shard, shards, options.get("max_depth", 3),
+                           options.get("max_pages"), options.get("same_domain", False),
+                           options.get("concurrency", 10))
+    try:
+        asyncio.run(crawler.run(options.get("concurrency", 10), options.get("per_host_delay", 1.0),
+                                options.get("per_host_concurrency", 2)))
+    finally:
+        crawler.close()
+        if own_backend:
+            backend.close()
+    print(f"Worker {shard} : {len(crawler.visited_urls)} pages crawlées")
+    return len(crawler.visited_urls)
+
+
+def run_distributed_crawl(base_url, workers=4, backend=None, max_pages=100, max_depth=3, same_domain=False,
+                          concurrency=10, per_host_delay=1.0, per_host_concurrency=2, processes=None):
+    """
+    Coordinateur : amorce les files puis lance `workers` workers, en processus
+    (SQLiteBackend, RedisBackend) ou en threads (LocalBackend, ou processes=False).
+    Sans `backend`, un SQLiteBackend est utilisé. Retourne {url crawlée: profondeur}.
+    Sur plusieurs machines, chaque machine lance run_worker() pour ses shards
+    avec la même description de RedisBackend.
+    """
+    backend = backend if backend is not None else SQLiteBackend()
+    if isinstance(backend, RedisBackend) and backend.shards is None:
+        backend.shards = workers
+    backend.reset()
+    seeded = seed_backend(backend, base_url, workers, max_depth)
+    print(f"{seeded} URLs initiales réparties sur {workers} workers")
+    options = {"max_depth": max_depth, "max_pages": max_pages, "same_domain": same_domain,
+               "concurrency": concurrency, "per_host_delay": per_host_delay,
+               "per_host_concurrency": per_host_concurrency}
+
+    if processes is None:
+        processes = not isinstance(backend, LocalBackend)
+    if not processes:
+        threads = [threading.Thread(target=run_worker, args=(backend, shard, workers, base_url, options))
+                   for shard in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        children = [multiprocessing.Process(target=run_worker,
+                                            args=(backend.spec(), shard, workers, base_url, options))
+                    for shard in range(workers)]
+        for child in children:
+            child.start()
+        try:
+            while any(child.is_alive() for child in children):
+                # Un worker mort ne libérerait jamais ses URLs : arrêter les autres
+                if any(child.exitcode not in (None, 0) for child in children):
+                    raise RuntimeError("Un worker s'est arrêté en erreur, crawl distribué interrompu")
+                time.sleep(0.5)
+        finally:
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+                child.join()
+        if any(child.exitcode != 0 for child in children):
+            raise RuntimeError("Un worker s'est arrêté en erreur, crawl distribué interrompu")
+    return backend.crawled()
+
+
+if __name__ == "__main__":
+    base_url = input("Entrez l'URL de base à crawler : ")
+    workers = int(input("Nombre de workers [4] : ") or 4)
+    crawled = run_distributed_crawl(base_url, workers=workers, max_pages=100, max_depth=2)
+
+    with open("crawled_urls.txt", "w", encoding='utf-8') as f:
+        for url in crawled:
+            f.write(url + "\n")
+
+    print(f"Crawling terminé. {len(crawled)} URLs sauvegardées dans 'crawled_urls.txt'")
@@ -0,0 +1,371 @@
+"""
+Téléchargement et extraction du texte des documents liés (PDF, DOC, DOCX).
+
+Les liens `media.document_links` de toutes les pages sont dédupliqués (URL
+normalisée), téléchargés en parallèle et écrits sur disque au fil de l'eau,
+sous le nom de leur empreinte SHA-256. Le texte est extrait sur un pool de
+processus : PyMuPDF d'abord, pdfplumber / PyPDF2 à défaut, et l'OCR
+(pytesseract) seulement pour les pages PDF sans texte. Les résultats sont mis
+en cache par empreinte : une brochure liée depuis mille pages n'est
+téléchargée et analysée qu'une fois, y compris d'un lancement à l'autre.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+from frontier import normalize_url
+from http_client import create_session
+from metrics import metrics
+
+try:
+    import pymupdf as fitz
+    HAS_PYMUPDF = True
+except ImportError:
+    try:
+        import fitz  # anciennes versions de PyMuPDF
+        HAS_PYMUPDF = True
+    except ImportError:
+        HAS_PYMUPDF = False
+
+try:
+    import pdfplumber
+    HAS_PDFPLUMBER = True
+except ImportError:
+    HAS_PDFPLUMBER = False
+
+try:
+    from PyPDF2 import PdfReader
+    HAS_PYPDF2 = True
+except ImportError:
+    HAS_PYPDF2 = False
+
+try:
+    import docx
+    HAS_PYTHON_DOCX = True
+except ImportError:
+    HAS_PYTHON_DOCX = False
+
+try:
+    import docx2txt
+    HAS_DOCX2TXT = True
+except ImportError:
+    HAS_DOCX2TXT = False
+
+try:
+    import pytesseract
+    from PIL import Image
+    HAS_OCR = True
+except ImportError:
+    HAS_OCR = False
+
+DOCUMENT_KINDS = ("pdf", "doc", "docx")
+
+
+def iter_document_links(pages):
+    """
+    Génère (url, kind, title, page_url) pour chaque lien de document des pages scrapées.
+    """
+    for page in pages:
+        links = (page.get("media") or {}).get("document_links") or {}
+        for kind in DOCUMENT_KINDS:
+            for link in links.get(kind) or []:
+                if link.get("url"):
+                    yield link["url"], kind, link.get("title", ""), page.get("url")
+
+
+def collect_documents(pages):
+    """
+    Déduplique les liens de documents de toutes les pages :
+    {url normalisée: {"url", "kind", "title", "pages": [pages qui la citent]}}.
+    L'URL normalisée ne sert qu'à la déduplication : "url" est le lien tel
+    que l'extracteur l'a construit (première page qui le cite), c'est lui qui
+    est téléchargé.
+    """
+    documents = {}
+    for url, kind, title, page_url in iter_document_links(pages):
+        key = normalize_url(url)
+        document = documents.get(key)
+        if document is None:
+            document = documents[key] = {"url": url, "kind": kind, "title": title, "pages": []}
+        if page_url and page_url not in document["pages"]:
+            document["pages"].append(page_url)
+    return documents
+
+
+class DocumentCache:
+    """
+    Cache persistant (SQLite) : URL -> empreinte du contenu, et empreinte -> texte extrait.
+    """
+    def __init__(self, path="documents.sqlite", directory="documents"):
+        self.path = path
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT,
+                fetched_at REAL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS texts (
+                content_hash TEXT PRIMARY KEY,
+                kind TEXT,
+                text TEXT,
+                method TEXT,
+                pages INTEGER,
+                ocr_pages INTEGER
+            )
+        """)
+        self._conn.commit()
+
+    def hash_for(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash FROM urls WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def record_url(self, url, digest):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (url, content_hash, fetched_at) VALUES (?, ?, ?)",
+                (url, digest, time.time())
+            )
+            self._conn.commit()
+
+    def get_text(self, digest):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kind, text, method, pages, ocr_pages FROM texts WHERE content_hash = ?", (digest,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"kind": row[0], "text": row[1], "method": row[2], "pages": row[3], "ocr_pages": row[4]}
+
+    def store_text(self, digest, kind, extracted):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO texts (content_hash, kind, text, method, pages, ocr_pages) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, kind, extracted["text"], extracted["method"], extracted["pages"],
+                 extracted["ocr_pages"])
+            )
+            self._conn.commit()
+
+    def file_path(self, digest, kind):
+        return os.path.join(self.directory, f"{digest}.{kind}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def download_document(session, url, kind, directory, max_bytes=50 * 1024 * 1024, timeout=30):
+    """
+    Télécharge un document en flux vers `directory` en calculant son empreinte
+    au passage. Retourne (empreinte, chemin) ou (None, None) en cas d'échec.
+    """
+    handle, temp_path = tempfile.mkstemp(prefix="download_", suffix=".part", dir=directory)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(handle, "wb") as f, session.get(url, timeout=timeout, stream=True) as response:
+            if response.status_code != 200:
+                print(f"Erreur lors du téléchargement de {url}: {response.status_code}")
+                return None, None
+            for chunk in response.iter_content(64 * 1024):
+                size += len(chunk)
+                if size > max_bytes:
+                    print(f"Document trop volumineux ignoré ({max_bytes} octets max) : {url}")
+                    return None, None
+                digest.update(chunk)
+                f.write(chunk)
+        metrics.inc("documents_downloaded_total", kind=kind)
+        metrics.inc("document_bytes_total", size)
+        content_hash = digest.hexdigest()
+        path = os.path.join(directory, f"{content_hash}.{kind}")
+        # Le même contenu venu d'une autre URL aboutit au même fichier
+        os.replace(temp_path, path)
+        return content_hash, path
+    except Exception as e:
+        print(f"Erreur lors du téléchargement de {url}: {e}")
+        return None, None
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _pdf_text_pymupdf(path, ocr, ocr_lang):
+    texts = []
+    ocr_pages = 0
+    with fitz.open(path) as pdf:
+        for page in pdf:
+            text = page.get_text()
+            # Page sans couche texte (scan) : OCR en dernier recours
+            if not text.strip() and ocr and HAS_OCR and page.get_images():
+                pixmap = page.get_pixmap(dpi=300)
+                image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+                try:
+                    text = pytesseract.image_to_string(image, lang=ocr_lang)
+                    ocr_pages += 1
+                except Exception as e:
+                    print(f"OCR impossible pour une page de {path}: {e}")
+            texts.append(text)
+    return "\n".join(texts), len(texts), ocr_pages
+
+
+def _pdf_text_pdfplumber(path):
+    with pdfplumber.open(path) as pdf:
+        texts = [page.extract_text() or "" for page in pdf.pages]
+    return "\n".join(texts), len(texts)
+
+
+def _pdf_text_pypdf2(path):
+    reader = PdfReader(path)
+    texts = [page.extract_text() or "" for page in reader.pages]
+    return "\n".join(texts), len(texts)
+
+
+def extract_document_text(path, kind, ocr=True, ocr_lang="fra+eng"):
+    """
+    Extrait le texte d'un fichier (exécuté dans un processus du pool).
+    Retourne {"text", "method", "pages", "ocr_pages"} ; "method" vaut None si
+    aucun backend n'a pu lire le fichier.
+    """
+    result = {"text": "", "method": None, "pages": None, "ocr_pages": 0}
+    if kind == "pdf":
+        if HAS_PYMUPDF:
+            try:
+                result["text"], result["pages"], result["ocr_pages"] = _pdf_text_pymupdf(path, ocr, ocr_lang)
+                result["method"] = "pymupdf+ocr" if result["ocr_pages"] else "pymupdf"
+                return result
+            except Exception as e:
+                print(f"PyMuPDF n'a pas pu lire {path}: {e}")
+        for method, available, reader in (("pdfplumber", HAS_PDFPLUMBER, _pdf_text_pdfplumber),
+                                          ("pypdf2", HAS_PYPDF2, _pdf_text_pypdf2)):
+            if not available:
+                continue
+            try:
+                result["text"], result["pages"] = reader(path)
+                result["method"] = method
+                return result
+            except Exception as e:
+                print(f"{method} n'a pas pu lire {path}: {e}")
+    elif kind == "docx":
+        if HAS_PYTHON_DOCX:
+            try:
+                result["text"] = "\n".join(paragraph.text for paragraph in docx.Document(path).paragraphs)
+                result["method"] = "python-docx"
+                return result
+            except Exception as e:
+                print(f"python-docx n'a pas pu lire {path}: {e}")
+        if HAS_DOCX2TXT:
+            try:
+                result["text"] = docx2txt.process(path) or ""
+                result["method"] = "docx2txt"
+                return result
+            except Exception as e:
+                print(f"docx2txt n'a pas pu lire {path}: {e}")
+    else:
+        # Ancien format Word (.doc) : aucun des backends installés ne sait le lire
+        print(f"Format {kind} non pris en charge : {path}")
+    return result
+
+
+def iter_document_texts(pages, cache=None, download_workers=8, extract_workers=None, session=None,
+                        ocr=True, ocr_lang="fra+eng", max_bytes=50 * 1024 * 1024):
+    """
+    Télécharge et extrait les documents liés par `pages`, une seule fois par URL
+    et par contenu. Génère, au fur et à mesure, des dictionnaires
+    {"url", "kind", "title", "pages", "content_hash", "text", "method", "page_count", "ocr_pages"}.
+    Les URLs déjà connues du `cache` (DocumentCache) ne sont pas retéléchargées
+    et un contenu déjà extrait n'est pas réanalysé.
+    """
+    cache = cache or DocumentCache()
+    documents = collect_documents(pages)
+    session = session or create_session(pool_maxsize=download_workers)
+    print(f"{len(documents)} documents distincts à traiter")
+
+    def result_for(document, digest, extracted):
+        item = dict(document)
+        item.update({
+            "content_hash": digest,
+            "text": extracted["text"],
+            "method": extracted["method"],
+            "page_count": extracted["pages"],
+            "ocr_pages": extracted["ocr_pages"],
+        })
+        return item
+
+    def download(document):
+        digest = cache.hash_for(document["url"])
+        if digest and (cache.get_text(digest) or os.path.exists(cache.file_path(digest, document["kind"]))):
+            return document, digest
+        print(f"Téléchargement du document : {document['url']}")
+        digest, _ = download_document(session, document["url"], document["kind"], cache.directory,
+                                      max_bytes)
+        if digest:
+            cache.record_url(document["url"], digest)
+        return document, digest
+
+    # Documents en attente d'extraction, par empreinte (un même contenu n'est extrait qu'une fois)
+    waiting = {}
+    extractions = {}
+    with ThreadPoolExecutor(max_workers=download_workers) as downloader, \
+            ProcessPoolExecutor(max_workers=extract_workers) as extractor:
+        downloads = [downloader.submit(download, document) for document in documents.values()]
+        for future in as_completed(downloads):
+            document, digest = future.result()
+            if digest is None:
+                continue
+            extracted = cache.get_text(digest)
+            if extracted is not None:
+                metrics.inc("document_cache_total", result="hit")
+                yield result_for(document, digest, extracted)
+                continue
+            if digest not in waiting:
+                waiting[digest] = []
+                path = cache.file_path(digest, document["kind"])
+                extraction = extractor.submit(extract_document_text, path, document["kind"], ocr, ocr_lang)
+                extractions[extraction] = (digest, document["kind"])
+            waiting[digest].append(document)
+
+            # Émettre les extractions déjà terminées sans attendre la fin des téléchargements
+            finished, _ = wait(list(extractions), timeout=0, return_when=FIRST_COMPLETED)
+            for item in _finish_extractions(finished, extractions, waiting, cache):
+                yield result_for(*item)
+
+        for item in _finish_extractions(as_completed(list(extractions)), extractions, waiting, cache):
+            yield result_for(*item)
+
+
+def _finish_extractions(finished, extractions, waiting, cache):
+    for extraction in finished:
+        digest, kind = extractions.pop(extraction)
+        try:
+            extracted = extraction.result()
+        except Exception as e:
+            print(f"Erreur lors de l'extraction du document {digest}: {e}")
+            waiting.pop(digest, None)
+            continue
+        cache.store_text(digest, kind, extracted)
+        for document in waiting.pop(digest, []):
+            yield document, digest, extracted
+
+
+if __name__ == "__main__":
+    from clean_json import iter_records
+    from output import JsonlWriter
+
+    document_cache = DocumentCache()
+    with JsonlWriter("documents.jsonl") as writer:
+        for document in iter_document_texts(iter_records("scraped_data.json"), document_cache):
+            writer.write(document)
+    document_cache.close()
+    print(f"{writer.count} documents écrits dans 'documents.jsonl'")
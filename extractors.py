@@ -0,0 +1,465 @@
+"""
+Moteur d'extraction en une seule passe.
+
+Chaque extracteur déclare les balises qui l'intéressent ; le moteur parcourt
+l'arbre HTML une seule fois et distribue chaque balise aux extracteurs concernés.
+Un extracteur peut ouvrir une « portée » sur une balise (footer, formulaire,
+bloc contact...) pour recevoir ensuite les balises descendantes de celle-ci,
+sans relancer de find_all sur le sous-arbre.
+"""
+import json
+import time
+from urllib.parse import urljoin
+from bs4.element import Tag
+
+from metrics import metrics
+
+SECTIONS = ["metadata", "content", "navigation", "forms", "media", "structured_data", "business_info"]
+
+
+def has_class(tag, class_name):
+    return class_name in (tag.get("class") or ())
+
+
+class Scope:
+    """
+    Portée ouverte sur une balise : `callback` reçoit les descendants
+    dont le nom figure dans `names`.
+    """
+    def __init__(self, names, callback):
+        self.names = names
+        self.callback = callback
+
+
+class Extractor:
+    """
+    Classe de base des extracteurs : une instance est créée pour chaque page.
+    `tags` liste les balises reçues par handle() ; `attributes` liste les
+    attributs qui déclenchent handle_attribute() quelle que soit la balise.
+    """
+    section = None
+    tags = ()
+    attributes = ()
+
+    def __init__(self, url):
+        self.url = url
+
+    def handle(self, tag):
+        return None
+
+    def handle_attribute(self, tag, attribute):
+        pass
+
+    def finish(self, result):
+        pass
+
+
+class MetadataExtractor(Extractor):
+    section = "metadata"
+    tags = ("title", "meta", "ol")
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.title = None
+        self.meta = {}
+        self.breadcrumb = None
+
+    def handle(self, tag):
+        if tag.name == "title":
+            if self.title is None:
+                self.title = tag
+        elif tag.name == "meta":
+            name = tag.get("name")
+            if name in ("description", "keywords", "last-modified") and name not in self.meta:
+                self.meta[name] = tag
+        elif self.breadcrumb is None and has_class(tag, "breadcrumb"):
+            self.breadcrumb = []
+            return Scope(("li",), lambda li: self.breadcrumb.append(li.get_text(strip=True)))
+
+    def finish(self, result):
+        # Titre de la page
+        if self.title:
+            result["title"] = self.title.string.strip()
+
+        # Méta description
+        description = self.meta.get("description")
+        if description and description.get("content"):
+            result["description"] = description["content"].strip()
+
+        # Mots-clés
+        keywords = self.meta.get("keywords")
+        if keywords and keywords.get("content"):
+            result["keywords"] = [keyword.strip() for keyword in keywords["content"].split(",")]
+
+        # Date de dernière modification
+        last_modified = self.meta.get("last-modified")
+        if last_modified and last_modified.get("content"):
+            result["last_modified"] = last_modified["content"]
+
+        # Fil d'Ariane (Breadcrumb)
+        if self.breadcrumb is not None:
+            result["breadcrumb"] = self.breadcrumb
+
+
+class ContentExtractor(Extractor):
+    section = "content"
+    tags = ("h1", "h2", "h3", "h4", "h5", "h6", "p")
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.headings = {}
+        self.paragraphs = []
+
+    def handle(self, tag):
+        if tag.name == "p":
+            self.paragraphs.append(tag.get_text(strip=True))
+        else:
+            self.headings.setdefault(tag.name, []).append(tag.get_text(strip=True))
+
+    def finish(self, result):
+        # Titres (H1-H6), dans l'ordre des niveaux
+        result["headings"] = {
+            f"h{i}": self.headings[f"h{i}"] for i in range(1, 7) if f"h{i}" in self.headings
+        }
+        result["paragraphs"] = self.paragraphs
+
+
+class NavigationExtractor(Extractor):
+    section = "navigation"
+    tags = ("nav", "footer", "ol")
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.main_menu = None
+        self.footer_links = None
+        self.breadcrumb = None
+
+    def handle(self, tag):
+        # Menu principal : premier <nav class="menu">
+        if tag.name == "nav":
+            if self.main_menu is None and has_class(tag, "menu"):
+                self.main_menu = []
+                return Scope(("a",), lambda a: self.main_menu.append(a.get_text(strip=True)))
+        # Liens de pied de page : premier <footer>
+        elif tag.name == "footer":
+            if self.footer_links is None:
+                self.footer_links = []
+                return Scope(("a",), lambda a: self.footer_links.append(a.get_text(strip=True)))
+        elif self.breadcrumb is None and has_class(tag, "breadcrumb"):
+            self.breadcrumb = []
+            return Scope(("li",), lambda li: self.breadcrumb.append(li.get_text(strip=True)))
+
+    def finish(self, result):
+        if self.main_menu is not None:
+            result["main_menu"] = self.main_menu
+        result["footer_links"] = self.footer_links or []
+        if self.breadcrumb is not None:
+            result["breadcrumb"] = self.breadcrumb
+
+
+class FormsExtractor(Extractor):
+    section = "forms"
+    tags = ("form",)
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.forms = []
+
+    def handle(self, tag):
+        fields = []
+        self.forms.append(fields)
+        return Scope(("input", "textarea", "select"), lambda input_tag: fields.append({
+            "type": input_tag.get("type"),
+            "name": input_tag.get("name"),
+            "placeholder": input_tag.get("placeholder"),
+            "value": input_tag.get("value")
+        }))
+
+    def finish(self, result):
+        if self.forms:
+            result["details"] = self.forms
+
+
+class MediaExtractor(Extractor):
+    section = "media"
+    tags = ("img", "video", "a")
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.image_alt_texts = []
+        self.video_descriptions = []
+        self.document_links = {"pdf": [], "doc": [], "docx": []}
+
+    def handle(self, tag):
+        # Texte alternatif d'images
+        if tag.name == "img":
+            if tag.get("alt"):
+                self.image_alt_texts.append(tag.get("alt"))
+        # Descriptions de vidéos
+        elif tag.name == "video":
+            self.video_descriptions.append(tag.get("title") or tag.get("description"))
+        # Liens vers documents (seulement PDF, DOC, DOCX)
+        elif tag.get("href") is not None:
+            href = tag.get("href", "").strip()
+            # Minuscules pour l'extension seulement : chemins et paramètres sont sensibles à la casse
+            extension = href.lower()
+            if extension.endswith(".pdf"):
+                kind = "pdf"
+            elif extension.endswith(".doc"):
+                kind = "doc"
+            elif extension.endswith(".docx"):
+                kind = "docx"
+            else:
+                return
+
+            # Lien relatif résolu par rapport à la page (docs/a.pdf sur /x/y.html -> /x/docs/a.pdf)
+            full_href = urljoin(self.url, href)
+
+            self.document_links[kind].append({
+                "url": full_href,
+                "title": tag.get("title", "") or tag.get_text(strip=True)
+            })
+
+    def finish(self, result):
+        result["image_alt_texts"] = self.image_alt_texts
+        result["video_descriptions"] = self.video_descriptions
+        result["document_links"] = self.document_links
+
+
+class StructuredDataExtractor(Extractor):
+    section = "structured_data"
+    tags = ("script",)
+    attributes = ("itemprop",)
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.json_ld = None
+        self.schema_org = None
+        self.microdata = []
+
+    def handle(self, tag):
+        if tag.get("type") != "application/ld+json":
+            return
+        if self.json_ld is None:
+            self.json_ld = []
+            self.schema_org = []
+        # Un seul json.loads par script, partagé entre JSON-LD et Schema.org
+        try:
+            parsed = json.loads(tag.string)
+        except Exception as e:
+            print(f"Erreur lors de l'analyse du JSON-LD : {e}")
+            return
+        self.json_ld.append(parsed)
+        try:
+            if "@type" in parsed:
+                self.schema_org.append(parsed)
+        except Exception as e:
+            print(f"Erreur lors de l'analyse du Schema.org : {e}")
+
+    def handle_attribute(self, tag, attribute):
+        # Microdata
+        self.microdata.append({
+            "itemprop": tag.get("itemprop"),
+            "content": tag.get_text(strip=True)
+        })
+
+    def finish(self, result):
+        if self.json_ld is not None:
+            result["json_ld"] = self.json_ld
+        if self.microdata:
+            result["microdata"] = self.microdata
+        if self.schema_org is not None:
+            result["schema_org"] = self.schema_org
+
+
+class BusinessInfoExtractor(Extractor):
+    section = "business_info"
+    tags = ("div", "time", "li", "section", "blockquote")
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.contact = None
+        self.opening_hours = None
+        self.services = []
+        self.about_us = None
+        self.team = []
+        self.testimonials = []
+
+    def _first_match(self, found, names, match):
+        # Portée qui ne retient que la première balise satisfaisant `match`
+        def callback(tag):
+            key = match(tag)
+            if key and key not in found:
+                found[key] = tag
+        return Scope(names, callback)
+
+    def _contact_field(self, tag):
+        if tag.name == "span":
+            if has_class(tag, "phone"):
+                return "phone"
+            if has_class(tag, "address"):
+                return "address"
+        elif "mailto:" in (tag.get("href") or ""):
+            return "email"
+        return None
+
+    def handle(self, tag):
+        name = tag.name
+        if name == "div":
+            # Coordonnées (téléphone, email, adresse)
+            if self.contact is None and has_class(tag, "contact-info"):
+                self.contact = {}
+                return self._first_match(self.contact, ("span", "a"), self._contact_field)
+            # Informations équipe
+            if has_class(tag, "team-member"):
+                member = {}
+                self.team.append(member)
+                return self._first_match(member, ("h3", "p"), lambda t: t.name)
+        # Horaires d'ouverture
+        elif name == "time":
+            if self.opening_hours is None and tag.get("datetime") is not None:
+                self.opening_hours = tag["datetime"]
+        # Services/produits offerts
+        elif name == "li":
+            if has_class(tag, "service-item"):
+                self.services.append(tag.get_text(strip=True))
+        # Contenu "À propos"
+        elif name == "section":
+            if self.about_us is None and tag.get("id") == "about-us":
+                self.about_us = tag.get_text(strip=True)
+        # Témoignages/avis
+        elif has_class(tag, "testimonial"):
+            testimonial = {"tag": tag}
+            self.testimonials.append(testimonial)
+            return self._first_match(testimonial, ("cite",), lambda t: t.name)
+
+    def finish(self, result):
+        if self.contact:
+            if "phone" in self.contact:
+                result["phone"] = self.contact["phone"].get_text(strip=True)
+            if "email" in self.contact:
+                result["email"] = self.contact["email"]["href"].replace("mailto:", "")
+            if "address" in self.contact:
+                result["address"] = self.contact["address"].get_text(strip=True)
+
+        if self.opening_hours is not None:
+            result["opening_hours"] = self.opening_hours
+
+        if self.services:
+            result["services_offered"] = self.services
+
+        if self.about_us is not None:
+            result["about_us"] = self.about_us
+
+        if self.team:
+            result["team"] = [
+                {
+                    "name": member.get("h3").get_text(strip=True),
+                    "role": member.get("p").get_text(strip=True)
+                } for member in self.team
+            ]
+
+        if self.testimonials:
+            result["testimonials"] = [
+                {
+                    "text": testimonial["tag"].get_text(strip=True),
+                    "author": testimonial.get("cite").get_text(strip=True)
+                } for testimonial in self.testimonials
+            ]
+
+
+DEFAULT_EXTRACTORS = [
+    MetadataExtractor,
+    ContentExtractor,
+    NavigationExtractor,
+    FormsExtractor,
+    MediaExtractor,
+    StructuredDataExtractor,
+    BusinessInfoExtractor,
+]
+
+
+class ExtractionEngine:
+    """
+    Enregistre des extracteurs et les exécute pendant un unique parcours de l'arbre.
+    """
+    def __init__(self, extractors=None):
+        self.extractors = []
+        for extractor in (DEFAULT_EXTRACTORS if extractors is None else extractors):
+            self.register(extractor)
+
+    def register(self, extractor):
+        self.extractors.append(extractor)
+
+    def extract(self, soup, url):
+        data = {"url": url}
+        for section in SECTIONS:
+            data[section] = {}
+
+        instances = [extractor(url) for extractor in self.extractors]
+        # Temps passé dans chaque extracteur (uniquement en mode métriques détaillées)
+        timings = {} if metrics.detailed else None
+        by_tag = {}
+        by_attribute = {}
+        for instance in instances:
+            handle, handle_attribute = instance.handle, instance.handle_attribute
+            if timings is not None:
+                name = type(instance).__name__
+                handle = _timed(handle, timings, name)
+                handle_attribute = _timed(handle_attribute, timings, name)
+            for name in instance.tags:
+                by_tag.setdefault(name, []).append(handle)
+            for attribute in instance.attributes:
+                by_attribute.setdefault(attribute, []).append(handle_attribute)
+
+        # Parcours en profondeur, dans l'ordre du document, avec une pile explicite
+        stack = [(child, ()) for child in reversed(soup.contents) if isinstance(child, Tag)]
+        while stack:
+            tag, scopes = stack.pop()
+            name = tag.name
+
+            for scope in scopes:
+                if name in scope.names:
+                    scope.callback(tag)
+
+            child_scopes = scopes
+            for handle in by_tag.get(name, ()):
+                scope = handle(tag)
+                if scope is not None:
+                    child_scopes = child_scopes + (scope,)
+
+            if by_attribute:
+                for attribute, handlers in by_attribute.items():
+                    if tag.get(attribute) is not None:
+                        for handle in handlers:
+                            handle(tag, attribute)
+
+            children = [child for child in tag.contents if isinstance(child, Tag)]
+            stack.extend((child, child_scopes) for child in reversed(children))
+
+        for instance in instances:
+            if timings is None:
+                instance.finish(data[instance.section])
+            else:
+                _timed(instance.finish, timings, type(instance).__name__)(data[instance.section])
+        if timings is not None:
+            for name, seconds in timings.items():
+                metrics.observe("extractor_seconds", seconds, extractor=name)
+        return data
+
+
+def _timed(method, timings, name):
+    def timed(*args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+    return timed
+
+
+default_engine = ExtractionEngine()
+
+
+def extract_from_soup(soup, url, engine=None):
+    return (engine or default_engine).extract(soup, url)
@@ -0,0 +1,247 @@
+"""
+Filtrage des réponses avant le parsing.
+
+Les pages sont lues en flux : Content-Type et Content-Length sont vérifiés
+dès les en-têtes, puis les premiers octets du corps sont reconnus (signatures
+PDF, Office, images, archives...). Un contenu qui n'est pas du HTML est
+abandonné sans télécharger la suite ; un document (PDF, DOC, DOCX) est
+confié à un gestionnaire de documents (`on_document`, ou la liste bornée
+`documents` avec collect_documents=True, à passer à
+documents.iter_document_texts via document_pages()). Sans l'un ni l'autre, il
+est seulement compté. Au-delà de
+`max_bytes`, la lecture s'arrête et la page est ignorée.
+
+L'encodage est pris dans l'en-tête Content-Type ou dans la balise <meta> du
+début de page, sans détection de charset sur tout le corps.
+"""
+import codecs
+import re
+import threading
+from urllib.parse import urlsplit
+
+from metrics import metrics
+
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+SNIFF_BYTES = 2048
+CHUNK_SIZE = 16 * 1024
+
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+# Types souvent mal déclarés par les serveurs : décidés sur les premiers octets
+SNIFFED_TYPES = ("", "application/octet-stream", "text/plain", "binary/octet-stream")
+DOCUMENT_TYPES = {
+    "application/pdf": "pdf",
+    "application/x-pdf": "pdf",
+    "application/msword": "doc",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+}
+SIGNATURES = (
+    (b"%PDF-", "pdf"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "doc"),
+    (b"PK\x03\x04", "zip"),
+    (b"\x89PNG", "image"),
+    (b"GIF8", "image"),
+    (b"\xff\xd8\xff", "image"),
+    (b"RIFF", "media"),
+    (b"ID3", "media"),
+    (b"OggS", "media"),
+    (b"\x1f\x8b", "gzip"),
+    (b"7z\xbc\xaf", "archive"),
+    (b"Rar!", "archive"),
+)
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)""", re.I)
+_BOMS = ((b"\xef\xbb\xbf", "utf-8"), (b"\xff\xfe", "utf-16-le"), (b"\xfe\xff", "utf-16-be"))
+
+
+class SkippedContent(Exception):
+    """
+    Réponse écartée avant le parsing (`kind` : type de document routé, ou None).
+    """
+    def __init__(self, url, reason, kind=None):
+        super().__init__(f"contenu ignoré ({reason})")
+        self.url = url
+        self.reason = reason
+        self.kind = kind
+
+
+def media_type(headers):
+    return (headers.get("Content-Type") or "").split(";")[0].strip().lower()
+
+
+def sniff(prefix):
+    """
+    Type reconnu d'après les premiers octets : "html", "text", une signature
+    de SIGNATURES ("pdf", "doc", "zip", "image"...), ou "binary".
+    """
+    for signature, kind in SIGNATURES:
+        if prefix.startswith(signature):
+            return kind
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            text = prefix[len(bom):].decode(encoding, errors="ignore")
+            return "html" if text.lstrip().startswith("<") else "text"
+    if b"\x00" in prefix:
+        return "binary"
+    return "html" if prefix.lstrip().startswith(b"<") else "text"
+
+
+def _known_encoding(name):
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def charset(headers, prefix):
+    """
+    Encodage déclaré (en-tête, BOM ou <meta charset> des premiers octets), ou None.
+    """
+    match = re.search(r"charset\s*=\s*[\"']?([\w.:-]+)", headers.get("Content-Type") or "", re.I)
+    if match and _known_encoding(match.group(1)):
+        return match.group(1)
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    match = _META_CHARSET.search(prefix)
+    if match and _known_encoding(match.group(1).decode("ascii")):
+        return match.group(1).decode("ascii")
+    return None
+
+
+class FetchGate:
+    """
+    Décide, au fil de la lecture d'une réponse, si elle doit être parsée.
+    `on_document(url, kind)` reçoit les documents écartés ; avec
+    `collect_documents=True` les `max_documents` premiers sont ajoutés à
+    `documents` (à vider par l'appelant, les suivants sont comptés comme
+    perdus), sinon ils ne sont que comptés dans les métriques.
+    """
+    def __init__(self, max_bytes=MAX_PAGE_BYTES, sniff_bytes=SNIFF_BYTES, on_document=None, collect_documents=False,
+                 max_documents=10000):
+        self.max_bytes = max_bytes
+        self.sniff_bytes = sniff_bytes
+        self.on_document = on_document
+        self.collect_documents = collect_documents
+        self.max_documents = max_documents
+        self.documents = []
+        self._lock = threading.Lock()
+
+    def skip(self, url, reason, kind=None, avoided=0):
+        metrics.inc("pages_skipped_total", reason=reason.split(" ")[0])
+        if avoided:
+            metrics.inc("http_bytes_avoided_total", avoided)
+        if kind:
+            if self.on_document is not None:
+                self.on_document(url, kind)
+            elif self.collect_documents:
+                with self._lock:
+                    if len(self.documents) < self.max_documents:
+                        self.documents.append((url, kind))
+                    else:
+                        metrics.inc("documents_dropped_total")
+        return SkippedContent(url, reason, kind)
+
+    def check_headers(self, url, headers):
+        """
+        Vérifications possibles avant de lire le corps. Lève SkippedContent.
+        """
+        declared = media_type(headers)
+        try:
+            length = int(headers.get("Content-Length") or 0)
+        except ValueError:
+            length = 0
+        kind = DOCUMENT_TYPES.get(declared)
+        if kind:
+            raise self.skip(url, f"document {kind}", kind, length)
+        if declared not in HTML_TYPES and declared not in SNIFFED_TYPES:
+            raise self.skip(url, f"type {declared}", avoided=length)
+        if length > self.max_bytes:
+            raise self.skip(url, f"taille {length} octets", avoided=length)
+
+    def check_prefix(self, url, headers, prefix):
+        """
+        Vérifie les premiers octets du corps. Lève SkippedContent.
+        """
+        declared = media_type(headers)
+        kind = sniff(prefix)
+        if kind == "zip" and (declared in DOCUMENT_TYPES or urlsplit(url).path.lower().endswith(".docx")):
+            kind = "docx"
+        if kind in ("pdf", "doc", "docx"):
+            raise self.skip(url, f"document {kind}", kind)
+        if kind == "html" or (kind == "text" and declared in HTML_TYPES):
+            return
+        raise self.skip(url, f"contenu {kind}")
+
+    def check_size(self, url, size):
+        if size > self.max_bytes:
+            raise self.skip(url, f"taille > {self.max_bytes} octets")
+
+    def check(self, url, headers, body):
+        """
+        Toutes les vérifications sur une réponse déjà lue (entrée du cache HTTP).
+        """
+        self.check_headers(url, headers)
+        self.check_prefix(url, headers, body[:self.sniff_bytes])
+        self.check_size(url, len(body))
+
+    def read(self, url, response):
+        """
+        Lit le corps d'une réponse requests ouverte avec stream=True, en
+        s'arrêtant dès qu'il est écarté. Retourne (corps, encodage).
+        """
+        size = 0
+        try:
+            self.check_headers(url, response.headers)
+            chunks = []
+            checked = False
+            for chunk in response.iter_content(CHUNK_SIZE):
+                chunks.append(chunk)
+                size += len(chunk)
+                self.check_size(url, size)
+                if not checked and size >= self.sniff_bytes:
+                    self.check_prefix(url, response.headers, b"".join(chunks)[:self.sniff_bytes])
+                    checked = True
+            body = b"".join(chunks)
+            if not checked:
+                self.check_prefix(url, response.headers, body)
+        finally:
+            metrics.inc("http_bytes_total", size)
+            response.close()
+        return body, charset(response.headers, body[:self.sniff_bytes])
+
+    async def read_async(self, url, response):
+        """
+        Équivalent de read() pour une réponse aiohttp.
+        """
+        self.check_headers(url, response.headers)
+        chunks = []
+        size = 0
+        checked = False
+        try:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                chunks.append(chunk)
+                size += len(chunk)
+                self.check_size(url, size)
+                if not checked and size >= self.sniff_bytes:
+                    self.check_prefix(url, response.headers, b"".join(chunks)[:self.sniff_bytes])
+                    checked = True
+            body = b"".join(chunks)
+            if not checked:
+                self.check_prefix(url, response.headers, body)
+        finally:
+            metrics.inc("http_bytes_total", size)
+        return body, charset(response.headers, body[:self.sniff_bytes])
+
+    def document_pages(self):
+        """
+        Documents écartés, sous la forme de pages attendue par documents.iter_document_texts.
+        """
+        with self._lock:
+            documents = list(self.documents)
+        return [
+            {"url": url, "media": {"document_links": {kind: [{"url": url, "title": ""}]}}}
+            for url, kind in documents
+        ]
+
+
+# Filtre partagé par défaut (scrapper_2, service) : ne garde aucun document en mémoire
+default_gate = FetchGate()
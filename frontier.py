@@ -0,0 +1,260 @@
+"""
+Frontière d'URLs du crawler.
+
+- normalize_url : forme canonique d'une URL (schéma/hôte en minuscules, port
+  par défaut, fragment et paramètres de suivi supprimés, paramètres triés,
+  encodage des valeurs conservé tel quel) ;
+- BloomFilter / FingerprintSet : ensembles « déjà vus » compacts ;
+- UrlFrontier : file à priorité (profondeur, puis alternance des hôtes) qui
+  déborde sur disque (SQLite) au-delà d'un budget mémoire.
+"""
+import hashlib
+import heapq
+import math
+import os
+import sqlite3
+import tempfile
+import weakref
+from urllib.parse import urlsplit, urlunsplit, unquote_plus
+
+import numpy as np
+
+TRACKING_PARAMS = {
+    "gclid", "fbclid", "msclkid", "dclid", "yclid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "igshid", "ref_src", "sessionid", "phpsessid", "jsessionid",
+}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url, tracking_params=TRACKING_PARAMS):
+    """
+    Forme canonique d'une URL, pour que les variantes d'une même page
+    (fragment, ordre des paramètres, paramètres de suivi) soient dédupliquées.
+    C'est aussi l'URL téléchargée : les paramètres gardent leur encodage
+    d'origine (« ?p=a/b » n'est pas réécrit en « ?p=a%2Fb »).
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        # Adresse IPv6 : urlsplit a retiré les crochets
+        host = f"[{host}]"
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username is not None:
+        userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+        host = f"{userinfo}@{host}"
+    query = []
+    for param in parts.query.split("&"):
+        # Nom décodé seulement pour reconnaître les paramètres de suivi ;
+        # « ?foo » et « ?foo= » restent distincts
+        key = unquote_plus(param.partition("=")[0]).lower()
+        if not key or key.startswith("utm_") or key in tracking_params:
+            continue
+        query.append(param)
+    query = "&".join(sorted(query))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def fingerprint(url):
+    # Empreinte 64 bits de l'URL
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class BloomFilter:
+    """
+    Filtre de Bloom : `capacity` éléments pour un taux de faux positifs `error_rate`.
+    Un faux positif fait ignorer une URL jamais vue ; il n'y a pas de faux négatif.
+    """
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """
+        Ajoute l'élément ; retourne False s'il était (probablement) déjà présent.
+        """
+        new = False
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, item):
+        return all(self.bits[p // 8] & (1 << (p % 8)) for p in self._positions(item))
+
+    def __len__(self):
+        return self.count
+
+
+class FingerprintSet:
+    """
+    Ensemble exact (aux collisions 64 bits près) d'empreintes d'URLs :
+    tableau trié de 8 octets par URL, plus un petit tampon fusionné périodiquement.
+    """
+    def __init__(self, merge_every=50_000):
+        self.sorted = np.empty(0, dtype=np.uint64)
+        self.buffer = set()
+        self.merge_every = merge_every
+
+    def _merge(self):
+        # Fusion linéaire : seul le tampon est trié, puis inséré à sa place dans
+        # le tableau (les empreintes du tampon n'y figurent pas, voir add())
+        buffer = np.fromiter(self.buffer, dtype=np.uint64, count=len(self.buffer))
+        buffer.sort()
+        self.sorted = np.insert(self.sorted, np.searchsorted(self.sorted, buffer), buffer)
+        self.buffer = set()
+
+    def _contains(self, value):
+        if value in self.buffer:
+            return True
+        index = self.sorted.searchsorted(np.uint64(value))
+        return index < len(self.sorted) and self.sorted[index] == value
+
+    def __contains__(self, item):
+        return self._contains(fingerprint(item))
+
+    def add(self, item):
+        value = fingerprint(item)
+        if self._contains(value):
+            return False
+        self.buffer.add(value)
+        if len(self.buffer) >= self.merge_every:
+            self._merge()
+        return True
+
+    def __len__(self):
+        return len(self.sorted) + len(self.buffer)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class UrlFrontier:
+    """
+    File de priorité des URLs à crawler : profondeur croissante, puis
+    alternance entre hôtes. Au-delà de `max_in_memory` URLs en attente, la
+    moitié la moins prioritaire est déplacée dans un fichier SQLite.
+    """
+    def __init__(self, max_in_memory=100_000, seen=None, spill_path=None):
+        self.max_in_memory = max_in_memory
+        self.seen = seen if seen is not None else BloomFilter()
+        self.spill_path = spill_path
+        self._heap = []
+        self._host_counts = {}
+        self._sequence = 0
+        self._spill = None
+        self._spilled = 0
+        self._spill_min = None
+        self._temp_path = None
+        self._cleanup = None
+
+    def __len__(self):
+        return len(self._heap) + self._spilled
+
+    def is_seen(self, url):
+        return url in self.seen
+
+    def mark_seen(self, url):
+        self.seen.add(url)
+
+    def push(self, url, depth):
+        """
+        Ajoute une URL (déjà normalisée) ; retourne False si elle a déjà été vue.
+        """
+        if not self.seen.add(url):
+            return False
+        host = urlsplit(url).netloc
+        # Les hôtes déjà très présents passent après les autres à profondeur égale
+        host_rank = self._host_counts.get(host, 0)
+        self._host_counts[host] = host_rank + 1
+        self._sequence += 1
+        heapq.heappush(self._heap, (depth, host_rank, self._sequence, url))
+        if len(self._heap) > self.max_in_memory:
+            self._spill_half()
+        return True
+
+    def pop(self):
+        """
+        Retourne (url, profondeur) de l'URL la plus prioritaire, ou None si vide.
+        """
+        if self._spilled and (not self._heap or self._spill_min < self._heap[0]):
+            self._load_spilled()
+        if not self._heap:
+            return None
+        depth, _, _, url = heapq.heappop(self._heap)
+        return url, depth
+
+    def _open_spill(self):
+        if self._spill is None:
+            path = self.spill_path
+            if path is None:
+                handle, path = tempfile.mkstemp(prefix="frontier_", suffix=".sqlite")
+                os.close(handle)
+                self._temp_path = path
+                # Fichier supprimé même si close() n'est jamais appelé
+                self._cleanup = weakref.finalize(self, _remove_file, path)
+            self._spill = sqlite3.connect(path)
+            self._spill.execute("DROP TABLE IF EXISTS frontier")
+            self._spill.execute(
+                "CREATE TABLE frontier (depth INTEGER, host_rank INTEGER, sequence INTEGER, url TEXT)"
+            )
+            self._spill.execute("CREATE INDEX frontier_priority ON frontier (depth, host_rank, sequence)")
+        return self._spill
+
+    def _spill_half(self):
+        # Garder en mémoire la moitié la plus prioritaire, écrire le reste sur disque
+        self._heap.sort()
+        keep = self.max_in_memory // 2
+        spilled = self._heap[keep:]
+        del self._heap[keep:]
+        spill = self._open_spill()
+        spill.executemany("INSERT INTO frontier VALUES (?, ?, ?, ?)", spilled)
+        spill.commit()
+        self._spilled += len(spilled)
+        self._update_spill_min()
+
+    def _load_spilled(self):
+        spill = self._open_spill()
+        rows = spill.execute(
+            "SELECT rowid, depth, host_rank, sequence, url FROM frontier "
+            "ORDER BY depth, host_rank, sequence LIMIT ?", (max(1, self.max_in_memory // 2),)
+        ).fetchall()
+        spill.executemany("DELETE FROM frontier WHERE rowid = ?", [(row[0],) for row in rows])
+        spill.commit()
+        self._spilled -= len(rows)
+        for row in rows:
+            heapq.heappush(self._heap, tuple(row[1:]))
+        self._update_spill_min()
+
+    def _update_spill_min(self):
+        row = self._spill.execute(
+            "SELECT depth, host_rank, sequence, url FROM frontier "
+            "ORDER BY depth, host_rank, sequence LIMIT 1"
+        ).fetchone()
+        self._spill_min = tuple(row) if row else None
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        if self._cleanup is not None:
+            self._cleanup()
+            self._cleanup = None
+            self._temp_path = None
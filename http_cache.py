@@ -0,0 +1,314 @@
+"""
+Cache HTTP persistant (SQLite) partagé par le crawler et le scraper.
+
+Les réponses 200 sont stockées par URL normalisée avec leur corps, leurs
+en-têtes, l'ETag et le Last-Modified. Une entrée plus jeune que `ttl` est
+servie sans requête ; au-delà, une requête conditionnelle
+(If-None-Match / If-Modified-Since) est envoyée et un 304 est servi depuis
+le cache. La taille totale est bornée par `max_bytes` avec une éviction LRU.
+Le total des tailles est tenu à jour en mémoire et les dates d'accès (LRU)
+sont écrites par lots, pour qu'une lecture ne coûte pas une écriture.
+"""
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from requests.structures import CaseInsensitiveDict
+
+from metrics import metrics
+from http_client import get_async
+
+
+def normalize_cache_key(url):
+    """
+    Clé de cache : schéma et hôte en minuscules, fragment supprimé,
+    paramètres de requête triés.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+class CachedResponse:
+    """
+    Réponse minimale (status_code, headers, content, text) servie par le cache
+    ou construite depuis une réponse réseau.
+    """
+    def __init__(self, url, status_code, headers, content, encoding=None, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.encoding = encoding
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+class HttpCache:
+    def __init__(self, path="http_cache.sqlite", ttl=24 * 3600, max_bytes=500 * 1024 * 1024,
+                 access_flush_size=1000, access_flush_interval=30.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # Dates d'accès en attente d'écriture : clé -> date
+        self._accessed = {}
+        self.access_flush_size = access_flush_size
+        self.access_flush_interval = access_flush_interval
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                accessed_at REAL,
+                size INTEGER
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+        self._total = self._stored_size()
+
+    def _stored_size(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _flush_accesses(self):
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()]
+            )
+            self._accessed.clear()
+        self._last_flush = time.monotonic()
+
+    def get(self, url):
+        key = normalize_cache_key(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status, headers, body, encoding, etag, last_modified, fetched_at "
+                "FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= self.access_flush_size \
+                    or time.monotonic() - self._last_flush >= self.access_flush_interval:
+                self._flush_accesses()
+                self._conn.commit()
+        return {
+            "url": row[0],
+            "status": row[1],
+            "headers": json.loads(row[2]),
+            "body": row[3],
+            "encoding": row[4],
+            "etag": row[5],
+            "last_modified": row[6],
+            "fetched_at": row[7],
+        }
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, status, headers, body, encoding=None):
+        now = time.time()
+        headers = CaseInsensitiveDict(headers)
+        key = normalize_cache_key(url)
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._accessed.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, url, status, headers, body, encoding, etag, last_modified, fetched_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, status, json.dumps(dict(headers)), body, encoding,
+                 headers.get("ETag"), headers.get("Last-Modified"),
+                 now, now, len(body))
+            )
+            self._total += len(body) - (previous[0] if previous else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def refresh(self, url):
+        # Réponse 304 : l'entrée redevient fraîche
+        now = time.time()
+        key = normalize_cache_key(url)
+        with self._lock:
+            self._accessed.pop(key, None)
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, key)
+            )
+            self._conn.commit()
+
+    def _evict(self):
+        # Éviction LRU jusqu'à repasser sous max_bytes. Le total est recalculé
+        # une fois : d'autres processus peuvent partager le fichier.
+        self._flush_accesses()
+        self._total = self._stored_size()
+        while self._total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                victims.append((key,))
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    break
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def close(self):
+        with self._lock:
+            self._flush_accesses()
+            self._conn.commit()
+            self._conn.close()
+
+
+def _from_entry(entry):
+    return CachedResponse(entry["url"], 200, entry["headers"], entry["body"], entry["encoding"], from_cache=True)
+
+
+def _record_response(status, size, seconds):
+    metrics.observe("http_request_seconds", seconds)
+    metrics.inc("http_responses_total", status=status)
+    metrics.inc("http_bytes_total", size)
+
+
+def timed_get(session, url, timeout=None, **kwargs):
+    """
+    session.get instrumenté : durée, code HTTP, octets reçus et erreurs réseau.
+    Sans `timeout`, le délai par défaut de la session (http_client) s'applique.
+    """
+    start = time.perf_counter()
+    try:
+        response = session.get(url, timeout=timeout, **kwargs)
+    except Exception as e:
+        metrics.inc("http_errors_total", error=type(e).__name__)
+        raise
+    # Avec stream=True le corps n'est pas encore lu : seule la durée jusqu'aux en-têtes est connue
+    size = 0 if kwargs.get("stream") else len(response.content)
+    _record_response(response.status_code, size, time.perf_counter() - start)
+    if getattr(response, "elapsed", None) is not None:
+        metrics.observe("http_ttfb_seconds", response.elapsed.total_seconds())
+    return response
+
+
+def _gated_entry(entry, gate):
+    if gate is not None:
+        gate.check(entry["url"], entry["headers"], entry["body"])
+    return _from_entry(entry)
+
+
+def gated_get(session, url, gate, timeout=None, **kwargs):
+    """
+    GET en flux filtré par `gate` (fetch_gate.FetchGate) : lève
+    fetch_gate.SkippedContent si la page ne doit pas être parsée. Retourne
+    une CachedResponse (corps vide si le code n'est pas 200).
+    """
+    response = timed_get(session, url, timeout=timeout, stream=True, **kwargs)
+    if response.status_code != 200:
+        response.close()
+        return CachedResponse(url, response.status_code, response.headers, b"")
+    body, encoding = gate.read(url, response)
+    return CachedResponse(url, 200, response.headers, body, encoding)
+
+
+def cached_get(session, url, cache=None, timeout=None, gate=None, **kwargs):
+    """
+    GET via une session requests en passant par le cache s'il est fourni.
+    Avec `gate` (fetch_gate.FetchGate), la réponse est lue en flux et filtrée
+    avant d'être retournée (voir gated_get).
+    """
+    if cache is None:
+        if gate is not None:
+            return gated_get(session, url, gate, timeout=timeout, **kwargs)
+        return timed_get(session, url, timeout=timeout, **kwargs)
+
+    entry = cache.get(url)
+    if entry and cache.is_fresh(entry):
+        metrics.inc("http_cache_total", result="hit")
+        return _gated_entry(entry, gate)
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    headers.update(cache.conditional_headers(entry))
+    if gate is not None:
+        response = gated_get(session, url, gate, timeout=timeout, headers=headers, **kwargs)
+    else:
+        response = timed_get(session, url, timeout=timeout, headers=headers, **kwargs)
+    if response.status_code == 304 and entry:
+        metrics.inc("http_cache_total", result="revalidated")
+        cache.refresh(url)
+        return _gated_entry(entry, gate)
+    metrics.inc("http_cache_total", result="miss")
+    if response.status_code == 200:
+        # Réponse filtrée : encodage déclaré seulement, sans détection sur tout le corps
+        encoding = response.encoding if gate is not None else response.encoding or response.apparent_encoding
+        cache.store(url, 200, response.headers, response.content, encoding)
+    return response
+
+
+async def cached_get_async(session, url, cache=None, gate=None):
+    """
+    Équivalent de cached_get pour une session aiohttp.
+    Retourne une CachedResponse dans tous les cas.
+    """
+    entry = cache.get(url) if cache else None
+    if entry and cache.is_fresh(entry):
+        metrics.inc("http_cache_total", result="hit")
+        return _gated_entry(entry, gate)
+
+    headers = cache.conditional_headers(entry) if cache else {}
+    start = time.perf_counter()
+    try:
+        response = await get_async(session, url, headers=headers)
+    except Exception as e:
+        metrics.inc("http_errors_total", error=type(e).__name__)
+        raise
+    async with response:
+        if response.status == 304 and entry:
+            _record_response(304, 0, time.perf_counter() - start)
+            metrics.inc("http_cache_total", result="revalidated")
+            cache.refresh(url)
+            return _gated_entry(entry, gate)
+        if cache:
+            metrics.inc("http_cache_total", result="miss")
+        if gate is not None:
+            if response.status != 200:
+                _record_response(response.status, 0, time.perf_counter() - start)
+                return CachedResponse(url, response.status, dict(response.headers), b"")
+            # Les octets lus sont comptés par le filtre, y compris pour une page écartée
+            _record_response(200, 0, time.perf_counter() - start)
+            body, encoding = await gate.read_async(url, response)
+        else:
+            body = await response.read()
+            _record_response(response.status, len(body), time.perf_counter() - start)
+            try:
+                encoding = response.get_encoding()
+            except Exception:
+                encoding = None
+        if cache and response.status == 200:
+            cache.store(url, 200, response.headers, body, encoding)
+        return CachedResponse(url, response.status, dict(response.headers), body, encoding)
@@ -0,0 +1,378 @@
+"""
+Client HTTP partagé par le crawler, le scraper, les sitemaps et les documents.
+
+- pools de connexions par hôte réglables et keep-alive (une session pour tout
+  le processus au lieu d'une connexion TCP+TLS par page) ;
+- délais de connexion et de lecture par défaut ;
+- Accept-Encoding gzip/deflate, et br si le paquet `brotli` est installé ;
+- cache DNS (TTL, taille bornée), à activer une fois pour le processus avec
+  install_dns_cache() ;
+- relances avec backoff exponentiel sur 429/5xx et erreurs réseau, en
+  respectant l'en-tête Retry-After (borné à MAX_RETRY_AFTER) ;
+- HTTP/2 optionnel via `httpx` (pip install "httpx[http2]").
+
+Les mêmes réglages sont proposés pour aiohttp (create_aiohttp_session).
+"""
+import asyncio
+import socket
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import metrics
+
+try:
+    import brotli  # noqa: F401 (décodage br par urllib3 / aiohttp)
+    HAS_BROTLI = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        HAS_BROTLI = True
+    except ImportError:
+        HAS_BROTLI = False
+
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+USER_AGENT = "YOUR_USER_AGENT"
+ACCEPT_ENCODING = "gzip, deflate, br" if HAS_BROTLI else "gzip, deflate"
+# (connexion, lecture) en secondes
+DEFAULT_TIMEOUT = (5, 20)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Attente maximale demandée par un Retry-After (s) : au-delà, un serveur bloquerait un worker
+MAX_RETRY_AFTER = 300
+
+
+def default_headers(headers=None):
+    merged = {"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING}
+    merged.update(headers or {})
+    return merged
+
+
+def retry_after_seconds(value, default=None, maximum=MAX_RETRY_AFTER):
+    """
+    Délai demandé par un en-tête Retry-After (secondes ou date HTTP), borné à `maximum`.
+    """
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return default
+    return min(max(0.0, seconds), maximum)
+
+
+def backoff_delay(attempt, backoff_factor=0.5, maximum=60):
+    # 0.5 s, 1 s, 2 s, 4 s... pour les relances successives
+    return min(maximum, backoff_factor * (2 ** attempt))
+
+
+class CountingRetry(Retry):
+    """
+    Retry urllib3 qui compte les relances dans les métriques et borne
+    l'attente Retry-After à MAX_RETRY_AFTER.
+    """
+    def get_retry_after(self, response):
+        seconds = super().get_retry_after(response)
+        return None if seconds is None else min(seconds, MAX_RETRY_AFTER)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        # Ne compter que les relances réellement effectuées (ni redirections, ni dernier échec)
+        if not retry.is_exhausted():
+            if error is not None:
+                metrics.inc("retries_total", reason=type(error).__name__)
+            elif response is not None and response.status in (self.status_forcelist or ()):
+                metrics.inc("retries_total", reason=response.status)
+        return retry
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter appliquant un délai par défaut aux requêtes qui n'en précisent pas.
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+class DnsCache:
+    """
+    Cache des résolutions DNS (socket.getaddrinfo) : `ttl` secondes par entrée,
+    au plus `max_entries` entrées (les moins récemment utilisées sont retirées).
+    """
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._getaddrinfo = None
+
+    def getaddrinfo(self, *args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                metrics.inc("dns_cache_total", result="hit")
+                return entry[0]
+        metrics.inc("dns_cache_total", result="miss")
+        start = time.perf_counter()
+        result = self._getaddrinfo(*args, **kwargs)
+        metrics.observe("http_dns_seconds", time.perf_counter() - start)
+        with self._lock:
+            self._entries[key] = (result, now)
+            self._entries.move_to_end(key)
+            self._purge(now)
+        return result
+
+    def _purge(self, now):
+        # En tête : les entrées les moins récemment utilisées, retirées si expirées ou en surnombre
+        while self._entries:
+            key, (_, stored) = next(iter(self._entries.items()))
+            if now - stored < self.ttl and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def install(self):
+        if self._getaddrinfo is None:
+            self._getaddrinfo = socket.getaddrinfo
+            socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        if self._getaddrinfo is not None:
+            socket.getaddrinfo = self._getaddrinfo
+            self._getaddrinfo = None
+
+
+dns_cache = None
+_dns_lock = threading.Lock()
+
+
+def install_dns_cache(ttl=300, max_entries=1024):
+    """
+    Active le cache DNS pour tout le processus (socket.getaddrinfo est remplacé).
+    À appeler une fois, depuis le point d'entrée : les appels suivants
+    retournent le cache déjà installé sans changer ses réglages.
+    """
+    global dns_cache
+    with _dns_lock:
+        if dns_cache is None:
+            dns_cache = DnsCache(ttl, max_entries)
+            dns_cache.install()
+        return dns_cache
+
+
+def create_session(pool_connections=100, pool_maxsize=10, retries=3, backoff_factor=0.5,
+                   timeout=DEFAULT_TIMEOUT, headers=None, http2=False):
+    """
+    Session HTTP configurée :
+      `pool_connections` hôtes gardés en pool, `pool_maxsize` connexions keep-alive par hôte ;
+      `retries` relances (backoff `backoff_factor` * 2^n, Retry-After respecté) ;
+      `timeout` délai par défaut (connexion, lecture) ;
+      `http2` utilise httpx si disponible (sinon requests, en HTTP/1.1).
+    Le cache DNS n'est pas activé ici : voir install_dns_cache().
+    """
+    if http2:
+        if HAS_HTTPX:
+            return Http2Session(pool_maxsize * pool_connections, pool_maxsize, retries, backoff_factor,
+                                timeout, headers)
+        print("httpx n'est pas installé : HTTP/1.1 utilisé (pip install \"httpx[http2]\")")
+
+    retry = CountingRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        # Après la dernière relance, rendre la réponse plutôt que lever une exception
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(timeout=timeout, pool_connections=pool_connections,
+                                 pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(default_headers(headers))
+    return session
+
+
+_default_session = None
+_default_lock = threading.Lock()
+
+
+def default_session():
+    """
+    Session partagée par tout le processus (créée à la première utilisation).
+    """
+    global _default_session
+    with _default_lock:
+        if _default_session is None:
+            _default_session = create_session()
+        return _default_session
+
+
+class _Http2Response:
+    """
+    Réponse httpx présentée avec l'interface de requests utilisée dans le projet.
+    """
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.encoding = response.encoding
+        self.elapsed = response.elapsed if response.is_closed else None
+
+    @property
+    def content(self):
+        return self._response.read()
+
+    @property
+    def text(self):
+        self._response.read()
+        return self._response.text
+
+    @property
+    def apparent_encoding(self):
+        return self._response.encoding
+
+    def iter_content(self, chunk_size=65536):
+        return self._response.iter_bytes(chunk_size)
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Http2Session:
+    """
+    Équivalent HTTP/2 (httpx) de create_session, avec les mêmes relances.
+    """
+    def __init__(self, max_connections=100, max_keepalive=10, retries=3, backoff_factor=0.5,
+                 timeout=DEFAULT_TIMEOUT, headers=None):
+        connect, read = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.headers = default_headers(headers)
+        self.client = httpx.Client(
+            http2=True,
+            headers=self.headers,
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            follow_redirects=True,
+        )
+
+    def get(self, url, timeout=None, headers=None, stream=False, params=None, allow_redirects=True, **kwargs):
+        """
+        GET avec les options de requests utilisées dans le projet ; les autres
+        (verify, proxies, auth...) lèvent TypeError plutôt que d'être ignorées.
+        """
+        if kwargs:
+            raise TypeError("Http2Session.get : option(s) non prise(s) en charge : " + ", ".join(sorted(kwargs)))
+        options = {"headers": headers, "params": params}
+        if timeout is not None:
+            options["timeout"] = httpx.Timeout(timeout[1], connect=timeout[0]) if isinstance(timeout, tuple) \
+                else timeout
+        for attempt in range(self.retries + 1):
+            try:
+                request = self.client.build_request("GET", url, **options)
+                response = self.client.send(request, stream=True, follow_redirects=allow_redirects)
+            except httpx.TransportError as e:
+                if attempt >= self.retries:
+                    raise
+                metrics.inc("retries_total", reason=type(e).__name__)
+                time.sleep(backoff_delay(attempt, self.backoff_factor))
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                delay = retry_after_seconds(response.headers.get("Retry-After"),
+                                            backoff_delay(attempt, self.backoff_factor))
+                response.close()
+                metrics.inc("retries_total", reason=response.status_code)
+                time.sleep(delay)
+                continue
+            if not stream:
+                response.read()
+                response.close()
+            return _Http2Response(response)
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def create_aiohttp_session(concurrency=100, per_host=10, timeout=DEFAULT_TIMEOUT, headers=None, dns_ttl=300,
+                           keepalive_timeout=30, trace_configs=None):
+    """
+    aiohttp.ClientSession avec les mêmes réglages : `concurrency` connexions au
+    total, `per_host` par hôte, keep-alive, cache DNS de l'aiohttp et délais.
+    À utiliser avec get_async() pour les relances.
+    """
+    import aiohttp
+    connect, read = timeout
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host, use_dns_cache=bool(dns_ttl),
+                                     ttl_dns_cache=dns_ttl or None, keepalive_timeout=keepalive_timeout)
+    return aiohttp.ClientSession(
+        headers=default_headers(headers),
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=connect + read, sock_connect=connect, sock_read=read),
+        trace_configs=trace_configs if trace_configs is not None else [metrics.aiohttp_trace_config()],
+    )
+
+
+async def get_async(session, url, headers=None, retries=3, backoff_factor=0.5):
+    """
+    GET aiohttp avec relances (backoff exponentiel, Retry-After) sur 429/5xx
+    et erreurs réseau. Retourne la réponse, à utiliser avec `async with`.
+    """
+    import aiohttp
+    for attempt in range(retries + 1):
+        try:
+            response = await session.get(url, headers=headers)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt >= retries:
+                raise
+            metrics.inc("retries_total", reason=type(e).__name__)
+            await asyncio.sleep(backoff_delay(attempt, backoff_factor))
+            continue
+        if response.status in RETRY_STATUSES and attempt < retries:
+            delay = retry_after_seconds(response.headers.get("Retry-After"), backoff_delay(attempt, backoff_factor))
+            response.release()
+            metrics.inc("retries_total", reason=response.status)
+            await asyncio.sleep(delay)
+            continue
+        return response
@@ -0,0 +1,367 @@
+"""
+Instrumentation du crawl, du scraping et du nettoyage.
+
+Un registre unique (`metrics`) rassemble des compteurs (pages, octets,
+codes HTTP, relances...), des jauges (profondeur des files) et des chronos
+par étape et par extracteur. Il s'exporte au format texte Prometheus sur un
+petit serveur HTTP local et/ou dans un fichier JSON réécrit périodiquement.
+Un profilage par page (cProfile ou pyinstrument) peut être activé.
+
+Tout se configure par variables d'environnement, sans modifier les scripts :
+  SCRAPER_METRICS_PORT=9100        endpoint Prometheus http://localhost:9100/metrics
+  SCRAPER_METRICS_FILE=stats.json  statistiques JSON (toutes les SCRAPER_METRICS_INTERVAL s)
+  SCRAPER_METRICS_DETAILED=1       chronos par extracteur (légèrement plus coûteux)
+  SCRAPER_PROFILE=cprofile         profil de chaque page (ou "pyinstrument") dans SCRAPER_PROFILE_DIR
+"""
+import atexit
+import json
+import multiprocessing
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import pyinstrument
+    HAS_PYINSTRUMENT = True
+except ImportError:
+    HAS_PYINSTRUMENT = False
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_key(key, escape=False):
+    name, labels = key
+    if not labels:
+        return name
+    if escape:
+        labels = [(label, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                  for label, value in labels]
+    return name + "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {}
+        self.gauges = {}
+        # Chronos : clé -> [nombre, total, max] (en secondes)
+        self.timers = {}
+        # Échantillons des chronos pour les percentiles (0 : désactivé)
+        self.max_samples = 0
+        self.samples = {}
+        # Chronos par extracteur (coûteux : désactivé par défaut)
+        self.detailed = False
+        self.profiler = None
+        self.profile_dir = "page_profiles"
+        self._exporters = []
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            timer = self.timers.get(key)
+            if timer is None:
+                self.timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                if seconds > timer[2]:
+                    timer[2] = seconds
+            if self.max_samples:
+                self._sample(key, seconds, self.timers[key][0])
+
+    def _sample(self, key, seconds, count):
+        # Échantillonnage par réservoir : mémoire bornée, échantillon uniforme
+        samples = self.samples.setdefault(key, [])
+        if len(samples) < self.max_samples:
+            samples.append(seconds)
+        else:
+            index = random.randrange(count)
+            if index < self.max_samples:
+                samples[index] = seconds
+
+    def percentile(self, name, q, **labels):
+        """
+        Percentile `q` (0-100) des durées observées pour ce chrono, ou None
+        (nécessite max_samples > 0).
+        """
+        with self._lock:
+            samples = sorted(self.samples.get(_key(name, labels), ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))]
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def drain(self):
+        """
+        Retourne les mesures accumulées puis les remet à zéro (processus de travail
+        qui renvoient leurs mesures au processus principal avec merge()).
+        """
+        with self._lock:
+            raw = {"counters": self.counters, "timers": self.timers, "samples": self.samples}
+            self.counters = {}
+            self.timers = {}
+            self.samples = {}
+        return raw
+
+    def merge(self, raw):
+        with self._lock:
+            for key, value in raw["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (count, total, maximum) in raw["timers"].items():
+                timer = self.timers.get(key)
+                if timer is None:
+                    self.timers[key] = [count, total, maximum]
+                else:
+                    timer[0] += count
+                    timer[1] += total
+                    timer[2] = max(timer[2], maximum)
+            if self.max_samples:
+                for key, values in raw.get("samples", {}).items():
+                    samples = self.samples.setdefault(key, [])
+                    samples.extend(values[:self.max_samples - len(samples)])
+
+    def snapshot(self):
+        """
+        État courant sous forme de dictionnaire sérialisable en JSON ; les
+        compteurs sont aussi donnés en débit moyen par seconde (pages/s, octets/s...).
+        """
+        with self._lock:
+            uptime = time.time() - self.started_at
+            return {
+                "timestamp": time.time(),
+                "uptime": uptime,
+                "counters": {_format_key(key): value for key, value in self.counters.items()},
+                "rates": {_format_key(key): value / uptime if uptime else 0.0
+                          for key, value in self.counters.items()},
+                "gauges": {_format_key(key): value for key, value in self.gauges.items()},
+                "timers": {
+                    _format_key(key): {"count": count, "total": total, "mean": total / count, "max": maximum}
+                    for key, (count, total, maximum) in self.timers.items()
+                },
+            }
+
+    def to_prometheus(self):
+        """
+        Exposition au format texte Prometheus (compteurs, jauges, chronos en summary).
+        """
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({key[0] for key in values}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in values.items():
+                        if key[0] == name:
+                            lines.append(f"{_format_key(key, escape=True)} {value}")
+            for name in sorted({key[0] for key in self.timers}):
+                lines.append(f"# TYPE {name} summary")
+                for (timer_name, labels), (count, total, _) in self.timers.items():
+                    if timer_name == name:
+                        lines.append(f"{_format_key((name + '_count', labels), escape=True)} {count}")
+                        lines.append(f"{_format_key((name + '_sum', labels), escape=True)} {total}")
+        lines.append("# TYPE scraper_uptime_seconds gauge")
+        lines.append(f"scraper_uptime_seconds {time.time() - self.started_at}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.counters = {}
+            self.gauges = {}
+            self.timers = {}
+            self.samples = {}
+
+    def start_http_server(self, port=9100, host="127.0.0.1"):
+        """
+        Sert /metrics (texte Prometheus) et /stats.json dans un thread de fond.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/stats.json"):
+                    body = json.dumps(registry.snapshot(), indent=2).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    body = registry.to_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self._exporters.append(server)
+        print(f"Métriques disponibles sur http://{host}:{server.server_port}/metrics")
+        return server
+
+    def start_json_writer(self, path="scraper_stats.json", interval=10.0):
+        """
+        Réécrit `path` avec snapshot() toutes les `interval` secondes (thread de fond).
+        """
+        stop = threading.Event()
+
+        def write():
+            temp_path = path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(temp_path, path)
+
+        def loop():
+            while not stop.wait(interval):
+                write()
+            write()
+
+        def finish():
+            # Dernière écriture à la sortie du programme
+            stop.set()
+            thread.join()
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        self._exporters.append((stop, thread))
+        atexit.register(finish)
+        return stop
+
+    def stop_exporters(self):
+        for exporter in self._exporters:
+            if isinstance(exporter, ThreadingHTTPServer):
+                exporter.shutdown()
+                exporter.server_close()
+            else:
+                stop, thread = exporter
+                stop.set()
+                thread.join()
+        self._exporters = []
+
+    @contextmanager
+    def profile(self, name):
+        """
+        Profile le bloc si un profileur est configuré ("cprofile" ou "pyinstrument")
+        et écrit le résultat dans profile_dir (un fichier par page).
+        """
+        if not self.profiler:
+            yield
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        filename = os.path.join(self.profile_dir, re.sub(r"[^A-Za-z0-9._-]+", "_", name)[:150])
+        if self.profiler == "pyinstrument" and HAS_PYINSTRUMENT:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(filename + ".html", "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(filename + ".prof")
+
+    def aiohttp_trace_config(self):
+        """
+        TraceConfig aiohttp qui chronomètre la résolution DNS et l'ouverture des connexions.
+        """
+        import aiohttp
+
+        async def on_dns_start(session, context, params):
+            context.dns_start = time.perf_counter()
+
+        async def on_dns_end(session, context, params):
+            self.observe("http_dns_seconds", time.perf_counter() - context.dns_start)
+
+        async def on_connect_start(session, context, params):
+            context.connect_start = time.perf_counter()
+
+        async def on_connect_end(session, context, params):
+            self.observe("http_connect_seconds", time.perf_counter() - context.connect_start)
+
+        async def on_reuse(session, context, params):
+            self.inc("http_connections_reused_total")
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_dns_resolvehost_start.append(on_dns_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_end)
+        trace_config.on_connection_create_start.append(on_connect_start)
+        trace_config.on_connection_create_end.append(on_connect_end)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        return trace_config
+
+    def configure(self, port=None, json_path=None, interval=10.0, detailed=None, profiler=None,
+                  profile_dir=None):
+        if detailed is not None:
+            self.detailed = detailed
+        if profiler is not None:
+            self.profiler = profiler
+        if profile_dir is not None:
+            self.profile_dir = profile_dir
+        if port is not None:
+            self.start_http_server(port)
+        if json_path:
+            self.start_json_writer(json_path, interval)
+
+
+def configure_from_env(registry=None, environ=None):
+    """
+    Active les exports et options décrits dans la docstring du module. Les
+    exports ne sont démarrés que dans le processus principal (pas dans les
+    processus de travail des pools).
+    """
+    registry = registry or metrics
+    environ = os.environ if environ is None else environ
+    registry.detailed = environ.get("SCRAPER_METRICS_DETAILED", "") not in ("", "0")
+    registry.profiler = environ.get("SCRAPER_PROFILE") or None
+    registry.profile_dir = environ.get("SCRAPER_PROFILE_DIR", registry.profile_dir)
+    if multiprocessing.parent_process() is not None:
+        return
+    port = environ.get("SCRAPER_METRICS_PORT")
+    registry.configure(
+        port=int(port) if port else None,
+        json_path=environ.get("SCRAPER_METRICS_FILE"),
+        interval=float(environ.get("SCRAPER_METRICS_INTERVAL", 10)),
+    )
+
+
+metrics = Metrics()
+configure_from_env(metrics)
+
+if hasattr(os, "register_at_fork"):
+    # Un processus de travail créé par fork repart de zéro (ses mesures sont renvoyées par drain())
+    def _reset_after_fork():
+        metrics.reset()
+        metrics._exporters = []
+
+    os.register_at_fork(after_in_child=_reset_after_fork)
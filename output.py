@@ -0,0 +1,221 @@
+"""
+Sortie en flux des pages scrapées au format JSONL (une page par ligne).
+
+Les fichiers .gz et .zst sont compressés à la volée (zstd nécessite le paquet
+`zstandard`). Les enregistrements sont écrits dès qu'ils sont prêts et le
+fichier est vidé régulièrement : en cas d'arrêt, le travail déjà écrit est
+conservé et un nouveau lancement reprend là où le précédent s'est arrêté.
+"""
+import gzip
+import io
+import json
+import os
+import re
+import time
+import zlib
+
+from frontier import FingerprintSet
+from metrics import metrics
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+# Blancs et virgules entre deux éléments d'un tableau JSON
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def compression_for(path, compression=None):
+    if compression:
+        return compression
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def _require_zstd():
+    if not HAS_ZSTD:
+        raise ImportError("La compression zstd nécessite le paquet 'zstandard' (pip install zstandard)")
+
+
+class JsonlWriter:
+    """
+    Écrit un enregistrement JSON compact par ligne, en mode ajout.
+    Le fichier est vidé tous les `flush_every` enregistrements ou toutes
+    les `flush_interval` secondes.
+    """
+    # Format texte, une ligne par enregistrement (réparation de la dernière ligne à la reprise)
+    line_based = True
+
+    def __init__(self, path, compression=None, flush_every=100, flush_interval=5.0):
+        self.path = path
+        self.compression = compression_for(path, compression)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._since_flush = 0
+        self._last_flush = time.monotonic()
+        if self.compression and self.line_based and os.path.exists(path):
+            _repair_tail(path, self.compression)
+        self._raw = open(path, "ab")
+        if self.compression is None and self.line_based and self._raw.tell() > 0:
+            # Dernière ligne interrompue : repartir sur une nouvelle ligne
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._raw.write(b"\n")
+        if self.compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="ab")
+        elif self.compression == "zstd":
+            _require_zstd()
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        elif self.compression is None:
+            self._stream = self._raw
+        else:
+            raise ValueError(f"Compression inconnue : {self.compression}")
+
+    def encode(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        return line.encode("utf-8")
+
+    def write(self, record):
+        start = time.perf_counter()
+        data = self.encode(record)
+        metrics.observe("stage_seconds", time.perf_counter() - start, stage="serialize")
+        metrics.inc("output_bytes_total", len(data))
+        self._stream.write(data)
+        self.count += 1
+        self._since_flush += 1
+        if self._since_flush >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.compression == "gzip":
+            self._stream.flush(zlib.Z_SYNC_FLUSH)
+        elif self.compression == "zstd":
+            self._stream.flush(zstandard.FLUSH_FRAME)
+        self._raw.flush()
+        self._since_flush = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open_binary(path, compression=None):
+    compression = compression_for(path, compression)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        _require_zstd()
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True)
+    return open(path, "rb")
+
+
+def _open_text(path, compression=None):
+    if compression_for(path, compression) is None:
+        return open(path, "r", encoding="utf-8")
+    return io.TextIOWrapper(_open_binary(path, compression), encoding="utf-8")
+
+
+def iter_jsonl(path, compression=None):
+    """
+    Relit un fichier JSONL enregistrement par enregistrement. Une fin de
+    fichier tronquée (arrêt brutal pendant l'écriture) est ignorée.
+    """
+    try:
+        with _open_text(path, compression) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Dernière ligne incomplète
+                    continue
+    except FileNotFoundError:
+        return
+    except (EOFError, OSError, zlib.error) as e:
+        print(f"Fin de fichier illisible dans {path}, lecture arrêtée : {e}")
+    except Exception as e:
+        if HAS_ZSTD and isinstance(e, zstandard.ZstdError):
+            print(f"Fin de fichier illisible dans {path}, lecture arrêtée : {e}")
+        else:
+            raise
+
+
+def iter_json_array(path, chunk_size=1024 * 1024):
+    """
+    Relit un fichier contenant un tableau JSON (comme scraped_data.json)
+    élément par élément, sans charger tout le fichier en mémoire.
+    """
+    decoder = json.JSONDecoder()
+    with _open_text(path) as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} ne contient pas un tableau JSON")
+        # Position de lecture dans le bloc : le début déjà décodé n'est retiré
+        # qu'une fois par bloc lu, pas après chaque élément
+        position = 1
+        eof = False
+        while True:
+            position = _SEPARATORS.match(buffer, position).end()
+            if buffer.startswith("]", position):
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Élément coupé par la fin du bloc : lire la suite
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield item
+
+
+def _repair_tail(path, compression):
+    """
+    Un fichier compressé interrompu en cours d'écriture se termine par un bloc
+    incomplet qui rendrait illisible tout ce qui serait ajouté ensuite : on
+    réécrit alors les enregistrements valides dans un fichier propre.
+    """
+    try:
+        with _open_text(path, compression) as f:
+            for _ in f:
+                pass
+        return
+    except Exception:
+        pass
+    print(f"Fichier {path} tronqué : récupération des enregistrements valides")
+    repaired = path + ".tmp"
+    if os.path.exists(repaired):
+        os.remove(repaired)
+    with JsonlWriter(repaired, compression) as writer:
+        for record in iter_jsonl(path, compression):
+            writer.write(record)
+    os.replace(repaired, path)
+
+
+def written_urls(path, compression=None):
+    """
+    URLs déjà présentes dans un fichier de sortie, pour reprendre un scraping interrompu.
+    """
+    urls = FingerprintSet()
+    for record in iter_jsonl(path, compression):
+        if record.get("url"):
+            urls.add(record["url"])
+    return urls
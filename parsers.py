@@ -0,0 +1,85 @@
+"""
+Backends de parsing HTML pour le crawler et le scraper.
+
+- "html.parser" : parser pur Python de la bibliothèque standard (par défaut historique) ;
+- "lxml" : parser C de lxml, bien plus rapide sur les grosses pages ;
+- "fast" (liens uniquement) : chemin rapide pour le crawler, qui n'a besoin que
+  des a[href] ; utilise selectolax s'il est installé, sinon lxml, sans construire
+  d'arbre BeautifulSoup.
+"""
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+try:
+    from selectolax.parser import HTMLParser
+    HAS_SELECTOLAX = True
+except ImportError:
+    HAS_SELECTOLAX = False
+
+SOUP_BACKENDS = ("html.parser", "lxml")
+LINK_BACKENDS = ("html.parser", "lxml", "fast")
+
+
+def make_soup(html, backend="html.parser"):
+    """
+    Construit un arbre BeautifulSoup avec le backend demandé.
+    Retombe sur html.parser si lxml n'est pas installé.
+    """
+    if backend not in SOUP_BACKENDS:
+        raise ValueError(f"Backend de parsing inconnu : {backend}")
+    if backend == "lxml" and not HAS_LXML:
+        backend = "html.parser"
+    return BeautifulSoup(html, backend)
+
+
+def _hrefs_selectolax(html):
+    return [node.attributes.get("href") or "" for node in HTMLParser(html).css("a[href]")]
+
+
+def _hrefs_lxml(html):
+    return [str(href) for href in lxml.html.fromstring(html).xpath("//a/@href")]
+
+
+def _hrefs_soup(html, backend):
+    return [link["href"] for link in make_soup(html, backend).find_all("a", href=True)]
+
+
+def extract_hrefs(html, backend="fast"):
+    """
+    Retourne les attributs href de toutes les balises <a>, dans l'ordre du document.
+    """
+    if backend not in LINK_BACKENDS:
+        raise ValueError(f"Backend de liens inconnu : {backend}")
+    if backend == "html.parser":
+        return _hrefs_soup(html, "html.parser")
+    try:
+        if backend == "fast" and HAS_SELECTOLAX:
+            return _hrefs_selectolax(html)
+        if HAS_LXML:
+            return _hrefs_lxml(html)
+    except Exception:
+        # Document vide ou déclaration d'encodage refusée par lxml : repli sur BeautifulSoup
+        pass
+    return _hrefs_soup(html, "html.parser")
+
+
+def compare_backends(html, url, backends=SOUP_BACKENDS):
+    """
+    Vérifie que l'extraction donne le même résultat avec chaque backend.
+    Retourne {backend: True/False} par rapport à html.parser.
+    """
+    from extractors import extract_from_soup
+
+    def extract(backend):
+        try:
+            return extract_from_soup(make_soup(html, backend), url)
+        except Exception:
+            return None
+
+    reference = extract("html.parser")
+    return {backend: extract(backend) == reference for backend in backends}
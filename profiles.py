@@ -0,0 +1,395 @@
+"""
+Profils d'extraction par domaine (fichiers YAML du dossier profiles/).
+
+Un profil remplace, pour les hôtes qu'il couvre, l'extraction générique de
+extract_page_content : il choisit les sections génériques à garder (les
+autres ne sont pas évaluées, par exemple business_info et ses classes
+div.contact-info, span.phone... absentes des vrais sites) et ajoute ses propres
+champs, décrits par des sélecteurs CSS ou XPath :
+
+    hosts: [jumia.ma]             # par défaut : nom du fichier ; couvre aussi les sous-domaines
+    sections: [metadata, media]   # sections génériques conservées (toutes si absent)
+    fields:
+      business_info:              # section du résultat
+        product_name: {css: "h1.-fs20"}
+        price: {css: "span.-fs24", type: number}
+        phone: {xpath: "//a[starts-with(@href, 'tel:')]/@href"}
+        products:
+          css: article.prd
+          many: true              # liste de toutes les correspondances (sinon la première)
+          fields:                 # sous-champs évalués dans chaque correspondance
+            name: {css: h3.name}
+            url: {css: a.core, attr: href, type: url}
+
+Options d'un champ : `css` ou `xpath`, `attr` (attribut au lieu du texte),
+`many`, `type` (text, number, url ou json), `default` (valeur si rien ne
+correspond ; le champ est omis sinon), `fields` (seul, sans sélecteur : un
+groupe de champs évalués sur la page), `item` (un seul sous-champ, dont la
+valeur remplace le dictionnaire de `fields` : une liste de listes pour les
+champs de chaque formulaire, par exemple).
+
+Avec `sections: []` et lxml, la page n'est parsée qu'une fois par lxml, sans
+arbre BeautifulSoup : c'est le cas le plus rapide, les sections génériques
+utiles pouvant être décrites par des champs.
+
+Les profils sont compilés une seule fois au chargement : avec lxml (et
+cssselect pour les sélecteurs CSS), chaque champ devient un XPath compilé,
+limité à la première correspondance quand `many` est faux, évalué sur un arbre
+lxml ; sans lxml, les sélecteurs CSS sont compilés par soupsieve et évalués
+sur l'arbre BeautifulSoup. Le profil de chaque hôte est mis en cache.
+"""
+import json
+import os
+import re
+import threading
+from urllib.parse import urljoin, urlsplit
+
+from extractors import SECTIONS, DEFAULT_EXTRACTORS, ExtractionEngine
+from parsers import make_soup
+from metrics import metrics
+
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+try:
+    import lxml.html
+    from lxml import etree
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+try:
+    from cssselect import GenericTranslator
+    HAS_CSSSELECT = True
+except ImportError:
+    HAS_CSSSELECT = False
+
+import soupsieve
+
+PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+FIELD_KEYS = {"css", "xpath", "attr", "many", "type", "default", "fields", "item"}
+FIELD_TYPES = ("text", "number", "url", "json")
+HOST_CACHE_SIZE = 10000
+
+_NUMBER = re.compile(r"-?\d[\d\s.,]*")
+_SPACES = re.compile(r"\s")
+
+
+def parse_number(text):
+    """
+    Premier nombre d'un texte ("1 299,00 Dhs" -> 1299.0, "2,500" -> 2500), ou None.
+    """
+    match = _NUMBER.search(text or "")
+    if not match:
+        return None
+    digits = _SPACES.sub("", match.group()).rstrip(".,")
+    if "," in digits and "." in digits:
+        # Le dernier séparateur est le séparateur décimal
+        if digits.rfind(",") > digits.rfind("."):
+            digits = digits.replace(".", "").replace(",", ".")
+        else:
+            digits = digits.replace(",", "")
+    elif "," in digits:
+        # Une seule virgule suivie de 1, 2 ou plus de 3 chiffres : décimale ; sinon milliers
+        whole, _, decimals = digits.rpartition(",")
+        digits = f"{whole}.{decimals}" if digits.count(",") == 1 and len(decimals) != 3 \
+            else digits.replace(",", "")
+    elif digits.count(".") > 1:
+        digits = digits.replace(".", "")
+    number = float(digits)
+    return int(number) if number.is_integer() and "." not in digits else number
+
+
+def _text_lxml(node):
+    # Même texte que get_text(strip=True) de BeautifulSoup
+    return "".join(text.strip() for text in node.itertext())
+
+
+def _selector_kinds(sections):
+    # Sortes de sélecteurs ("css", "xpath") employées par des champs, sous-champs compris
+    kinds = set()
+    stack = [spec for fields in sections for spec in (fields or {}).values()]
+    while stack:
+        spec = stack.pop()
+        if isinstance(spec, str):
+            kinds.add("css")
+        elif isinstance(spec, dict):
+            kinds.update(kind for kind in ("css", "xpath") if kind in spec)
+            stack.extend((spec.get("fields") or {}).values())
+            if spec.get("item") is not None:
+                stack.append(spec["item"])
+    return kinds
+
+
+class ProfileField:
+    """
+    Champ compilé d'un profil ; `backend` vaut "lxml" ou "soup".
+    """
+    def __init__(self, name, spec, backend, source):
+        if isinstance(spec, str):
+            spec = {"css": spec}
+        if not isinstance(spec, dict):
+            raise ValueError(f"{source} : champ {name} invalide")
+        unknown = set(spec) - FIELD_KEYS
+        if unknown:
+            raise ValueError(f"{source} : options inconnues pour {name} : {', '.join(sorted(unknown))}")
+        if ("css" in spec) == ("xpath" in spec) and ("css" in spec or not spec.get("fields")):
+            raise ValueError(f"{source} : le champ {name} doit avoir `css` ou `xpath`")
+        if "fields" in spec and "item" in spec:
+            raise ValueError(f"{source} : le champ {name} ne peut pas avoir à la fois `fields` et `item`")
+        self.name = name
+        self.attr = spec.get("attr")
+        self.many = bool(spec.get("many", False))
+        self.type = spec.get("type", "text")
+        if self.type not in FIELD_TYPES:
+            raise ValueError(f"{source} : type inconnu pour {name} : {self.type}")
+        self.default = spec.get("default")
+        self.has_default = "default" in spec
+        self.fields = [
+            ProfileField(f"{name}.{sub_name}", sub_spec, backend, source)
+            for sub_name, sub_spec in (spec.get("fields") or {}).items()
+        ]
+        self.item = ProfileField(f"{name}.item", spec["item"], backend, source) if "item" in spec else None
+        self.key = name.rsplit(".", 1)[-1]
+        self.backend = backend
+        try:
+            if "css" not in spec and "xpath" not in spec:
+                # Groupe : sous-champs évalués sur le même nœud
+                self.select = lambda node: [node]
+            elif backend == "lxml":
+                self.select = self._compile_xpath(spec)
+            else:
+                self.select = self._compile_css(spec["css"])
+        except Exception as e:
+            raise ValueError(f"{source} : sélecteur invalide pour {name} : {e}") from e
+
+    def _compile_xpath(self, spec):
+        if "css" in spec:
+            expression = GenericTranslator().css_to_xpath(spec["css"])
+        else:
+            expression = spec["xpath"]
+        if not self.many:
+            # Arrêter l'évaluation à la première correspondance
+            expression = f"({expression})[1]"
+        return etree.XPath(expression, smart_strings=False)
+
+    def _compile_css(self, css):
+        pattern = soupsieve.compile(css)
+        limit = 0 if self.many else 1
+        return lambda tag: pattern.select(tag, limit=limit)
+
+    def _value(self, match, url):
+        if self.item is not None:
+            item = {}
+            self.item.evaluate(match, url, item)
+            return item.get(self.item.key)
+        if self.fields:
+            item = {}
+            for field in self.fields:
+                field.evaluate(match, url, item)
+            return item
+        if isinstance(match, (str, float, bool)):
+            # Résultat direct d'un XPath (attribut, texte, fonction)
+            value = match if isinstance(match, str) else str(match)
+        elif self.attr:
+            value = match.get(self.attr)
+            if isinstance(value, list):
+                value = " ".join(value)
+        elif self.backend == "lxml":
+            value = _text_lxml(match)
+        else:
+            value = match.get_text(strip=True)
+        if value is None or not value.strip():
+            return None
+        if self.type == "number":
+            return parse_number(value)
+        if self.type == "url":
+            return urljoin(url, value.strip())
+        if self.type == "json":
+            try:
+                return json.loads(value)
+            except ValueError:
+                return None
+        return value.strip()
+
+    def evaluate(self, node, url, result):
+        matches = self.select(node)
+        if not isinstance(matches, list):
+            matches = [matches]
+        values = [value for value in (self._value(match, url) for match in matches) if value is not None]
+        if self.many:
+            if values or self.has_default:
+                result[self.key] = values or self.default
+        elif values:
+            result[self.key] = values[0]
+        elif self.has_default:
+            result[self.key] = self.default
+
+
+class ExtractionProfile:
+    """
+    Profil compilé d'un domaine : sections génériques conservées et champs propres.
+    """
+    def __init__(self, name, hosts, sections=None, fields=None, source=None):
+        source = source or name
+        self.name = name
+        self.hosts = [host.lower() for host in hosts]
+        self.sections = list(SECTIONS if sections is None else sections)
+        unknown = set(self.sections) - set(SECTIONS)
+        if unknown:
+            raise ValueError(f"{source} : sections inconnues : {', '.join(sorted(unknown))}")
+        fields = fields or {}
+        unknown = set(fields) - set(SECTIONS)
+        if unknown:
+            raise ValueError(f"{source} : les champs doivent être rangés dans une section "
+                             f"({', '.join(SECTIONS)}), pas {', '.join(sorted(unknown))}")
+        kinds = _selector_kinds(fields.values())
+        if HAS_LXML and (HAS_CSSSELECT or "css" not in kinds):
+            self.backend = "lxml"
+        elif "xpath" in kinds:
+            raise ValueError(f"{source} : les sélecteurs XPath demandent lxml (et cssselect avec des sélecteurs CSS)")
+        else:
+            self.backend = "soup"
+        self.fields = [
+            (section, ProfileField(field_name, spec, self.backend, source))
+            for section, section_fields in fields.items()
+            for field_name, spec in (section_fields or {}).items()
+        ]
+        # Moteur générique réduit aux sections demandées
+        self.engine = ExtractionEngine([
+            extractor for extractor in DEFAULT_EXTRACTORS if extractor.section in self.sections
+        ])
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            spec = yaml.safe_load(f) or {}
+        if not isinstance(spec, dict):
+            raise ValueError(f"{path} : profil invalide")
+        unknown = set(spec) - {"hosts", "sections", "fields"}
+        if unknown:
+            raise ValueError(f"{path} : clés inconnues : {', '.join(sorted(unknown))}")
+        name = os.path.splitext(os.path.basename(path))[0]
+        hosts = spec.get("hosts") or [name]
+        if isinstance(hosts, str):
+            hosts = [hosts]
+        return cls(name, hosts, spec.get("sections"), spec.get("fields"), path)
+
+    def extract(self, html, url, parser="html.parser"):
+        """
+        Dictionnaire de page (même forme que parse_page_content) selon le profil.
+        """
+        soup = None
+        if self.engine.extractors or self.backend == "soup":
+            with metrics.timer("stage_seconds", stage="parse"):
+                soup = make_soup(html, parser)
+        with metrics.timer("stage_seconds", stage="extract"):
+            if self.engine.extractors:
+                data = self.engine.extract(soup, url)
+            else:
+                data = {"url": url}
+                for section in SECTIONS:
+                    data[section] = {}
+        if not self.fields:
+            return data
+
+        if self.backend == "lxml":
+            with metrics.timer("stage_seconds", stage="parse"):
+                root = self._lxml_root(html)
+        else:
+            root = soup
+        with metrics.timer("stage_seconds", stage="profile"):
+            if root is not None:
+                for section, field in self.fields:
+                    field.evaluate(root, url, data[section])
+        metrics.inc("profile_pages_total", profile=self.name)
+        return data
+
+    @staticmethod
+    def _lxml_root(html):
+        try:
+            return lxml.html.fromstring(html)
+        except ValueError:
+            # Déclaration d'encodage refusée sur une chaîne : repasser en octets
+            return lxml.html.fromstring(html.encode("utf-8"))
+        except etree.ParserError:
+            # Document vide
+            return None
+
+
+class ProfileRegistry:
+    """
+    Profils compilés, retrouvés par hôte (l'hôte lui-même puis ses domaines
+    parents : www.jumia.ma -> jumia.ma). Le résultat de chaque hôte, profil
+    ou absence de profil, est mis en cache.
+    """
+    def __init__(self, directory=PROFILES_DIR):
+        self.directory = directory
+        self.profiles = []
+        self._by_host = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+        if directory and os.path.isdir(directory):
+            self.load(directory)
+
+    def load(self, directory):
+        paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory) if name.endswith((".yaml", ".yml"))
+        )
+        if paths and not HAS_YAML:
+            print(f"pyyaml n'est pas installé : profils de {directory} ignorés")
+            return
+        for path in paths:
+            self.add(ExtractionProfile.from_file(path))
+
+    def add(self, profile):
+        with self._lock:
+            self.profiles.append(profile)
+            for host in profile.hosts:
+                self._by_host[host] = profile
+            self._hosts.clear()
+
+    def get(self, url):
+        """
+        Profil de l'hôte d'une URL, ou None (extraction générique).
+        """
+        host = (urlsplit(url).hostname or "").lower()
+        with self._lock:
+            if host in self._hosts:
+                return self._hosts[host]
+            profile = None
+            parts = host.split(".")
+            for i in range(len(parts) - 1):
+                profile = self._by_host.get(".".join(parts[i:]))
+                if profile is not None:
+                    break
+            if len(self._hosts) >= HOST_CACHE_SIZE:
+                self._hosts.pop(next(iter(self._hosts)))
+            self._hosts[host] = profile
+            return profile
+
+    def __len__(self):
+        return len(self.profiles)
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def default_registry():
+    """
+    Profils du dossier profiles/, chargés et compilés à la première utilisation
+    dans chaque processus.
+    """
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = ProfileRegistry()
+        return _default_registry
+
+
+def profile_for(url):
+    return default_registry().get(url)
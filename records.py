@@ -0,0 +1,377 @@
+"""
+Représentation compacte des pages scrapées.
+
+Les blocs communs à tout un site (menu principal, liens de pied de page,
+formulaires de recherche et de newsletter, JSON-LD de l'organisation...) sont
+recopiés à l'identique dans chaque page. Le format compact les stocke une
+seule fois par hôte :
+  - une ligne {"t": "block", "host", "id", "value"} définit un bloc, émise la
+    deuxième fois qu'il apparaît sur l'hôte (un bloc propre à une page reste
+    en ligne) ;
+  - dans les pages, un bloc déjà défini est remplacé par {"$block": id}.
+L'identifiant est l'empreinte du contenu : des fichiers écrits en plusieurs
+fois (reprise) restent cohérents.
+
+Les textes répétés à l'intérieur de listes propres à chaque page (titre du
+bandeau cookies parmi les h2, textes alternatifs des bannières, description
+par défaut...) sont de même définis une fois par hôte ({"t": "string", "host",
+"id", "value"}) et remplacés par leur numéro. Les numéros ne valent que pour
+une session d'écriture, ouverte par une ligne {"t": "run"}.
+
+Deux sérialisations : JSONL sans indentation (.jsonl, .jsonl.gz, .jsonl.zst)
+ou msgpack (.msgpack, éventuellement .gz/.zst, paquet `msgpack`). En mémoire,
+PageRecord garde les sections avec des chaînes internées et des blocs partagés
+entre les pages d'un même hôte.
+"""
+import hashlib
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from frontier import BloomFilter, FingerprintSet
+from output import JsonlWriter, _open_binary, compression_for, iter_jsonl
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+SECTIONS = ("metadata", "content", "navigation", "forms", "media", "structured_data", "business_info")
+# Valeurs stockées comme blocs : la liste entière...
+SHARED_VALUES = (("navigation", "main_menu"), ("navigation", "footer_links"))
+# ...ou chacun de ses éléments
+SHARED_ITEMS = (("forms", "details"), ("structured_data", "json_ld"), ("structured_data", "schema_org"))
+# Textes remplacés par un numéro lorsqu'ils se répètent sur un hôte (chaîne ou liste de chaînes)
+SHARED_STRINGS = (
+    ("metadata", "description"),
+    *(("content", "headings", f"h{level}") for level in range(1, 7)),
+    ("media", "image_alt_texts"),
+    ("navigation", "breadcrumb"),
+)
+MIN_SHARED_STRING = 8
+# Chaînes internées en mémoire (libellés de menus, textes alternatifs, types de champs...)
+INTERN_MAX_LENGTH = 200
+
+
+def is_msgpack(path):
+    return ".msgpack" in path or ".mpk" in path
+
+
+def host_of(url):
+    return urlsplit(url or "").netloc.lower()
+
+
+def block_id(value):
+    encoded = json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def intern_strings(value):
+    """
+    Copie de `value` où les clés et les chaînes courtes sont internées (une seule copie en mémoire).
+    """
+    if isinstance(value, str):
+        return sys.intern(value) if len(value) <= INTERN_MAX_LENGTH else value
+    if isinstance(value, dict):
+        return {sys.intern(key) if isinstance(key, str) else key: intern_strings(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [intern_strings(item) for item in value]
+    return value
+
+
+def _map_path(page, path, transform):
+    """
+    Copie de `page` où la valeur au chemin `path` (clés successives) est
+    remplacée par transform(valeur). Seuls les dictionnaires du chemin sont copiés.
+    """
+    nodes = [page]
+    for key in path[:-1]:
+        node = nodes[-1].get(key)
+        if not isinstance(node, dict):
+            return page
+        nodes.append(node)
+    if nodes[-1].get(path[-1]) is None:
+        return page
+    copies = [dict(node) for node in nodes]
+    for parent, child, key in zip(copies, copies[1:], path):
+        parent[key] = child
+    copies[-1][path[-1]] = transform(copies[-1][path[-1]])
+    return copies[0]
+
+
+def _map_blocks(page, transform):
+    """
+    Copie de `page` où chaque valeur partageable passe par transform(valeur).
+    """
+    for path in SHARED_VALUES:
+        page = _map_path(page, path, transform)
+    for path in SHARED_ITEMS:
+        page = _map_path(page, path, lambda items: [transform(item) for item in items])
+    return page
+
+
+def _map_strings(page, transform):
+    """
+    Copie de `page` où chaque texte partageable passe par transform(texte).
+    """
+    for path in SHARED_STRINGS:
+        page = _map_path(page, path, lambda value: [transform(item) for item in value]
+                         if isinstance(value, list) else transform(value))
+    return page
+
+
+class BlockTable:
+    """
+    Blocs (et textes numérotés) par hôte, pour partager en mémoire une seule
+    copie de chaque bloc identique.
+    """
+    def __init__(self):
+        self.hosts = {}
+        self.strings = {}
+
+    def define(self, host, identifier, value):
+        self.hosts.setdefault(host, {})[identifier] = value
+
+    def get(self, host, identifier):
+        return self.hosts[host][identifier]
+
+    def define_string(self, host, identifier, value):
+        self.strings.setdefault(host, {})[identifier] = sys.intern(value)
+
+    def string(self, host, value):
+        # Un entier à la place d'un texte : numéro d'un texte défini pour cet hôte
+        if isinstance(value, int):
+            return self.strings[host][value]
+        return value
+
+    def clear_strings(self):
+        self.strings = {}
+
+    def share(self, host, value):
+        blocks = self.hosts.setdefault(host, {})
+        return blocks.setdefault(block_id(value), value)
+
+    def __len__(self):
+        return sum(len(blocks) for blocks in self.hosts.values())
+
+
+@dataclass(slots=True)
+class PageRecord:
+    url: str
+    metadata: dict = field(default_factory=dict)
+    content: dict = field(default_factory=dict)
+    navigation: dict = field(default_factory=dict)
+    forms: dict = field(default_factory=dict)
+    media: dict = field(default_factory=dict)
+    structured_data: dict = field(default_factory=dict)
+    business_info: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, page, blocks=None):
+        """
+        Enregistrement à partir d'un dictionnaire de page (parse_page_content).
+        Avec `blocks` (BlockTable), les blocs identiques à ceux d'une page déjà
+        chargée du même hôte sont partagés.
+        """
+        page = intern_strings(page)
+        if blocks is not None:
+            host = host_of(page.get("url"))
+            page = _map_blocks(page, lambda value: blocks.share(host, value))
+        return cls(page.get("url") or "", **{section: page.get(section) or {} for section in SECTIONS})
+
+    def to_dict(self):
+        page = {"url": self.url}
+        for section in SECTIONS:
+            page[section] = getattr(self, section)
+        return page
+
+
+class MsgpackWriter(JsonlWriter):
+    """
+    JsonlWriter écrivant des objets msgpack à la suite au lieu de lignes JSON.
+    """
+    line_based = False
+
+    def __init__(self, path, compression=None, flush_every=100, flush_interval=5.0):
+        if not HAS_MSGPACK:
+            raise ImportError("Le format msgpack nécessite le paquet 'msgpack' (pip install msgpack)")
+        if os.path.exists(path):
+            _repair_msgpack(path, compression)
+        super().__init__(path, compression, flush_every, flush_interval)
+
+    def encode(self, record):
+        return msgpack.packb(record, use_bin_type=True)
+
+
+class CompactWriter:
+    """
+    Écrit les pages au format compact (JSONL ou msgpack selon l'extension).
+    `count` compte les pages, pas les définitions de blocs.
+    """
+    def __init__(self, path, compression=None, flush_every=100, max_strings=1_000_000):
+        writer_class = MsgpackWriter if is_msgpack(path) else JsonlWriter
+        self.writer = writer_class(path, compression, flush_every)
+        self.count = 0
+        # Blocs déjà définis dans ce fichier (par cet écrivain), et blocs vus une fois
+        self._defined = set()
+        self._seen = FingerprintSet()
+        # Textes numérotés de cette session, et textes vus une fois (filtre de Bloom : mémoire bornée)
+        self.max_strings = max_strings
+        self._strings = {}
+        self._next_string = {}
+        self._seen_strings = BloomFilter(capacity=4 * max_strings)
+        self.writer.write({"t": "run"})
+
+    def _reference(self, host, value):
+        identifier = block_id(value)
+        key = f"{host} {identifier}"
+        if key not in self._defined:
+            if self._seen.add(key):
+                # Première apparition : le bloc reste dans la page
+                return value
+            self.writer.write({"t": "block", "host": host, "id": identifier, "value": value})
+            self._defined.add(key)
+        return {"$block": identifier}
+
+    def _string_reference(self, host, value):
+        if not isinstance(value, str) or len(value) < MIN_SHARED_STRING:
+            return value
+        key = (host, value)
+        identifier = self._strings.get(key)
+        if identifier is None:
+            if self._seen_strings.add(f"{host}\n{value}") or len(self._strings) >= self.max_strings:
+                return value
+            identifier = self._next_string.get(host, 0)
+            self._next_string[host] = identifier + 1
+            self._strings[key] = identifier
+            self.writer.write({"t": "string", "host": host, "id": identifier, "value": value})
+        return identifier
+
+    def write(self, page):
+        host = host_of(page.get("url"))
+        page = _map_blocks(page, lambda value: self._reference(host, value))
+        page = _map_strings(page, lambda value: self._string_reference(host, value))
+        self.writer.write(page)
+        self.count += 1
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_msgpack(path, compression=None):
+    """
+    Relit les objets d'un fichier msgpack ; une fin de fichier tronquée est ignorée.
+    """
+    if not HAS_MSGPACK:
+        raise ImportError("Le format msgpack nécessite le paquet 'msgpack' (pip install msgpack)")
+    try:
+        with _open_binary(path, compression) as f:
+            yield from msgpack.Unpacker(f, raw=False)
+    except FileNotFoundError:
+        return
+    except (EOFError, OSError, ValueError) as e:
+        print(f"Fin de fichier illisible dans {path}, lecture arrêtée : {e}")
+
+
+def _repair_msgpack(path, compression=None):
+    """
+    Supprime un dernier objet incomplet (arrêt pendant l'écriture) avant d'ajouter à la suite.
+    """
+    if compression_for(path, compression) is None:
+        with open(path, "rb") as f:
+            unpacker = msgpack.Unpacker(f, raw=False)
+            end = 0
+            try:
+                for _ in unpacker:
+                    end = unpacker.tell()
+            except ValueError:
+                pass
+        if end < os.path.getsize(path):
+            print(f"Fichier {path} tronqué : suppression du dernier enregistrement incomplet")
+            os.truncate(path, end)
+        return
+    try:
+        with _open_binary(path, compression) as f:
+            for _ in msgpack.Unpacker(f, raw=False):
+                pass
+        return
+    except Exception:
+        pass
+    print(f"Fichier {path} tronqué : récupération des enregistrements valides")
+    repaired = path + ".tmp"
+    if os.path.exists(repaired):
+        os.remove(repaired)
+    with MsgpackWriter(repaired, compression) as writer:
+        for entry in iter_msgpack(path, compression):
+            writer.write(entry)
+    os.replace(repaired, path)
+
+
+def iter_entries(path, compression=None):
+    if is_msgpack(path):
+        return iter_msgpack(path, compression)
+    return iter_jsonl(path, compression)
+
+
+def iter_pages(path, compression=None, blocks=None):
+    """
+    Relit un fichier compact (ou un JSONL ordinaire) page par page, blocs
+    résolus. Les pages d'un même hôte partagent les mêmes objets pour leurs blocs.
+    Tant qu'aucun bloc ni texte n'est défini (JSONL ordinaire), les pages sont
+    rendues telles quelles.
+    """
+    blocks = blocks if blocks is not None else BlockTable()
+    for entry in iter_entries(path, compression):
+        kind = entry.get("t")
+        if kind == "block":
+            blocks.define(entry["host"], entry["id"], intern_strings(entry["value"]))
+        elif kind == "string":
+            blocks.define_string(entry["host"], entry["id"], entry["value"])
+        elif kind == "run":
+            blocks.clear_strings()
+        else:
+            host = host_of(entry.get("url"))
+            if blocks.hosts:
+                entry = _map_blocks(entry, lambda value: _resolve(blocks, host, value))
+            if blocks.strings:
+                entry = _map_strings(entry, lambda value: blocks.string(host, value))
+            yield entry
+
+
+def _resolve(blocks, host, value):
+    if isinstance(value, dict) and len(value) == 1 and "$block" in value:
+        return blocks.get(host, value["$block"])
+    return value
+
+
+def iter_page_records(path, compression=None):
+    """
+    Comme iter_pages, mais génère des PageRecord (chaînes internées).
+    """
+    blocks = BlockTable()
+    for page in iter_pages(path, compression):
+        yield PageRecord.from_dict(page, blocks)
+
+
+def written_urls(path, compression=None):
+    """
+    URLs déjà présentes dans un fichier compact, pour reprendre un scraping interrompu.
+    """
+    urls = FingerprintSet()
+    for entry in iter_entries(path, compression):
+        if "t" not in entry and entry.get("url"):
+            urls.add(entry["url"])
+    return urls
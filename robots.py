@@ -0,0 +1,159 @@
+"""
+Cache des robots.txt pour les crawls multi-hôtes.
+
+Chaque hôte voit son robots.txt téléchargé une seule fois (puis après
+expiration du TTL), de façon synchrone ou asynchrone ; les téléchargements
+concurrents d'un même hôte sont regroupés. Le nombre d'hôtes en mémoire est
+borné (éviction LRU). Le cache expose aussi Crawl-delay / Request-rate pour
+la politesse par hôte et les lignes `Sitemap:` des hôtes rencontrés comme
+graines supplémentaires (new_sitemaps).
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+from http_client import default_session, get_async
+
+
+def parse_robots(status, text):
+    """
+    Construit un RobotFileParser à partir d'une réponse (code HTTP, contenu).
+    """
+    rp = RobotFileParser()
+    if status in (401, 403):
+        rp.disallow_all = True
+    elif status != 200:
+        # robots.txt absent ou illisible : on assume que tout est autorisé
+        rp.allow_all = True
+    else:
+        rp.parse(text.splitlines())
+    rp.modified()
+    return rp
+
+
+class RobotsCache:
+    def __init__(self, user_agent="*", ttl=24 * 3600, max_hosts=10000, session=None, timeout=10):
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.max_hosts = max_hosts
+        self.session = session or default_session()
+        self.timeout = timeout
+        self._parsers = OrderedDict()
+        self._pending = {}
+        # Sitemaps des robots.txt téléchargés depuis le dernier appel à new_sitemaps()
+        self._new_sitemaps = []
+        self._sitemaps_lock = threading.Lock()
+
+    @staticmethod
+    def robots_url(url):
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}/robots.txt", f"{parsed.scheme}://{parsed.netloc}"
+
+    def _cached(self, origin):
+        item = self._parsers.get(origin)
+        if item is None:
+            return None
+        rp, fetched_at = item
+        if time.time() - fetched_at >= self.ttl:
+            del self._parsers[origin]
+            return None
+        self._parsers.move_to_end(origin)
+        return rp
+
+    def _store(self, origin, rp):
+        sitemaps = rp.site_maps()
+        if sitemaps:
+            with self._sitemaps_lock:
+                self._new_sitemaps.extend(sitemaps)
+        self._parsers[origin] = (rp, time.time())
+        self._parsers.move_to_end(origin)
+        while len(self._parsers) > self.max_hosts:
+            self._parsers.popitem(last=False)
+        return rp
+
+    def get(self, url):
+        """
+        RobotFileParser de l'hôte de `url`, téléchargé si nécessaire.
+        """
+        robots_url, origin = self.robots_url(url)
+        rp = self._cached(origin)
+        if rp is not None:
+            return rp
+        print(f"Vérification du robots.txt : {robots_url}")
+        try:
+            response = self.session.get(robots_url, timeout=self.timeout)
+            rp = parse_robots(response.status_code, response.text)
+        except Exception as e:
+            print(f"Erreur lors de la lecture du robots.txt : {e}")
+            rp = parse_robots(None, "")
+        return self._store(origin, rp)
+
+    async def get_async(self, session, url):
+        """
+        Variante asynchrone de get() avec une session aiohttp ; un seul
+        téléchargement par hôte même si plusieurs pages le demandent en même temps.
+        """
+        robots_url, origin = self.robots_url(url)
+        rp = self._cached(origin)
+        if rp is not None:
+            return rp
+        if origin not in self._pending:
+            self._pending[origin] = asyncio.ensure_future(self._fetch_async(session, robots_url, origin))
+        try:
+            return await asyncio.shield(self._pending[origin])
+        finally:
+            self._pending.pop(origin, None)
+
+    async def _fetch_async(self, session, robots_url, origin):
+        print(f"Vérification du robots.txt : {robots_url}")
+        try:
+            async with await get_async(session, robots_url) as response:
+                text = await response.text(errors="replace")
+                rp = parse_robots(response.status, text)
+        except Exception as e:
+            print(f"Erreur lors de la lecture du robots.txt : {e}")
+            rp = parse_robots(None, "")
+        return self._store(origin, rp)
+
+    def can_fetch(self, url, user_agent=None):
+        return self.get(url).can_fetch(user_agent or self.user_agent, url)
+
+    async def can_fetch_async(self, session, url, user_agent=None):
+        rp = await self.get_async(session, url)
+        return rp.can_fetch(user_agent or self.user_agent, url)
+
+    def crawl_delay(self, url, user_agent=None):
+        """
+        Délai minimal entre deux requêtes demandé par l'hôte (Crawl-delay ou
+        Request-rate), en secondes, ou None. Utilise uniquement le cache.
+        """
+        rp = self._cached(self.robots_url(url)[1])
+        if rp is None:
+            return None
+        user_agent = user_agent or self.user_agent
+        delays = []
+        crawl_delay = rp.crawl_delay(user_agent)
+        if crawl_delay is not None:
+            delays.append(float(crawl_delay))
+        request_rate = rp.request_rate(user_agent)
+        if request_rate is not None and request_rate.requests:
+            delays.append(request_rate.seconds / request_rate.requests)
+        return max(delays) if delays else None
+
+    def sitemaps(self, url):
+        """
+        Sitemaps déclarés dans le robots.txt de l'hôte de `url`.
+        """
+        return list(self.get(url).site_maps() or [])
+
+    def new_sitemaps(self):
+        """
+        Sitemaps déclarés par les robots.txt téléchargés depuis le dernier appel,
+        à utiliser comme graines (un hôte retéléchargé après son TTL les redonne).
+        """
+        with self._sitemaps_lock:
+            sitemaps, self._new_sitemaps = self._new_sitemaps, []
+        return sitemaps
@@ -1,284 +1,323 @@
 import time
-import requests
-from bs4 import BeautifulSoup
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import json
-from urllib.parse import urlparse
+from extractors import extract_from_soup
+from parsers import make_soup
+from profiles import profile_for
+from http_cache import cached_get
+from http_client import create_session, default_session, install_dns_cache
+from fetch_gate import SkippedContent, default_gate
+from output import JsonlWriter, written_urls
+import records
+from metrics import metrics
 
-def extract_page_content(url):
+_DONE = object()
+
+def extract_page_content(url, parser="html.parser", cache=None):
     """
     Extrait les données pertinentes d'une page web.
+    `parser` choisit le backend de parsing ("html.parser" ou "lxml") ;
+    `cache` (http_cache.HttpCache) permet de réutiliser les pages déjà récupérées par le crawler.
+    """
+    html = fetch_page(url, cache=cache)
+    if html is None:
+        return None
+    return parse_page_content(url, html, parser)
+
+def fetch_page(url, session=None, cache=None, gate=default_gate):
+    """
+    Récupère le HTML d'une page, ou None en cas d'erreur.
+    `gate` (fetch_gate.FetchGate) écarte les contenus non HTML ou trop volumineux
+    sans les télécharger entièrement ; None pour tout accepter.
     """
     try:
-        # Récupérer le contenu de la page
-        response = requests.get(url)
+        response = cached_get(session or default_session(), url, cache, gate=gate)
         if response.status_code != 200:
             print(f"Erreur lors de la récupération de {url}: {response.status_code}")
             return None
+        return response.text
+    except SkippedContent as e:
+        print(f"Page {url} ignorée : {e}")
+        return None
+    except Exception as e:
+        print(f"Erreur lors de la récupération de {url}: {e}")
+        return None
 
-        # Parser le contenu HTML avec BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Initialiser un dictionnaire pour stocker les données
-        data = {
-            "url": url,
-            "metadata": {},
-            "content": {},
-            "navigation": {},
-            "forms": {},
-            "media": {},
-            "structured_data": {},
-            "business_info": {}
-        }
-
-        # --- 1. Métadonnées de Page ---
-        # Titre de la page
-        title_tag = soup.find('title')
-        if title_tag:
-            data["metadata"]["title"] = title_tag.string.strip()
-
-        # Méta description
-        meta_description = soup.find("meta", attrs={"name": "description"})
-        if meta_description and meta_description.get("content"):
-            data["metadata"]["description"] = meta_description["content"].strip()
-
-        # Mots-clés
-        meta_keywords = soup.find("meta", attrs={"name": "keywords"})
-        if meta_keywords and meta_keywords.get("content"):
-            data["metadata"]["keywords"] = [keyword.strip() for keyword in meta_keywords["content"].split(",")]
-
-        # Date de dernière modification
-        last_modified = soup.find("meta", attrs={"name": "last-modified"})
-        if last_modified and last_modified.get("content"):
-            data["metadata"]["last_modified"] = last_modified["content"]
-
-        # Fil d'Ariane (Breadcrumb)
-        breadcrumb = soup.find("ol", class_="breadcrumb")
-        if breadcrumb:
-            data["metadata"]["breadcrumb"] = [item.get_text(strip=True) for item in breadcrumb.find_all("li")]
-
-        # --- 2. Éléments de Contenu ---
-        # Titres (H1-H6)
-        headings = {}
-        for i in range(1, 7):
-            h_tags = soup.find_all(f"h{i}")
-            if h_tags:
-                headings[f"h{i}"] = [tag.get_text(strip=True) for tag in h_tags]
-        data["content"]["headings"] = headings
-
-        # Paragraphes
-        paragraphs = [p.get_text(strip=True) for p in soup.find_all("p")]
-        data["content"]["paragraphs"] = paragraphs
-
-        # --- 3. Navigation ---
-        # Menu principal
-        main_menu = soup.find("nav", class_="menu")
-        if main_menu:
-            data["navigation"]["main_menu"] = [a.get_text(strip=True) for a in main_menu.find_all("a")]
+def parse_page_content(url, html, parser="html.parser"):
+    """
+    Extrait les données pertinentes du HTML d'une page déjà récupérée.
+    Si un profil d'extraction couvre l'hôte de la page (profiles/), seuls ses
+    sections et champs sont évalués.
+    """
+    try:
+        with metrics.profile(url):
+            profile = profile_for(url)
+            if profile is not None:
+                content = profile.extract(html, url, parser)
+            else:
+                # Parser le contenu HTML avec le backend choisi
+                with metrics.timer("stage_seconds", stage="parse"):
+                    soup = make_soup(html, parser)
 
-        # Liens de pied de page
-        footer_links = soup.find("footer").find_all("a") if soup.find("footer") else []
-        data["navigation"]["footer_links"] = [link.get_text(strip=True) for link in footer_links]
+                # Extraire toutes les sections en un seul parcours de l'arbre
+                with metrics.timer("stage_seconds", stage="extract"):
+                    content = extract_from_soup(soup, url)
+        metrics.inc("pages_total", stage="scrape")
+        return content
 
-        # Fil d'Ariane
-        if breadcrumb:
-            data["navigation"]["breadcrumb"] = [item.get_text(strip=True) for item in breadcrumb.find_all("li")]
+    except Exception as e:
+        metrics.inc("pages_failed_total", stage="scrape")
+        print(f"Erreur lors de l'extraction de {url}: {e}")
+        return None
 
-        # --- 4. Formulaires ---
-        forms = soup.find_all("form")
-        if forms:
-            form_details = []
-            for form in forms:
-                fields = []
-                for input_tag in form.find_all(["input", "textarea", "select"]):
-                    field = {
-                        "type": input_tag.get("type"),
-                        "name": input_tag.get("name"),
-                        "placeholder": input_tag.get("placeholder"),
-                        "value": input_tag.get("value")
-                    }
-                    fields.append(field)
-                form_details.append(fields)
-            data["forms"]["details"] = form_details
+def _parse_in_worker(url, html, parser):
+    # Exécuté dans un processus du pool : renvoyer aussi ses mesures au processus principal
+    return parse_page_content(url, html, parser), metrics.drain()
 
-        # --- 5. Média ---
-        # Texte alternatif d'images
-        images = soup.find_all("img")
-        image_alt_texts = [img.get("alt") for img in images if img.get("alt")]
-        data["media"]["image_alt_texts"] = image_alt_texts
+def iter_scrape_pipeline(urls, fetch_workers=16, parse_workers=None, queue_size=100, ordered=True,
+                         parser="html.parser", cache=None, state=None, dedup=None, gate=default_gate):
+    """
+    Pipeline de scraping en trois étages :
+      1. récupération des pages par `fetch_workers` threads (sessions HTTP poolées) ;
+      2. parsing/extraction sur un pool de `parse_workers` processus ;
+      3. émission des résultats, dans l'ordre des URLs (ordered=True) ou dès qu'ils sont prêts.
+    Les files entre les étages sont bornées à `queue_size` éléments pour la contre-pression.
+    `parser` est le backend de parsing utilisé par les processus d'extraction,
+    `cache` un http_cache.HttpCache partagé par les threads de récupération.
+    Avec `state` (crawl_state.CrawlState), les pages dont le contenu n'a pas changé
+    depuis leur dernière extraction sont ignorées.
+    Avec `dedup` (dedup.NearDuplicateDetector), les quasi-doublons d'une page déjà
+    vue sont écartés avant l'extraction (voir dedup.duplicates).
+    `gate` filtre les réponses avant parsing (voir fetch_page) ; pour récupérer les
+    documents écartés, passer un FetchGate(collect_documents=True) ou avec on_document.
+    Génère les dictionnaires de parse_page_content (les pages en erreur sont ignorées).
+    """
+    url_queue = queue.Queue(maxsize=queue_size)
+    html_queue = queue.Queue(maxsize=queue_size)
+    result_queue = queue.Queue()
+    # Pages lancées mais pas encore émises (y compris celles qui attendent leur tour
+    # dans le tampon de réordonnancement) : pris par le feeder dans l'ordre des URLs,
+    # rendu à l'émission, ce qui borne aussi le tampon en mode ordonné
+    pending = threading.Semaphore(queue_size)
+    # Une session partagée : autant de connexions keep-alive par hôte que de threads
+    session = create_session(pool_maxsize=fetch_workers)
+    # Levé quand le consommateur ferme le générateur avant la fin : les threads s'arrêtent
+    stop = threading.Event()
 
-        # Descriptions de vidéos
-        videos = soup.find_all("video")
-        video_descriptions = [video.get("title") or video.get("description") for video in videos]
-        data["media"]["video_descriptions"] = video_descriptions
+    def put(target, item):
+        # put() bloquant qui abandonne si le pipeline est arrêté
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
 
-        # --- 5.1. Liens vers Documents ---
-        # Trouver tous les liens
-        all_links = soup.find_all("a", href=True)
-        document_links = {
-            "pdf": [],
-            "doc": [],
-            "docx": []
-        }
-        
-        for link in all_links:
-            href = link.get("href", "").lower()
-            link_text = link.get_text(strip=True)
-            
-            # Construire l'URL complète si c'est un lien relatif
-            if href.startswith("/"):
-                parsed_url = urlparse(url)
-                full_href = f"{parsed_url.scheme}://{parsed_url.netloc}{href}"
-            elif href.startswith("http"):
-                full_href = href
-            else:
-                # Lien relatif
-                parsed_url = urlparse(url)
-                full_href = f"{parsed_url.scheme}://{parsed_url.netloc}/{href.lstrip('/')}"
-            
-            # Détecter les types de documents (seulement PDF, DOC, DOCX)
-            if href.endswith(".pdf"):
-                document_links["pdf"].append({
-                    "url": full_href,
-                    "title": link.get("title", "") or link_text
-                })
-            elif href.endswith(".doc"):
-                document_links["doc"].append({
-                    "url": full_href,
-                    "title": link.get("title", "") or link_text
-                })
-            elif href.endswith(".docx"):
-                document_links["docx"].append({
-                    "url": full_href,
-                    "title": link.get("title", "") or link_text
-                })
-        
-        data["media"]["document_links"] = document_links
+    def get(source):
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _DONE
 
-        # --- 6. Données Structurées ---
-        # JSON-LD
-        json_ld_scripts = soup.find_all("script", type="application/ld+json")
-        if json_ld_scripts:
-            data["structured_data"]["json_ld"] = []
-            for script in json_ld_scripts:
-                try:
-                    json_ld = json.loads(script.string)
-                    data["structured_data"]["json_ld"].append(json_ld)
-                except Exception as e:
-                    print(f"Erreur lors de l'analyse du JSON-LD : {e}")
+    def feeder():
+        for index, url in enumerate(urls):
+            while not pending.acquire(timeout=0.1):
+                if stop.is_set():
+                    return
+            if not put(url_queue, (index, url)):
+                return
+        for _ in range(fetch_workers):
+            put(url_queue, _DONE)
 
-        # Microdata
-        microdata_items = soup.find_all(itemprop=True)
-        if microdata_items:
-            data["structured_data"]["microdata"] = [
-                {
-                    "itemprop": item.get("itemprop"),
-                    "content": item.get_text(strip=True)
-                } for item in microdata_items
-            ]
+    def fetcher():
+        while True:
+            item = get(url_queue)
+            if item is _DONE:
+                put(html_queue, _DONE)
+                return
+            index, url = item
+            if not put(html_queue, (index, url, fetch_page(url, session, cache, gate))):
+                return
 
-        # Schema.org
-        schema_org_scripts = soup.find_all("script", type="application/ld+json")
-        if schema_org_scripts:
-            data["structured_data"]["schema_org"] = []
-            for script in schema_org_scripts:
-                try:
-                    schema_data = json.loads(script.string)
-                    if "@type" in schema_data:
-                        data["structured_data"]["schema_org"].append(schema_data)
-                except Exception as e:
-                    print(f"Erreur lors de l'analyse du Schema.org : {e}")
+    def on_parsed(future, index, url, html):
+        # Chaque résultat est compté par le consommateur : le marqueur de fin
+        # (nombre de pages distribuées) ne peut pas devancer les derniers callbacks
+        if future.cancelled():
+            # Pipeline arrêté avant le parsing de cette page
+            return
+        content = None
+        if not future.exception():
+            content, worker_metrics = future.result()
+            metrics.merge(worker_metrics)
+        if content and state:
+            state.mark_extracted(url, html)
+        result_queue.put((index, content))
 
-        # --- 7. Informations Business ---
-        # Coordonnées (téléphone, email, adresse)
-        contact_info = soup.find("div", class_="contact-info")
-        if contact_info:
-            phone = contact_info.find("span", class_="phone")
-            email = contact_info.find("a", href=lambda href: href and "mailto:" in href)
-            address = contact_info.find("span", class_="address")
+    def dispatcher(executor):
+        done_fetchers = 0
+        dispatched = 0
+        while done_fetchers < fetch_workers:
+            item = get(html_queue)
+            if stop.is_set():
+                return
+            if item is _DONE:
+                done_fetchers += 1
+                continue
+            index, url, html = item
+            dispatched += 1
+            if html is None or (state and not state.needs_extraction(url, html)) \
+                    or (dedup and dedup.check(url, html)):
+                result_queue.put((index, None))
+                continue
+            try:
+                future = executor.submit(_parse_in_worker, url, html, parser)
+            except RuntimeError:
+                # Pool arrêté : le générateur a été fermé
+                return
+            future.add_done_callback(
+                lambda f, index=index, url=url, html=html: on_parsed(f, index, url, html)
+            )
+        # Les résultats arrivent via les callbacks : annoncer seulement leur nombre total
+        result_queue.put((_DONE, dispatched))
 
-            if phone:
-                data["business_info"]["phone"] = phone.get_text(strip=True)
-            if email:
-                data["business_info"]["email"] = email["href"].replace("mailto:", "")
-            if address:
-                data["business_info"]["address"] = address.get_text(strip=True)
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        threads = [threading.Thread(target=feeder, daemon=True)]
+        threads += [threading.Thread(target=fetcher, daemon=True) for _ in range(fetch_workers)]
+        threads.append(threading.Thread(target=dispatcher, args=(executor,), daemon=True))
+        for thread in threads:
+            thread.start()
 
-        # Horaires d'ouverture
-        opening_hours = soup.find("time", datetime=True)
-        if opening_hours:
-            data["business_info"]["opening_hours"] = opening_hours["datetime"]
+        try:
+            buffer = {}
+            next_index = 0
+            received = 0
+            total = None
+            while total is None or received < total:
+                item = result_queue.get()
+                if item[0] is _DONE:
+                    total = item[1]
+                    continue
+                received += 1
+                metrics.set_gauge("queue_depth", url_queue.qsize(), queue="urls")
+                metrics.set_gauge("queue_depth", html_queue.qsize(), queue="html")
+                metrics.set_gauge("queue_depth", result_queue.qsize(), queue="results")
+                index, content = item
+                if not ordered:
+                    pending.release()
+                    if content:
+                        yield content
+                    continue
+                # Réordonner les résultats selon l'ordre des URLs
+                buffer[index] = content
+                while next_index in buffer:
+                    content = buffer.pop(next_index)
+                    next_index += 1
+                    pending.release()
+                    if content:
+                        yield content
+        finally:
+            # Générateur fermé avant la fin (ou erreur) : débloquer et arrêter les étages
+            stop.set()
+            executor.shutdown(cancel_futures=True)
 
-        # Services/produits offerts
-        services = soup.find_all("li", class_="service-item")
-        if services:
-            data["business_info"]["services_offered"] = [service.get_text(strip=True) for service in services]
+def read_urls(filename):
+    # Lire les URLs depuis le fichier
+    with open(filename, "r") as f:
+        return [line.strip() for line in f.readlines()]
 
-        # Contenu "À propos"
-        about_us = soup.find("section", id="about-us")
-        if about_us:
-            data["business_info"]["about_us"] = about_us.get_text(strip=True)
+def iter_scraped_pages(urls, pipeline=False, cache=None, state=None, dedup=None, **pipeline_options):
+    """
+    Génère les pages scrapées une par une, séquentiellement ou via iter_scrape_pipeline.
+    Avec `state` (crawl_state.CrawlState), seules les pages modifiées depuis leur
+    dernière extraction sont ré-extraites. Avec `dedup` (dedup.NearDuplicateDetector),
+    les quasi-doublons ne sont ni extraits ni générés.
+    """
+    if pipeline:
+        results = iter_scrape_pipeline(urls, cache=cache, state=state, dedup=dedup, **pipeline_options)
+        for i, content in enumerate(results, 1):
+            print(f"Scraping {i}/{len(urls)}: {content['url']}")
+            yield content
+        return
 
-        # Informations équipe
-        team_members = soup.find_all("div", class_="team-member")
-        if team_members:
-            data["business_info"]["team"] = [
-                {
-                    "name": member.find("h3").get_text(strip=True),
-                    "role": member.find("p").get_text(strip=True)
-                } for member in team_members
-            ]
+    for i, url in enumerate(urls, 1):
+        print(f"Scraping {i}/{len(urls)}: {url}")
+        html = fetch_page(url, cache=cache)
+        if html is not None and state and not state.needs_extraction(url, html):
+            print("  -> Contenu inchangé, extraction ignorée")
+        elif html is not None and dedup and dedup.check(url, html):
+            print(f"  -> Quasi-doublon de {dedup.duplicates[url]}, extraction ignorée")
+        elif html is not None:
+            content = parse_page_content(url, html)
+            if content:
+                if state:
+                    state.mark_extracted(url, html)
+                yield content
 
-        # Témoignages/avis
-        testimonials = soup.find_all("blockquote", class_="testimonial")
-        if testimonials:
-            data["business_info"]["testimonials"] = [
-                {
-                    "text": testimonial.get_text(strip=True),
-                    "author": testimonial.find("cite").get_text(strip=True)
-                } for testimonial in testimonials
-            ]
+        # Pause pour ne pas surcharger le serveur
+        time.sleep(1)
 
-        return data
+def scrape_all_urls_from_file(filename="crawled_urls.txt", pipeline=False, cache=None, state=None, dedup=None,
+                              **pipeline_options):
+    """
+    Scrape toutes les URLs depuis le fichier généré par le crawler.
+    Avec pipeline=True, utilise iter_scrape_pipeline (options transmises telles quelles).
+    Avec `state` (crawl_state.CrawlState), seules les pages modifiées depuis leur
+    dernière extraction sont ré-extraites et retournées.
+    Avec `dedup` (dedup.NearDuplicateDetector), les quasi-doublons sont écartés.
+    """
+    try:
+        urls = read_urls(filename)
+    except FileNotFoundError:
+        print(f"Fichier {filename} non trouvé. Exécutez d'abord le crawler.")
+        return []
 
-    except Exception as e:
-        print(f"Erreur lors de l'extraction de {url}: {e}")
-        return None
+    print(f"Scraping de {len(urls)} URLs...")
+    return list(iter_scraped_pages(urls, pipeline, cache, state, dedup, **pipeline_options))
 
-def scrape_all_urls_from_file(filename="crawled_urls.txt"):
+def scrape_all_urls_to_jsonl(filename="crawled_urls.txt", output="scraped_data.jsonl", compression=None,
+                             flush_every=100, pipeline=False, cache=None, state=None, dedup=None,
+                             compact=False, **pipeline_options):
     """
-    Scrape toutes les URLs depuis le fichier généré par le crawler
+    Variante en flux de scrape_all_urls_from_file : chaque page est écrite dans
+    `output` (JSONL, compressé si .gz/.zst ou selon `compression`) dès qu'elle est
+    prête, sans être gardée en mémoire. Les URLs déjà présentes dans `output`
+    sont ignorées, ce qui permet de reprendre un scraping interrompu.
+    Avec compact=True, les blocs communs aux pages d'un hôte ne sont écrits
+    qu'une fois (format de records.py, JSONL ou .msgpack).
+    Retourne le nombre de pages écrites.
     """
     try:
-        # Lire les URLs depuis le fichier
-        with open(filename, "r") as f:
-            urls = [line.strip() for line in f.readlines()]
-        
-        print(f"Scraping de {len(urls)} URLs...")
-        scraped_data = []
-        
-        for i, url in enumerate(urls, 1):
-            print(f"Scraping {i}/{len(urls)}: {url}")
-            content = extract_page_content(url)
-            if content:
-                scraped_data.append(content)
-            
-            # Pause pour ne pas surcharger le serveur
-            time.sleep(1)
-        
-        return scraped_data
-        
+        urls = read_urls(filename)
     except FileNotFoundError:
         print(f"Fichier {filename} non trouvé. Exécutez d'abord le crawler.")
-        return []
+        return 0
+
+    done = records.written_urls(output, compression) if compact else written_urls(output, compression)
+    remaining = [url for url in urls if url not in done]
+    if len(remaining) < len(urls):
+        print(f"Reprise : {len(urls) - len(remaining)} URLs déjà présentes dans {output}")
+
+    print(f"Scraping de {len(remaining)} URLs...")
+    writer_class = records.CompactWriter if compact else JsonlWriter
+    with writer_class(output, compression, flush_every) as writer:
+        for content in iter_scraped_pages(remaining, pipeline, cache, state, dedup, **pipeline_options):
+            writer.write(content)
+    return writer.count
 
 # Exemple d'utilisation
 if __name__ == "__main__":
+    install_dns_cache()
     # Scrapper toutes les URLs crawlées
     scraped_data = scrape_all_urls_from_file("crawled_urls.txt")
     
     # Sauvegarder les données scrapées
-    with open("scraped_data.json", "w", encoding="utf-8") as f:
-        json.dump(scraped_data, f, ensure_ascii=False, indent=4)
+    with open("scraped_data.json", "w", encoding="utf-8") as f, metrics.timer("stage_seconds", stage="serialize"):
+        json.dump(scraped_data, f, ensure_ascii=False, separators=(",", ":"))
     
     print(f"Scraping terminé. {len(scraped_data)} pages scrapées.")
     print("Données sauvegardées dans 'scraped_data.json'")
\ No newline at end of file
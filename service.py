@@ -0,0 +1,532 @@
+"""
+Service HTTP de scraping (FastAPI) autour de extract_page_content et WebCrawler.
+
+Les clients internes soumettent des lots d'URLs ou des crawls sous forme de
+tâches, suivent leur état et lisent les résultats en NDJSON au fil de l'eau.
+Toutes les requêtes passent par un même ScrapeService :
+  - les demandes simultanées d'une même URL (normalisée) sont regroupées en
+    une seule récupération ;
+  - les résultats récents sont servis depuis un cache LRU à durée de vie ;
+  - les pages sont récupérées par un pool de threads (session HTTP poolée,
+    nombre de requêtes simultanées borné par hôte) et extraites par un pool
+    de processus démarré au lancement du service et gardé chaud.
+
+Routes :
+  GET    /scrape?url=...         une page (cache, regroupement)
+  POST   /scrape                 {"urls": [...]} : résultats en NDJSON dès qu'ils sont prêts
+  POST   /jobs/scrape            {"urls": [...]} : tâche asynchrone
+  POST   /jobs/crawl             {"base_url": ..., "max_pages": ..., "scrape": false} : crawl en tâche
+  GET    /jobs, /jobs/{id}       état des tâches
+  GET    /jobs/{id}/results      résultats en NDJSON (suivis jusqu'à la fin de la tâche)
+  DELETE /jobs/{id}              annulation
+  GET    /health, /metrics       état du service, métriques Prometheus
+
+Lancement : python service.py --port 8000 (ou uvicorn service:app) ; avec
+--http-cache http_cache.sqlite, les pages des crawls lancés avec scrape=True
+ne sont téléchargées qu'une fois.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from crawler import WebCrawler, HostLimiter
+from frontier import normalize_url
+from http_cache import HttpCache
+from http_client import create_session, install_dns_cache
+from fetch_gate import default_gate
+from scrapper_2 import fetch_page, _parse_in_worker
+from profiles import default_registry
+from metrics import metrics
+
+MAX_BATCH = 10000
+NDJSON = "application/x-ndjson"
+
+_MISS = object()
+
+
+class ResultCache:
+    """
+    Cache LRU des résultats récents : au plus `max_entries` pages, chacune
+    servie pendant `ttl` secondes (ou la durée passée à put()).
+    """
+    def __init__(self, max_entries=10000, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Résultat en cache, ou _MISS (un résultat None, page en erreur, est mis en cache).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISS
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return _MISS
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    Tâche soumise au service (lot d'URLs ou crawl) et ses résultats, lus en
+    flux par les clients pendant qu'elle s'exécute.
+    """
+    def __init__(self, kind, params, total=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        # pending, running, done, failed ou cancelled
+        self.status = "pending"
+        self.total = total
+        self.results = []
+        self.failed = 0
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancelled = False
+        self.task = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    async def add(self, record):
+        self.results.append(record)
+        if record.get("ok") is False:
+            self.failed += 1
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def iter_results(self, offset=0, follow=True):
+        """
+        Résultats à partir de `offset` ; avec follow=True, attend les suivants
+        jusqu'à la fin de la tâche.
+        """
+        index = offset
+        while True:
+            while index < len(self.results):
+                yield self.results[index]
+                index += 1
+            if self.finished or not follow:
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.results) > index or self.finished)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "total": self.total,
+            "completed": len(self.results),
+            "failed": self.failed,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class _JobCrawler(WebCrawler):
+    """
+    WebCrawler qui publie chaque page crawlée dans sa tâche au fil du crawl.
+    """
+    def __init__(self, job, publish, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.job = job
+        self.publish = publish
+        self.stopping = False
+
+    def page_done(self, url):
+        if self.job.cancelled:
+            # Arrêter le crawl une seule fois : les autres workers sont alors annulés
+            if not self.stopping:
+                self.stopping = True
+                raise JobCancelled()
+            return
+        if url in self.depth_map:
+            self.publish(url, self.depth_map[url])
+
+
+def _warm_up():
+    # Force le démarrage d'un processus du pool et la compilation des profils d'extraction
+    default_registry()
+    return os.getpid()
+
+
+def _record(url, result, **extra):
+    return {"url": url, **extra, "ok": result is not None, "result": result}
+
+
+class ScrapeService:
+    """
+    Récupération et extraction partagées par toutes les requêtes du service.
+    `http_cache` (http_cache.HttpCache), optionnel, est partagé par les
+    récupérations et les crawls : le scraping des pages d'un crawl lancé avec
+    scrape=True ne les télécharge alors pas une seconde fois. Les pages en
+    erreur sont gardées `error_ttl` secondes pour ne pas relancer l'hôte à
+    chaque demande.
+    """
+    def __init__(self, fetch_workers=16, parse_workers=None, parser="html.parser", cache_size=10000,
+                 cache_ttl=600, error_ttl=30, per_host_concurrency=4, per_host_delay=0.0,
+                 http_cache=None, gate=default_gate, max_jobs=1000):
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.parser = parser
+        self.results = ResultCache(cache_size, cache_ttl)
+        self.error_ttl = error_ttl
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_delay = per_host_delay
+        self.http_cache = http_cache
+        self.gate = gate
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        # URL normalisée -> tâche asyncio de la récupération en cours
+        self._inflight = {}
+        self.session = None
+        self.fetch_pool = None
+        self.parse_pool = None
+        self.limiter = None
+
+    def _start_parse_pool(self):
+        # spawn : le service a déjà des threads au moment de créer les processus
+        self.parse_pool = ProcessPoolExecutor(self.parse_workers, mp_context=multiprocessing.get_context("spawn"))
+        return [self.parse_pool.submit(_warm_up) for _ in range(self.parse_workers)]
+
+    async def start(self):
+        self.session = create_session(pool_maxsize=self.fetch_workers)
+        self.fetch_pool = ThreadPoolExecutor(self.fetch_workers, thread_name_prefix="fetch")
+        self.limiter = HostLimiter(self.per_host_delay, self.per_host_concurrency)
+        # Démarrer tous les processus d'extraction avant la première requête
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in self._start_parse_pool()))
+
+    async def stop(self):
+        for job in list(self.jobs.values()):
+            if not job.finished:
+                self.cancel(job)
+        self.fetch_pool.shutdown(wait=False, cancel_futures=True)
+        self.parse_pool.shutdown(cancel_futures=True)
+        self.session.close()
+
+    async def scrape(self, url):
+        """
+        Contenu extrait d'une page (dictionnaire de parse_page_content), ou None.
+        """
+        key = normalize_url(url)
+        cached = self.results.get(key)
+        if cached is not _MISS:
+            metrics.inc("service_lookups_total", result="cache")
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            metrics.inc("service_lookups_total", result="fetch")
+            task = asyncio.ensure_future(self._scrape(url, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _, key=key: self._inflight.pop(key, None))
+        else:
+            metrics.inc("service_lookups_total", result="coalesced")
+        # Un client qui abandonne n'annule pas la récupération des autres
+        return await asyncio.shield(task)
+
+    async def _scrape(self, url, key):
+        loop = asyncio.get_running_loop()
+        host = urlsplit(url).netloc
+        await self.limiter.acquire(host)
+        try:
+            html = await loop.run_in_executor(self.fetch_pool, fetch_page, url, self.session,
+                                              self.http_cache, self.gate)
+        finally:
+            self.limiter.release(host)
+        content = None
+        if html is not None:
+            parse_pool = self.parse_pool
+            try:
+                content, worker_metrics = await loop.run_in_executor(parse_pool, _parse_in_worker, url, html,
+                                                                     self.parser)
+                metrics.merge(worker_metrics)
+            except BrokenProcessPool:
+                # Un processus d'extraction est mort : repartir d'un pool neuf
+                print(f"Pool d'extraction interrompu pendant {url}, redémarrage")
+                metrics.inc("pages_failed_total", stage="scrape")
+                if self.parse_pool is parse_pool:
+                    # Libérer les processus restants de l'ancien pool avant de le remplacer
+                    parse_pool.shutdown(wait=False, cancel_futures=True)
+                    self._start_parse_pool()
+                return None
+        self.results.put(key, content, None if content is not None else self.error_ttl)
+        return content
+
+    def _add_job(self, job, coroutine):
+        self.jobs[job.id] = job
+        # Oublier les tâches terminées les plus anciennes
+        for old_id in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            if self.jobs[old_id].finished:
+                del self.jobs[old_id]
+        job.task = asyncio.ensure_future(self._run_job(job, coroutine))
+        metrics.inc("service_jobs_total", kind=job.kind)
+        return job
+
+    async def _run_job(self, job, coroutine):
+        job.status = "running"
+        try:
+            await coroutine
+        except (asyncio.CancelledError, JobCancelled):
+            await job.finish("cancelled")
+        except Exception as e:
+            print(f"Erreur de la tâche {job.id}: {e}")
+            await job.finish("failed", str(e))
+        else:
+            await job.finish("done")
+
+    def submit_scrape(self, urls):
+        job = Job("scrape", {"urls": len(urls)}, total=len(urls))
+        return self._add_job(job, self._scrape_job(job, urls))
+
+    async def _scrape_job(self, job, urls):
+        # Une tâche volumineuse n'occupe pas seule le pool de récupération
+        semaphore = asyncio.Semaphore(self.fetch_workers)
+
+        async def scrape_one(url):
+            async with semaphore:
+                result = await self.scrape(url)
+            await job.add(_record(url, result))
+
+        await asyncio.gather(*(scrape_one(url) for url in urls))
+
+    def submit_crawl(self, base_url, max_pages=100, max_depth=3, same_domain=True, concurrency=10,
+                     per_host_delay=1.0, per_host_concurrency=2, scrape=False):
+        params = {
+            "base_url": base_url, "max_pages": max_pages, "max_depth": max_depth, "same_domain": same_domain,
+            "concurrency": concurrency, "per_host_delay": per_host_delay,
+            "per_host_concurrency": per_host_concurrency, "scrape": scrape,
+        }
+        job = Job("crawl", params)
+        return self._add_job(job, self._crawl_job(job, params))
+
+    async def _crawl_job(self, job, params):
+        loop = asyncio.get_running_loop()
+        scrapes = []
+
+        async def add_page(url, depth):
+            if params["scrape"]:
+                await job.add(_record(url, await self.scrape(url), depth=depth))
+            else:
+                await job.add({"url": url, "depth": depth})
+
+        def publish(url, depth):
+            # Appelé depuis le thread du crawl
+            scrapes.append(asyncio.run_coroutine_threadsafe(add_page(url, depth), loop))
+
+        crawler = _JobCrawler(job, publish, params["base_url"], max_depth=params["max_depth"],
+                              cache=self.http_cache, same_domain=params["same_domain"])
+        # Le crawl a sa propre boucle dans un thread : son parsing des liens ne
+        # retarde pas les autres requêtes du service
+        crawl = crawler.crawl_async(params["max_pages"], params["concurrency"], params["per_host_delay"],
+                                    params["per_host_concurrency"])
+        try:
+            await asyncio.to_thread(asyncio.run, crawl)
+        finally:
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in scrapes), return_exceptions=True)
+            crawler.close()
+            job.total = len(crawler.visited_urls)
+
+    def cancel(self, job):
+        job.cancelled = True
+        if job.kind == "scrape" and job.task is not None:
+            job.task.cancel()
+
+
+class UrlBatch(BaseModel):
+    urls: list[str]
+
+
+class CrawlRequest(BaseModel):
+    base_url: str
+    max_pages: int = 100
+    max_depth: int = 3
+    same_domain: bool = True
+    concurrency: int = 10
+    per_host_delay: float = 1.0
+    per_host_concurrency: int = 2
+    scrape: bool = False
+
+
+def _check_batch(urls):
+    if not urls:
+        raise HTTPException(422, "aucune URL")
+    if len(urls) > MAX_BATCH:
+        raise HTTPException(413, f"au plus {MAX_BATCH} URLs par lot")
+
+
+async def _ndjson(records):
+    async for record in records:
+        yield json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def create_app(service=None):
+    """
+    Application FastAPI ; le service (pools, session) démarre et s'arrête avec elle.
+    """
+    service = service if service is not None else ScrapeService()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await service.start()
+        try:
+            yield
+        finally:
+            await service.stop()
+
+    app = FastAPI(title="Web Scrapper", lifespan=lifespan)
+    app.state.service = service
+
+    def get_job(job_id):
+        job = service.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(404, "tâche inconnue")
+        return job
+
+    @app.get("/health")
+    async def health():
+        return {
+            "status": "ok",
+            "cached_results": len(service.results),
+            "in_flight": len(service._inflight),
+            "jobs": sum(not job.finished for job in service.jobs.values()),
+        }
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def prometheus():
+        return metrics.to_prometheus()
+
+    @app.get("/scrape")
+    async def scrape(url: str = Query(...)):
+        result = await service.scrape(url)
+        if result is None:
+            raise HTTPException(502, f"échec de la récupération ou de l'extraction de {url}")
+        return result
+
+    @app.post("/scrape")
+    async def scrape_batch(batch: UrlBatch):
+        _check_batch(batch.urls)
+
+        async def scrape_one(url):
+            return url, await service.scrape(url)
+
+        async def records():
+            pending = [asyncio.ensure_future(scrape_one(url)) for url in batch.urls]
+            try:
+                for future in asyncio.as_completed(pending):
+                    url, result = await future
+                    yield _record(url, result)
+            finally:
+                for task in pending:
+                    task.cancel()
+
+        return StreamingResponse(_ndjson(records()), media_type=NDJSON)
+
+    @app.post("/jobs/scrape", status_code=202)
+    async def submit_scrape(batch: UrlBatch):
+        _check_batch(batch.urls)
+        return service.submit_scrape(batch.urls).to_dict()
+
+    @app.post("/jobs/crawl", status_code=202)
+    async def submit_crawl(request: CrawlRequest):
+        return service.submit_crawl(**request.model_dump()).to_dict()
+
+    @app.get("/jobs")
+    async def list_jobs():
+        return [job.to_dict() for job in service.jobs.values()]
+
+    @app.get("/jobs/{job_id}")
+    async def job_status(job_id: str):
+        return get_job(job_id).to_dict()
+
+    @app.get("/jobs/{job_id}/results")
+    async def job_results(job_id: str, offset: int = 0, follow: bool = True):
+        job = get_job(job_id)
+        return StreamingResponse(_ndjson(job.iter_results(offset, follow)), media_type=NDJSON)
+
+    @app.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: str):
+        job = get_job(job_id)
+        if not job.finished:
+            service.cancel(job)
+        return job.to_dict()
+
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Service HTTP de scraping")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fetch-workers", type=int, default=16)
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--parser", default="html.parser")
+    parser.add_argument("--cache-size", type=int, default=10000, help="pages gardées en mémoire")
+    parser.add_argument("--cache-ttl", type=float, default=600, help="durée de vie d'un résultat (s)")
+    parser.add_argument("--http-cache", default=None,
+                        help="fichier SQLite du cache HTTP partagé par les récupérations et les crawls")
+    args = parser.parse_args()
+    install_dns_cache()
+    http_cache = HttpCache(args.http_cache) if args.http_cache else None
+    service = ScrapeService(args.fetch_workers, args.parse_workers, args.parser, args.cache_size, args.cache_ttl,
+                            http_cache=http_cache)
+    try:
+        uvicorn.run(create_app(service), host=args.host, port=args.port)
+    finally:
+        if http_cache is not None:
+            http_cache.close()
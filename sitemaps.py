@@ -0,0 +1,200 @@
+"""
+Lecture en flux des sitemaps.
+
+Les sitemaps sont parsés avec iterparse au fil du téléchargement (les éléments
+lus sont libérés aussitôt), les index de sitemaps (<sitemapindex>) sont suivis
+récursivement, les fichiers .xml.gz sont décompressés à la volée et les
+sitemaps enfants sont téléchargés en parallèle. Les entrées sont produites
+paresseusement via une file bornée : la mémoire reste constante quelle que
+soit la taille du sitemap. Fermer le générateur (close()) arrête les lectures
+en cours ; les threads de lecture sont des démons, un générateur abandonné
+sans être fermé ne bloque donc pas la fin du processus.
+"""
+import gzip
+import io
+import queue
+import threading
+import xml.etree.ElementTree as ET
+
+from http_cache import cached_get
+from http_client import default_session
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+_DONE = object()
+
+
+class _Stopped(Exception):
+    """
+    Générateur fermé : interrompt la lecture d'un sitemap.
+    """
+
+
+class _ChunkStream(io.RawIOBase):
+    """
+    Flux lisible construit sur un itérateur de blocs d'octets (response.iter_content).
+    """
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            self._pending = next(self._chunks, b"")
+            if not self._pending:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def _open_stream(url, session, cache, timeout):
+    if cache is not None:
+        # Avec un cache, le corps complet est conservé : on le relit depuis la mémoire
+        response = cached_get(session, url, cache, timeout=timeout)
+        if response.status_code != 200:
+            return None, response.status_code
+        stream = io.BufferedReader(io.BytesIO(response.content))
+    else:
+        response = session.get(url, timeout=timeout, stream=True)
+        if response.status_code != 200:
+            response.close()
+            return None, response.status_code
+        # iter_content gère le Content-Encoding (gzip/deflate) du transport
+        stream = io.BufferedReader(_ChunkStream(response.iter_content(64 * 1024)))
+    # Fichiers .xml.gz : détecter l'en-tête gzip plutôt que se fier à l'extension
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        stream = gzip.GzipFile(fileobj=stream)
+    return stream, 200
+
+
+def _text(element, tag):
+    value = element.findtext(f"{SITEMAP_NS}{tag}")
+    return value.strip() if value and value.strip() else None
+
+
+def parse_sitemap_stream(stream, on_entry, on_child):
+    """
+    Parse un sitemap en flux : appelle on_entry(entry) pour chaque <url> et
+    on_child(loc) pour chaque <sitemap> d'un index.
+    """
+    root = None
+    for event, element in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            continue
+        if element.tag == f"{SITEMAP_NS}url":
+            loc = _text(element, "loc")
+            if loc:
+                on_entry({
+                    "loc": loc,
+                    "lastmod": _text(element, "lastmod"),
+                    "changefreq": _text(element, "changefreq")
+                })
+        elif element.tag == f"{SITEMAP_NS}sitemap":
+            loc = _text(element, "loc")
+            if loc:
+                on_child(loc)
+        else:
+            continue
+        # Libérer les éléments déjà traités
+        root.clear()
+
+
+def iter_sitemap_entries(sitemap_urls, session=None, cache=None, max_workers=8, buffer_size=10000,
+                         timeout=10):
+    """
+    Génère les entrées {"loc", "lastmod", "changefreq"} de tous les sitemaps donnés
+    et de leurs enfants. Les sitemaps sont lus par `max_workers` threads ; au plus
+    `buffer_size` entrées sont gardées en mémoire en attendant le consommateur.
+    Fermer le générateur avant la fin (close()) arrête les lectures en cours.
+    """
+    if isinstance(sitemap_urls, str):
+        sitemap_urls = [sitemap_urls]
+    session = session or default_session()
+    entries = queue.Queue(maxsize=buffer_size)
+    tasks = queue.Queue()
+    seen = set()
+    lock = threading.Lock()
+    state = {"pending": 0}
+    # Levé à la fermeture du générateur : les lecteurs abandonnent leur sitemap
+    stop = threading.Event()
+
+    def put(item):
+        # Bloque tant que la file est pleine, sauf si le consommateur est parti
+        while not stop.is_set():
+            try:
+                entries.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped()
+
+    def submit(url):
+        with lock:
+            if url in seen or stop.is_set():
+                return
+            seen.add(url)
+            state["pending"] += 1
+        tasks.put(url)
+
+    def reader():
+        while not stop.is_set():
+            try:
+                url = tasks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            read_sitemap(url)
+
+    def read_sitemap(url):
+        try:
+            if stop.is_set():
+                return
+            print(f"Tentative de récupération du sitemap : {url}")
+            stream, status = _open_stream(url, session, cache, timeout)
+            if stream is None:
+                print(f"Sitemap non trouvé (code {status})")
+            else:
+                with stream:
+                    parse_sitemap_stream(stream, put, submit)
+        except _Stopped:
+            return
+        except Exception as e:
+            print(f"Erreur lors de la lecture du sitemap {url} : {e}")
+        finally:
+            with lock:
+                state["pending"] -= 1
+                finished = state["pending"] == 0
+            if finished:
+                try:
+                    put(_DONE)
+                except _Stopped:
+                    pass
+
+    for url in sitemap_urls:
+        submit(url)
+    if not seen:
+        return
+    # Threads démons plutôt qu'un ThreadPoolExecutor, dont les threads sont
+    # attendus à la sortie de l'interpréteur même bloqués sur une file pleine
+    for _ in range(max_workers):
+        threading.Thread(target=reader, daemon=True, name="sitemap").start()
+
+    try:
+        while True:
+            item = entries.get()
+            if item is _DONE:
+                # Un enfant a pu être soumis juste avant : vérifier qu'il ne reste rien
+                with lock:
+                    if state["pending"] == 0:
+                        break
+                continue
+            yield item
+    finally:
+        # Fin des entrées ou générateur fermé : arrêter les lecteurs
+        stop.set()
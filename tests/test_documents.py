@@ -0,0 +1,46 @@
+"""
+Liens de documents : URLs construites par l'extracteur et dédupliquées pour le téléchargement.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from documents import collect_documents
+from extractors import extract_from_soup
+from fetch_gate import FetchGate
+from parsers import make_soup
+
+HTML = """<html><body>
+<a href="docs/Rapport_A.PDF">Rapport</a>
+<a href=" /Files/B.pdf">B</a>
+<a href="https://CDN.example.ma/Guide.Docx">Guide</a>
+<a href="../Up/D.doc">D</a>
+<a href="page.html">pas un document</a>
+</body></html>"""
+
+
+def test_liens_de_documents():
+    pages = [extract_from_soup(make_soup(HTML), f"https://www.example.ma/x/{name}.html") for name in ("y", "z")]
+    assert pages[0]["media"]["document_links"] == {
+        "pdf": [
+            {"url": "https://www.example.ma/x/docs/Rapport_A.PDF", "title": "Rapport"},
+            {"url": "https://www.example.ma/Files/B.pdf", "title": "B"},
+        ],
+        "doc": [{"url": "https://www.example.ma/Up/D.doc", "title": "D"}],
+        "docx": [{"url": "https://CDN.example.ma/Guide.Docx", "title": "Guide"}],
+    }
+    documents = collect_documents(pages)
+    assert len(documents) == 4
+    guide = documents["https://cdn.example.ma/Guide.Docx"]
+    # Clé normalisée, mais URL téléchargée telle que construite
+    assert guide["url"] == "https://CDN.example.ma/Guide.Docx"
+    assert guide["pages"] == ["https://www.example.ma/x/y.html", "https://www.example.ma/x/z.html"]
+
+
+def test_documents_ecartes_bornes():
+    assert not FetchGate().collect_documents
+    gate = FetchGate(collect_documents=True, max_documents=3)
+    for i in range(10):
+        gate.skip(f"https://ex.ma/{i}.pdf", "document pdf", kind="pdf")
+    assert gate.documents == [(f"https://ex.ma/{i}.pdf", "pdf") for i in range(3)]
@@ -0,0 +1,46 @@
+"""
+Normalisation des URLs et fichier de débordement de la frontière.
+"""
+import gc
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frontier import UrlFrontier, normalize_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Ex.COM:80/a?b=2&a=1#haut", "http://ex.com/a?a=1&b=2"),
+    ("https://ex.com?utm_source=x&gclid=y&q=1", "https://ex.com/?q=1"),
+    # Encodage d'origine conservé : c'est l'URL téléchargée
+    ("https://ex.com/r?p=a/b&s=a+b%20c", "https://ex.com/r?p=a/b&s=a+b%20c"),
+    ("https://ex.com/r?p=a%2Fb", "https://ex.com/r?p=a%2Fb"),
+    ("https://ex.com/r?foo&foo=", "https://ex.com/r?foo&foo="),
+    ("https://ex.com/r?ref=home&sid=3", "https://ex.com/r?ref=home&sid=3"),
+    ("http://[2001:DB8::1]:8080/x", "http://[2001:db8::1]:8080/x"),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def test_fichier_de_debordement_supprime():
+    frontier = UrlFrontier(max_in_memory=10)
+    for i in range(50):
+        frontier.push(f"http://ex.com/{i}", 0)
+    path = frontier._temp_path
+    assert path and os.path.exists(path)
+    assert [frontier.pop()[0] for _ in range(50)][-1] == "http://ex.com/49"
+    frontier.close()
+    assert not os.path.exists(path)
+
+    # Frontière abandonnée sans close()
+    frontier = UrlFrontier(max_in_memory=10)
+    for i in range(50):
+        frontier.push(f"http://ex.com/{i}", 0)
+    path = frontier._temp_path
+    del frontier
+    gc.collect()
+    assert not os.path.exists(path)
@@ -0,0 +1,47 @@
+"""
+Parité des backends de parsing sur les pages d'exemple de tests/pages/ :
+html.parser et lxml donnent la même extraction, et les trois chemins de
+liens (html.parser, lxml, selectolax) les mêmes href.
+"""
+import glob
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractors import extract_from_soup
+from parsers import HAS_LXML, HAS_SELECTOLAX, compare_backends, extract_hrefs, make_soup, _hrefs_lxml, _hrefs_selectolax
+
+PAGES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages", "*.html")))
+URL = "https://www.example.ma/categorie/page.html"
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_pages_presentes():
+    assert PAGES
+
+
+@pytest.mark.skipif(not HAS_LXML, reason="lxml n'est pas installé")
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+def test_extraction_identique(path):
+    html = read(path)
+    assert compare_backends(html, URL) == {"html.parser": True, "lxml": True}
+    assert extract_from_soup(make_soup(html, "lxml"), URL)["url"] == URL
+
+
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+def test_liens_identiques(path):
+    html = read(path)
+    reference = extract_hrefs(html, "html.parser")
+    assert reference
+    if HAS_LXML:
+        assert _hrefs_lxml(html) == reference
+    if HAS_SELECTOLAX:
+        assert _hrefs_selectolax(html) == reference
+    assert extract_hrefs(html, "fast") == reference
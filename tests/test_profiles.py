@@ -0,0 +1,43 @@
+"""
+Profil jumia.ma : une seule analyse lxml par page, et les valeurs lues par
+les consommateurs du JSON scrapé identiques à celles de l'extraction générique.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import profiles
+from extractors import extract_from_soup
+from parsers import make_soup
+
+URL = "https://www.jumia.ma/smartphones/"
+PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages", "jumia_catalog.html")
+
+
+@pytest.mark.skipif(not (profiles.HAS_YAML and profiles.HAS_LXML and profiles.HAS_CSSSELECT),
+                    reason="le profil jumia.ma demande pyyaml, lxml et cssselect")
+def test_profil_jumia(monkeypatch):
+    with open(PAGE, encoding="utf-8") as f:
+        html = f.read()
+    generic = extract_from_soup(make_soup(html), URL)
+
+    def no_soup(*args):
+        raise AssertionError("arbre BeautifulSoup construit")
+
+    monkeypatch.setattr(profiles, "make_soup", no_soup)
+    page = profiles.profile_for(URL).extract(html, URL)
+
+    assert page["metadata"]["title"] == generic["metadata"]["title"]
+    assert page["metadata"]["description"] == generic["metadata"]["description"]
+    assert page["content"] == generic["content"]
+    assert page["navigation"]["footer_links"] == [text for text in generic["navigation"]["footer_links"] if text]
+    assert page["media"]["image_alt_texts"] == generic["media"]["image_alt_texts"]
+    assert page["media"]["document_links"] == generic["media"]["document_links"]
+    assert page["structured_data"]["json_ld"] == generic["structured_data"]["json_ld"]
+    # Une liste de champs par formulaire, valeurs vides omises
+    assert [[field["name"] for field in form] for form in page["forms"]["details"]] == \
+        [[field["name"] for field in form] for form in generic["forms"]["details"]]
+    assert page["business_info"]["products"]
@@ -0,0 +1,35 @@
+"""
+Format compact : relecture des pages, compactes ou en JSONL ordinaire.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from output import JsonlWriter
+from records import CompactWriter, iter_pages
+
+
+def page(i):
+    return {
+        "url": f"https://www.example.ma/p{i}",
+        "metadata": {"title": f"Produit {i}", "description": "Description par défaut du site"},
+        "content": {"headings": {"h2": ["Gestion des cookies", f"Produit {i}"]}, "paragraphs": [f"texte {i}"]},
+        "navigation": {"main_menu": [{"text": "Accueil", "url": "/"}], "footer_links": [], "breadcrumb": []},
+        "forms": {"details": [[{"name": "q", "type": "search"}]]},
+        "media": {"image_alt_texts": ["Bannière promotionnelle", f"image {i}"]},
+        "structured_data": {"json_ld": [], "schema_org": []},
+    }
+
+
+def test_relecture(tmp_path):
+    pages = [page(i) for i in range(5)]
+    for name, writer_class in (("compact.jsonl", CompactWriter), ("plain.jsonl", JsonlWriter)):
+        path = str(tmp_path / name)
+        with writer_class(path) as writer:
+            for item in pages:
+                writer.write(item)
+        assert list(iter_pages(path)) == pages
+    with open(tmp_path / "compact.jsonl", encoding="utf-8") as f:
+        compact = f.read()
+    assert '"$block"' in compact and '"t":"string"' in compact
@@ -0,0 +1,95 @@
+"""
+Lecture en flux des sitemaps : un crawl arrêté avant la fin d'un gros
+sitemap doit arrêter ses lecteurs et laisser le processus se terminer.
+"""
+import gzip
+import http.server
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sitemaps import iter_sitemap_entries
+
+SITEMAP_SIZE = 15000
+NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def urlset(base, start, count):
+    entries = "".join(f"<url><loc>{base}/p{i}</loc></url>" for i in range(start, start + count))
+    return f'<?xml version="1.0"?><urlset xmlns="{NS}">{entries}</urlset>'.encode()
+
+
+@pytest.fixture(scope="module")
+def site():
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            base = f"http://127.0.0.1:{self.server.server_port}"
+            if self.path == "/sitemap.xml":
+                body, content_type = urlset(base, 0, SITEMAP_SIZE), "application/xml"
+            elif self.path == "/index.xml":
+                children = "".join(f"<sitemap><loc>{base}/part{i}.xml.gz</loc></sitemap>" for i in range(3))
+                body = f'<?xml version="1.0"?><sitemapindex xmlns="{NS}">{children}</sitemapindex>'.encode()
+                content_type = "application/xml"
+            elif self.path.startswith("/part"):
+                part = int(self.path[5])
+                body, content_type = gzip.compress(urlset(base, part * 100, 100)), "application/gzip"
+            elif self.path.startswith("/p"):
+                body, content_type = b"<html><body><a href='/p1'>x</a></body></html>", "text/html"
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def sitemap_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "sitemap"]
+
+
+def test_index_gzip(site):
+    locs = [entry["loc"] for entry in iter_sitemap_entries(site + "/index.xml")]
+    assert sorted(locs) == sorted(f"{site}/p{i}" for i in range(300))
+
+
+def test_fermeture_arrete_les_lecteurs(site):
+    entries = iter_sitemap_entries(site + "/sitemap.xml", buffer_size=100)
+    assert [next(entries)["loc"] for _ in range(10)][0] == site + "/p0"
+    entries.close()
+    deadline = time.monotonic() + 5
+    while sitemap_threads() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not sitemap_threads()
+
+
+def test_crawl_interrompu_termine(site):
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {ROOT!r})
+        from crawler import WebCrawler
+        crawler = WebCrawler({site + "/"!r})
+        crawler.crawl(max_pages=1)
+        print(len(crawler.visited_urls))
+    """)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0
+    assert result.stdout.strip().splitlines()[-1] == "1"